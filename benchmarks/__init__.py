@@ -0,0 +1,10 @@
+"""
+Load tests and microbenchmarks for the Pastbin service.
+
+Usage:
+    python -m benchmarks.load --duration 30 --output load.json
+    python -m benchmarks.micro --sizes 100,1000,10000 --output micro.json
+
+Both run the application in-process, against the in-memory MongoDB stand-in by default or
+against a local mongod with `--mongo-uri`, and write their results as JSON.
+"""
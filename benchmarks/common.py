@@ -0,0 +1,151 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+def add_common_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the options shared by every benchmark.
+
+    Args:
+    - parser (ArgumentParser): The benchmark's argument parser.
+    """
+    parser.add_argument("--mongo-uri", help="run against this MongoDB (e.g. a local mongod) instead of the in-memory stand-in")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_ROUNDS; the default keeps the configured cost")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for data and traffic")
+    parser.add_argument("--output", default=None, help="write the JSON results to this file instead of stdout")
+
+
+def configure_environment(args):
+    """
+    Points the application settings at the benchmark database.
+
+    Must run before anything under `src` is imported, because the settings and the
+    MongoDB clients are created at import time.
+
+    Args:
+    - args: The parsed command line.
+    """
+    if args.mongo_uri:
+        for name in ("DB_USERS_INFO", "DB_FREE_URLS", "DB_TEXT_USER"):
+            os.environ[name] = args.mongo_uri
+        os.environ["DB_TEST_MODE"] = "false"
+    else:
+        os.environ["DB_TEST_MODE"] = "true"
+    if args.bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # Every simulated client shares one address, which the limits would otherwise throttle.
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+
+async def reset_database():
+    """
+    Empties every collection the benchmarks write to.
+    """
+    from src.database import db
+
+    for collection in (
+        db.db_users_info, db.db_free_urls, db.db_counters, *db.db_text_user_shards, *db.db_text_chunks_shards,
+        *db.db_text_bodies_shards, db.db_message_counts, db.db_rate_limits,
+    ):
+        await collection.delete_many({})
+
+
+def clear_caches():
+    """
+    Empties every in-process cache, so each run starts cold.
+    """
+    from src.repository.pastbin import body_cache, message_cache
+    from src.services.auth import user_cache
+    from src.services.http_cache import page_cache
+
+    for cache in (message_cache, body_cache, page_cache, user_cache):
+        cache.clear()
+
+
+def percentile(sorted_values: list, fraction: float):
+    """
+    Reads a percentile from sorted samples using the nearest-rank method.
+
+    Args:
+    - sorted_values (list): The samples, sorted ascending.
+    - fraction (float): The percentile as a fraction, e.g. 0.99.
+
+    Returns:
+    - float: The sample at that rank, or 0.0 if there are none.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list, elapsed: float):
+    """
+    Summarizes latency samples.
+
+    Args:
+    - latencies (list): The latencies in seconds.
+    - elapsed (float): The wall-clock time the samples were taken over, in seconds.
+
+    Returns:
+    - dict: The sample count, throughput per second and mean, p50, p95, p99 and maximum latency in milliseconds.
+    """
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "throughput": len(values) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": values[-1] * 1000 if values else 0.0,
+    }
+
+
+def metadata(args):
+    """
+    Describes the environment a benchmark ran in, so results can be compared fairly.
+
+    Args:
+    - args: The parsed command line.
+
+    Returns:
+    - dict: The time, git commit, Python version, platform, backend and options of the run.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    options = {key: value for key, value in vars(args).items() if key not in ("output", "mongo_uri")}
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "backend": "mongod" if args.mongo_uri else "in-memory",
+        "options": options,
+    }
+
+
+def write_results(args, results: dict):
+    """
+    Writes benchmark results as JSON.
+
+    Args:
+    - args: The parsed command line; results go to `args.output`, or stdout if it is not set.
+    - results (dict): The measurements.
+    """
+    document = json.dumps({"metadata": metadata(args), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(document + "\n")
+    else:
+        print(document)
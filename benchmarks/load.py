@@ -0,0 +1,182 @@
+"""
+Drives mixed traffic against the application in-process and reports per-endpoint latency.
+
+Usage:
+    python -m benchmarks.load [--duration 30] [--concurrency 16] [--mix login=1,index=4,...]
+                              [--mongo-uri mongodb://localhost:27017] [--output load.json]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import (
+    add_common_arguments, clear_caches, configure_environment, reset_database, summarize, write_results,
+)
+
+DEFAULT_MIX = "login=1,index=4,create_message=2,create_messages=1,message=10,all_messages=3"
+PASSWORD = "benchmark-password"
+# Number of pastes sent per `create_messages` request.
+BULK_PASTES = 5
+
+
+def parse_mix(mix: str):
+    """
+    Parses the traffic mix.
+
+    Args:
+    - mix (str): Comma-separated "<operation>=<weight>" pairs.
+
+    Returns:
+    - dict: The weight of each operation.
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+async def seed(users: int, messages: int, message_size: int, rng: random.Random):
+    """
+    Creates the users and messages the traffic works on.
+
+    Returns:
+    - tuple: The usernames and the seeded message IDs.
+    """
+    import bcrypt
+
+    from src.conf.config import config
+    from src.database.db import write_new_user
+    from src.repository.pastbin import past
+
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)).decode("utf-8")
+    usernames = [f"bench{i}" for i in range(users)]
+    for username in usernames:
+        await write_new_user({
+            "username": username,
+            "email": f"{username}@example.com",
+            "hashed_password": hashed,
+            "is_active": True,
+            "confirmation_token": None,
+        })
+    message_ids = []
+    for i in range(messages):
+        text = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz \n", k=message_size))
+        message_ids.append(await past(rng.choice(usernames), text))
+    return usernames, message_ids
+
+
+async def login(client, username: str):
+    response = await client.post("/auth/login", data={"username": username, "password": PASSWORD})
+    if "access_token" in response.cookies:
+        client.cookies.set("access_token", response.cookies["access_token"])
+    return response
+
+
+async def run_client(client, username: str, message_ids: list, weights: dict, deadline: float,
+                     message_size: int, rng: random.Random, samples: dict, statuses: dict):
+    """
+    Plays one signed-in user until the deadline, recording each request's latency.
+    """
+    import httpx
+
+    operations = list(weights)
+    cumulative = list(weights.values())
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, cumulative)[0]
+        started = time.perf_counter()
+        if operation == "login":
+            async with httpx.AsyncClient(transport=client._transport, base_url=client.base_url) as fresh:
+                response = await login(fresh, username)
+        elif operation == "index":
+            response = await client.get("/")
+        elif operation == "create_message":
+            text = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz \n", k=message_size))
+            response = await client.post("/pastbin/create_message", data={"text": text})
+        elif operation == "create_messages":
+            pastes = [
+                {"text": "".join(rng.choices("abcdefghijklmnopqrstuvwxyz \n", k=message_size))}
+                for _ in range(BULK_PASTES)
+            ]
+            response = await client.post("/pastbin/create_messages", json={"pastes": pastes})
+        elif operation == "message":
+            response = await client.get(f"/pastbin/message/{rng.choice(message_ids)}")
+        elif operation == "all_messages":
+            response = await client.get("/pastbin/all_messages")
+        else:
+            raise ValueError(f"Unknown operation {operation!r}")
+        samples[operation].append(time.perf_counter() - started)
+        key = f"{operation}:{response.status_code}"
+        statuses[key] = statuses.get(key, 0) + 1
+        if operation == "create_messages" and response.status_code == 200:
+            # A bulk request succeeds as a whole even when some of its pastes were not written.
+            failed = sum("error" in result for result in response.json()["results"])
+            if failed:
+                statuses["create_messages:paste_errors"] = statuses.get("create_messages:paste_errors", 0) + failed
+
+
+async def main(args):
+    """
+    Seeds the database, runs the traffic and returns the measurements.
+    """
+    import httpx
+
+    import main as application
+    from src.services.id_pool import id_pool
+
+    weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    app = application.app
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        await reset_database()
+        clear_caches()
+        usernames, message_ids = await seed(args.users, args.messages, args.message_size, rng)
+        await id_pool.refill()
+
+        # Sign every client in before the clock starts; the first requests also pay for
+        # one-off imports and thread pool start-up, which would otherwise skew the results.
+        clients = [httpx.AsyncClient(transport=transport, base_url="http://benchmark") for _ in range(args.concurrency)]
+        try:
+            for i, client in enumerate(clients):
+                await login(client, usernames[i % len(usernames)])
+                await client.get("/")
+
+            samples = {operation: [] for operation in weights}
+            statuses = {}
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                run_client(
+                    client, usernames[i % len(usernames)], message_ids, weights, deadline,
+                    args.message_size, random.Random(args.seed * 1000 + i), samples, statuses,
+                )
+                for i, client in enumerate(clients)
+            ))
+            elapsed = time.monotonic() - started
+        finally:
+            for client in clients:
+                await client.aclose()
+
+    all_samples = [latency for latencies in samples.values() for latency in latencies]
+    return {
+        "elapsed_seconds": elapsed,
+        "total": summarize(all_samples, elapsed),
+        "endpoints": {operation: summarize(latencies, elapsed) for operation, latencies in samples.items()},
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mixed-traffic load test in-process.")
+    add_common_arguments(parser)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of traffic")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of simulated clients")
+    parser.add_argument("--users", type=int, default=20, help="number of seeded users")
+    parser.add_argument("--messages", type=int, default=1000, help="number of seeded messages")
+    parser.add_argument("--message-size", type=int, default=500, help="characters per message")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default: {DEFAULT_MIX})")
+    args = parser.parse_args()
+    configure_environment(args)
+    write_results(args, asyncio.run(main(args)))
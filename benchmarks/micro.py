@@ -0,0 +1,128 @@
+"""
+Times the hot functions of the service at several data sizes.
+
+Usage:
+    python -m benchmarks.micro [--sizes 100,1000,10000] [--iterations 200]
+                               [--mongo-uri mongodb://localhost:27017] [--output micro.json]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import (
+    add_common_arguments, clear_caches, configure_environment, reset_database, summarize, write_results,
+)
+
+
+async def measure(func, iterations: int, before=None):
+    """
+    Calls a coroutine function repeatedly and records each call's latency.
+
+    Args:
+    - func: The coroutine function, called with the iteration number.
+    - iterations (int): The number of calls.
+    - before (callable, optional): Called before each call, outside the timed section.
+
+    Returns:
+    - dict: The summary of the latencies, see `summarize`.
+    """
+    latencies = []
+    for i in range(iterations):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        await func(i)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies, sum(latencies))
+
+
+def make_request(token: str):
+    """
+    Builds a bare request carrying an access token cookie.
+    """
+    from starlette.requests import Request
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"cookie", f"access_token=Bearer {token}".encode("latin-1"))],
+    }
+    return Request(scope)
+
+
+async def bench_size(size: int, iterations: int, message_size: int, rng: random.Random):
+    """
+    Seeds `size` messages and times `past`, `get_current_user` and `all_text` against them.
+
+    Returns:
+    - dict: The summary of each benchmark.
+    """
+    from src.database.db import write_new_user
+    from src.repository.pastbin import all_text, past
+    from src.services.auth import create_access_token, get_current_user, user_cache
+
+    await reset_database()
+    clear_caches()
+    await write_new_user({
+        "username": "bench",
+        "email": "bench@example.com",
+        "hashed_password": "",
+        "is_active": True,
+        "confirmation_token": None,
+    })
+    texts = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz \n", k=message_size)) for _ in range(size)]
+    for text in texts:
+        await past("bench", text)
+
+    results = {}
+    results["past"] = await measure(
+        lambda i: past("bench", "".join(rng.choices("abcdefghijklmnopqrstuvwxyz \n", k=message_size))),
+        iterations,
+    )
+
+    request = make_request(create_access_token({"sub": "bench"}))
+
+    async def current_user(i):
+        assert await get_current_user(request) is not None
+
+    results["get_current_user_cold"] = await measure(current_user, iterations, before=user_cache.clear)
+    results["get_current_user_cached"] = await measure(current_user, iterations)
+
+    results["all_text_first_page"] = await measure(lambda i: all_text(), iterations)
+
+    state = {"token": None}
+
+    async def next_page(i):
+        _, state["token"] = await all_text(state["token"])
+
+    results["all_text_walk"] = await measure(next_page, iterations)
+    return results
+
+
+async def main(args):
+    """
+    Runs every benchmark at each data size and returns the measurements.
+    """
+    import main as application
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    rng = random.Random(args.seed)
+    app = application.app
+    results = {}
+    async with app.router.lifespan_context(app):
+        for size in sizes:
+            results[str(size)] = await bench_size(size, args.iterations, args.message_size, rng)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the hot functions of the service.")
+    add_common_arguments(parser)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated numbers of seeded messages")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per benchmark and size")
+    parser.add_argument("--message-size", type=int, default=500, help="characters per message")
+    args = parser.parse_args()
+    configure_environment(args)
+    write_results(args, asyncio.run(main(args)))
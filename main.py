@@ -1,20 +1,110 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 import asyncio
+import math
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 
-from src.repository.free_urls import free_urls
-from src.routes import auth, pastbin
+from src.routes import auth, health, metrics, pastbin, profiling, stats
 from src.conf.config import config
 from src.services.auth import get_current_user
+from src.services.id_pool import id_pool
+from src.services import passwords
+from src.services.rate_limit import RateLimitExceeded
+from src.services.metrics import MetricsMiddleware
+from src.services.profiling import ProfilingMiddleware, install_template_timing, profiling_enabled
+from src.services.email import email_dispatcher
+from src.services.expiry import expiry_sweeper
+from src.database.db import mongo_clients, paste_batcher
+from src.database.indexes import ensure_indexes
 from src.database.model import User
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background services when the application starts and stops them on shutdown.
+
+    Actions:
+    - Creates one MongoDB client per distinct database URI.
+    - Builds the database indexes unless `DB_CREATE_INDEXES_ON_STARTUP` is disabled; startup
+      fails if duplicate data blocks a unique index.
+    - Starts the task that keeps the free hash pool above its low watermark.
+    - Starts the workers that send queued emails.
+    - Starts the task that deletes expired pastes.
+    - Marks the application ready for `/readyz`.
+    - On shutdown, reports not ready first, then stops the background tasks and the password
+      hashing threads, writes any batched paste inserts and closes the MongoDB connection pools.
+    - If startup fails, e.g. with `IndexBuildError`, the same shutdown steps undo whatever had
+      already started before the error is raised.
+    """
+    app.state.ready = False
+    try:
+        mongo_clients.open()
+        if config.DB_CREATE_INDEXES_ON_STARTUP:
+            await ensure_indexes()
+        await id_pool.start()
+        await email_dispatcher.start()
+        await expiry_sweeper.start()
+        app.state.started = True
+        app.state.ready = True
+        yield
+    finally:
+        # Also runs when startup fails part way; stopping a service that never started is a no-op.
+        app.state.ready = False
+        await expiry_sweeper.stop()
+        await email_dispatcher.stop()
+        await id_pool.stop()
+        passwords.shutdown()
+        await paste_batcher.flush()
+        await mongo_clients.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(pastbin.router, prefix="/pastbin", tags=["pastbin"])
+app.include_router(stats.router, prefix="/stats", tags=["stats"])
+app.include_router(metrics.router, tags=["metrics"])
+app.include_router(profiling.router, prefix="/profiling", tags=["profiling"])
+app.include_router(health.router, tags=["health"])
+
+# Profiling hooks are only installed when enabled, so requests pay nothing for them otherwise.
+if profiling_enabled():
+    install_template_timing(config.TEMPLATES.env)
+    app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so the recorded latency covers every other middleware and the exception handlers.
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(passwords.PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: passwords.PasswordHasherBusy):
+    """
+    Answers requests that could not get a password hashing worker with HTTP 503.
+
+    Returns:
+    - JSONResponse: A 503 response asking the client to retry shortly.
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    """
+    Answers requests over their rate limit with HTTP 429.
+
+    Returns:
+    - JSONResponse: A 429 response telling the client how many seconds to wait.
+    """
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests"},
+        headers={"Retry-After": str(max(math.ceil(exc.retry_after), 1))},
+    )
 
 @app.get("/")
 async def index(request: Request, current_user: User = Depends(get_current_user)):
@@ -28,7 +118,6 @@ async def index(request: Request, current_user: User = Depends(get_current_user)
     Actions:
     - Checks if the user is logged in by inspecting `current_user`.
     - If not logged in, redirects the user to the login page.
-    - If logged in, performs an asynchronous operation to fetch or process URLs.
     - Finally, renders the `index.html` template, passing the user's information.
 
     Returns:
@@ -40,9 +129,6 @@ async def index(request: Request, current_user: User = Depends(get_current_user)
     if current_user is None:
         return RedirectResponse(url="/auth/login")
 
-    # Call the free_urls function to possibly fetch or process some URLs.
-    await free_urls()
-
     # Render the index.html template with the user's information.
     return config.TEMPLATES.TemplateResponse(
         "index.html",
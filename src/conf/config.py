@@ -1,4 +1,4 @@
-from pydantic import ConfigDict, field_validator
+from pydantic import ConfigDict, ValidationInfo, field_validator
 from pydantic_settings import BaseSettings
 from fastapi.templating import Jinja2Templates
 
@@ -8,13 +8,93 @@ class Settings(BaseSettings):
     DB_USERS_INFO: str = "your_mongodb"
     DB_FREE_URLS: str = "your_mongodb"
     DB_TEXT_USER: str = "your_mongodb"
+    DB_TEXT_USER_SHARDS: str = ""
+    DB_TEXT_USER_SHARD_FALLBACK: bool = False
+    DB_TEST_MODE: bool = False
+    DB_CREATE_INDEXES_ON_STARTUP: bool = True
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 60000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 10000
+    HEALTH_CHECK_TIMEOUT: float = 2.0
+    ID_STRATEGY: str = "hash"
+    ID_BLOCK_SIZE: int = 1000
+    ID_PERMUTATION_KEY: str = "your_id_permutation_key"
+    FREE_URLS_LOW_WATERMARK: int = 1000
+    FREE_URLS_REFILL_BATCH: int = 500
+    FREE_URLS_REFILL_INTERVAL: float = 5.0
+    MESSAGE_CACHE_MAX_ENTRIES: int = 10000
+    MESSAGE_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    MESSAGE_CACHE_NEGATIVE_TTL: float = 30.0
+    BODY_CACHE_MAX_ENTRIES: int = 5000
+    BODY_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    PAGE_CACHE_MAX_ENTRIES: int = 2000
+    PAGE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PASTE_CACHE_MAX_AGE: int = 31536000
+    MESSAGES_PAGE_SIZE: int = 50
+    MESSAGES_PAGE_SIZE_MAX: int = 200
+    MESSAGE_PREVIEW_LENGTH: int = 200
+    EXPORT_BATCH_SIZE: int = 500
+    BULK_CREATE_MAX_ITEMS: int = 500
+    SEARCH_PAGE_SIZE: int = 20
+    SEARCH_PAGE_SIZE_MAX: int = 100
+    SEARCH_MAX_TERMS: int = 2000
+    SEARCH_SNIPPET_LENGTH: int = 160
+    PASTE_DEFAULT_TTL: int = 0
+    PASTE_MAX_TTL: int = 0
+    PASTE_EXPIRY_GRACE: int = 24 * 60 * 60
+    PASTE_SWEEP_INTERVAL: float = 60.0
+    PASTE_SWEEP_BATCH: int = 500
+    PASTE_COMPRESSION: str = "zlib"
+    PASTE_COMPRESS_THRESHOLD: int = 4 * 1024
+    PASTE_CHUNK_THRESHOLD: int = 1024 * 1024
+    PASTE_CHUNK_SIZE: int = 256 * 1024
+    PASTE_WRITE_BATCHING: bool = False
+    PASTE_WRITE_BATCH_WINDOW: float = 0.002
+    PASTE_WRITE_BATCH_MAX: int = 100
+    PASTE_WRITE_CONCERN: str = ""
+    PASTE_WRITE_JOURNAL: bool | None = None
     ALGORITHM: str = "HS256"
     MAIL_USERNAME: str = "mail_username"
     MAIL_PASSWORD: str = "mail_password"
     MAIL_FROM: str = "mail_username"
     MAIL_PORT: int = 465
     MAIL_SERVER: str = "smtp.mail_server.com"
+    MAIL_FROM_NAME: str = "Pastbin"
+    MAIL_SSL_TLS: bool = True
+    MAIL_STARTTLS: bool = False
+    MAIL_USE_CREDENTIALS: bool = True
+    MAIL_VALIDATE_CERTS: bool = True
+    MAIL_TIMEOUT: float = 30.0
+    MAIL_WORKERS: int = 2
+    MAIL_QUEUE_SIZE: int = 1000
+    MAIL_MAX_RETRIES: int = 5
+    MAIL_RETRY_BACKOFF: float = 1.0
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SHARDS: int = 16
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    RATE_LIMIT_LOGIN: str = "10/minute"
+    RATE_LIMIT_LOGIN_USER: str = "100/hour,burst=20"
+    RATE_LIMIT_REGISTER: str = "5/hour"
+    RATE_LIMIT_CREATE_MESSAGE: str = "60/minute,burst=20"
+    RATE_LIMIT_CREATE_MESSAGES: str = "10/minute"
+    RATE_LIMIT_EXPORT: str = "10/hour"
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_TTL: float = 60.0
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_TOKEN: str = ""
+    PROFILE_INTERVAL: float = 0.005
+    PROFILE_MAX_PROFILES: int = 100
+    PROFILE_OUTPUT_DIR: str = ""
+    ADMIN_TOKEN: str = ""
     SECRET_KEY: str = "your_secret_key"
     TEMPLATES: Jinja2Templates = Jinja2Templates(directory="src/templates")
 
@@ -37,6 +117,125 @@ class Settings(BaseSettings):
             raise ValueError("Algorithm not supported")
         return v
 
+    @field_validator("DB_TEXT_USER_SHARDS")
+    @classmethod
+    def validate_text_user_shards(cls, v):
+        """
+        Validate the provided list of message shard URIs.
+
+        Args:
+        - v (str): The comma-separated URIs to validate.
+
+        Raises:
+        - ValueError: If a URI is empty or listed twice; shards on the same URI would share
+          one collection.
+
+        Returns:
+        - str: The validated URIs.
+        """
+        if v:
+            uris = [uri.strip() for uri in v.split(",")]
+            if not all(uris) or len(set(uris)) != len(uris):
+                raise ValueError("Message shard URIs must be non-empty and distinct")
+        return v
+
+    @field_validator("ID_STRATEGY")
+    @classmethod
+    def validate_id_strategy(cls, v):
+        """
+        Validate the provided paste ID strategy.
+
+        Args:
+        - v (str): The strategy to validate.
+
+        Raises:
+        - ValueError: If the provided strategy is not supported.
+
+        Returns:
+        - str: The validated strategy.
+        """
+        if v not in ["hash", "counter"]:
+            raise ValueError("ID strategy not supported")
+        return v
+
+    @field_validator("RATE_LIMIT_BACKEND")
+    @classmethod
+    def validate_rate_limit_backend(cls, v):
+        """
+        Validate the provided rate limit backend.
+
+        Args:
+        - v (str): The backend to validate.
+
+        Raises:
+        - ValueError: If the provided backend is not supported.
+
+        Returns:
+        - str: The validated backend.
+        """
+        if v not in ["memory", "mongo"]:
+            raise ValueError("Rate limit backend not supported")
+        return v
+
+    @field_validator("PASTE_COMPRESSION")
+    @classmethod
+    def validate_paste_compression(cls, v):
+        """
+        Validate the provided paste compression codec.
+
+        Args:
+        - v (str): The codec to validate.
+
+        Raises:
+        - ValueError: If the provided codec is not supported.
+
+        Returns:
+        - str: The validated codec.
+        """
+        if v not in ["zlib", "zstd"]:
+            raise ValueError("Paste compression not supported")
+        return v
+
+    @field_validator("PASTE_WRITE_CONCERN")
+    @classmethod
+    def validate_paste_write_concern(cls, v):
+        """
+        Validate the provided paste write concern.
+
+        Args:
+        - v (str): The write concern to validate.
+
+        Raises:
+        - ValueError: If the provided write concern is not supported.
+
+        Returns:
+        - str: The validated write concern.
+        """
+        if v not in ["", "majority"] and not v.isdigit():
+            raise ValueError("Paste write concern not supported")
+        return v
+
+    @field_validator("PASTE_WRITE_JOURNAL")
+    @classmethod
+    def validate_paste_write_journal(cls, v, info: ValidationInfo):
+        """
+        Validate the provided paste journal setting against the paste write concern.
+
+        Args:
+        - v (bool | None): The journal setting to validate.
+        - info (ValidationInfo): The fields validated so far, including `PASTE_WRITE_CONCERN`.
+
+        Raises:
+        - ValueError: If journaled writes are requested with unacknowledged writes
+          (`PASTE_WRITE_CONCERN=0`), which MongoDB rejects.
+
+        Returns:
+        - bool | None: The validated journal setting.
+        """
+        if v and info.data.get("PASTE_WRITE_CONCERN") == "0":
+            raise ValueError("PASTE_WRITE_JOURNAL=true cannot be combined with PASTE_WRITE_CONCERN=0")
+        return v
+
     model_config = ConfigDict(extra="ignore", env_file=".env", env_file_encoding="utf-8")
 
 
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+
+from pymongo.errors import DuplicateKeyError, WriteError
+
+logger = logging.getLogger(__name__)
+
+# Error code MongoDB reports for a duplicate key.
+DUPLICATE_KEY_ERROR = 11000
+
+
+def write_error(error: dict):
+    """
+    Turns one entry of a bulk write's 'writeErrors' into the exception `insert_one` would raise.
+
+    Args:
+    - error (dict): The write error document.
+
+    Returns:
+    - WriteError: A `DuplicateKeyError` for duplicate keys, otherwise a `WriteError`.
+    """
+    message = error.get("errmsg", "Write failed")
+    if error.get("code") == DUPLICATE_KEY_ERROR:
+        return DuplicateKeyError(message, DUPLICATE_KEY_ERROR, error)
+    return WriteError(message, error.get("code"), error)
+
+
+class InsertBatcher:
+    """
+    Coalesces concurrent single-document inserts into unordered `insert_many` calls.
+
+    The first insert of a batch starts a timer of `window` seconds; every insert arriving
+    before it fires joins the batch, which is written early once it holds `max_batch`
+    documents. Each caller waits for the batch and gets its own document's outcome, so a
+    duplicate key in one document fails only that caller.
+
+    Attributes:
+    - insert_many: A coroutine function inserting a list of documents and returning the write
+      error document of each failed one, keyed by position.
+    - window (float): The number of seconds a batch stays open.
+    - max_batch (int): The number of documents that closes a batch immediately.
+    """
+
+    def __init__(self, insert_many, window: float, max_batch: int):
+        self.insert_many = insert_many
+        self.window = window
+        self.max_batch = max_batch
+        self.batches_total = 0
+        self.documents_total = 0
+        self.failed_total = 0
+        self.largest_batch = 0
+        self._pending = []
+        self._timer = None
+        self._writes = set()
+
+    async def insert(self, doc: dict):
+        """
+        Adds a document to the open batch and waits until the batch is written.
+
+        Args:
+        - doc (dict): The document to insert.
+
+        Raises:
+        - WriteError: If this document could not be written, e.g. `DuplicateKeyError`.
+        - Exception: Any error that failed the whole batch, such as a lost connection.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((doc, future))
+        if len(self._pending) >= self.max_batch:
+            self._close_batch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._close_batch)
+        await future
+
+    def _close_batch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list):
+        self.batches_total += 1
+        self.documents_total += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            errors = await self.insert_many([doc for doc, _ in batch])
+        except Exception as e:
+            logger.warning("Batched insert of %d document(s) failed", len(batch), exc_info=True)
+            self.failed_total += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.failed_total += len(errors)
+        for position, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if position in errors:
+                future.set_exception(write_error(errors[position]))
+            else:
+                future.set_result(None)
+
+    async def flush(self):
+        """
+        Writes the open batch now and waits for every batch in flight, e.g. on shutdown.
+        """
+        self._close_batch()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self):
+        """
+        Reports the batching metrics.
+
+        Returns:
+        - dict: The batch and document counters, the average and largest batch size and the
+          number of documents waiting in the open batch.
+        """
+        return {
+            "batches_total": self.batches_total,
+            "documents_total": self.documents_total,
+            "failed_total": self.failed_total,
+            "average_batch": self.documents_total / self.batches_total if self.batches_total else 0.0,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending),
+        }
@@ -1,50 +1,876 @@
-from pymongo import MongoClient
+import asyncio
+import hashlib
+import inspect
+import re
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import AsyncMongoClient, ReplaceOne, ReturnDocument, UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from src.conf.config import config
+from src.database.batching import InsertBatcher
+from src.services.metrics import instrument_module
+
+
+def create_client(uri: str):
+    """
+    Creates an asynchronous MongoDB client for the given URI.
+
+    Parameters:
+    - uri (str): The MongoDB connection string.
+
+    Actions:
+    - In test mode (`DB_TEST_MODE`), returns an in-memory stand-in from `mongomock_motor`,
+      so the application can run without a mongod. A local mongod can be used instead by
+      simply pointing the `DB_*` URIs at it. Recent PyMongo versions pass a `sort` option
+      with every `UpdateOne` and `ReplaceOne` of a `bulk_write`, which `mongomock` does not
+      accept; the stand-in is taught to drop it, since this application never sets it.
+    - Otherwise returns a `pymongo.AsyncMongoClient` configured with the pool sizes and
+      timeouts from the settings. The client connects lazily on first use.
+
+    Returns:
+    - AsyncMongoClient: The client instance.
+    """
+    if config.DB_TEST_MODE:
+        try:
+            from mongomock.collection import BulkOperationBuilder
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError as e:
+            raise RuntimeError("DB_TEST_MODE requires the 'mongomock-motor' package") from e
+        if not getattr(BulkOperationBuilder, "accepts_sort", False):
+            for name in ("add_update", "add_replace"):
+                def add(self, *args, sort=None, _original=getattr(BulkOperationBuilder, name), **kwargs):
+                    return _original(self, *args, **kwargs)
 
-# Initialize MongoDB clients and databases
-client_users_info = MongoClient(config.DB_USERS_INFO)
-client_free_urls = MongoClient(config.DB_FREE_URLS)
-client_text_user = MongoClient(config.DB_TEXT_USER)
+                setattr(BulkOperationBuilder, name, add)
+            BulkOperationBuilder.accepts_sort = True
+        return AsyncMongoMockClient()
 
-db_users_info = client_users_info["users_info"]["users_info"]
-db_free_urls = client_free_urls["free_urls"]["free_urls"]
-db_text_user = client_text_user["text_user"]["text_user"]
+    return AsyncMongoClient(
+        uri,
+        maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+        minPoolSize=config.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=config.MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=config.MONGO_SOCKET_TIMEOUT_MS,
+    )
 
-async def write_to_free_urls(hash):
+async def aggregate(collection, pipeline: list, **kwargs):
     """
-    Inserts a hash into the 'free_urls' collection.
+    Runs an aggregation pipeline and returns its cursor.
 
     Parameters:
-    - hash (str): The hash string to be inserted into the database.
+    - collection: The collection to aggregate.
+    - pipeline (list): The aggregation stages.
+    - **kwargs: Extra options passed to `aggregate`.
 
     Actions:
-    - Attempts to insert the hash into the 'free_urls' collection.
-    - If an exception occurs, it is silently passed.
+    - Awaits the call when the driver returns a coroutine (`AsyncMongoClient`) and uses the
+      cursor directly when it does not (the in-memory test client).
 
     Returns:
-    - None
+    - An asynchronous cursor over the results.
+    """
+    cursor = collection.aggregate(pipeline, **kwargs)
+    if inspect.isawaitable(cursor):
+        cursor = await cursor
+    return cursor
+
+class MongoClients:
+    """
+    Holds one MongoDB client per distinct URI.
+
+    Databases configured with the same URI share a client, and with it one connection pool
+    and one set of monitoring threads. Clients are created on first use, normally by the
+    application's lifespan hook, and closed by it on shutdown.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        # Bumped on close, so collection handles of closed clients are resolved again.
+        self.generation = 0
+
+    def get(self, uri: str):
+        """
+        Returns the client for a URI, creating it on first use.
+
+        Parameters:
+        - uri (str): The MongoDB connection string.
+
+        Returns:
+        - The client shared by every database configured with this URI.
+        """
+        client = self._clients.get(uri)
+        if client is None:
+            client = self._clients[uri] = create_client(uri)
+        return client
+
+    def open(self):
+        """
+        Creates the clients of every configured database, so startup fails on a bad URI
+        rather than the first request.
+
+        Returns:
+        - int: The number of distinct clients.
+        """
+        for uri in DATABASES.values():
+            self.get(uri)
+        return len(self._clients)
+
+    async def close(self):
+        """
+        Closes every client and its connection pool.
+
+        Actions:
+        - Forgets the clients first, so a later use creates new ones instead of reusing closed pools.
+        """
+        clients, self._clients = self._clients, {}
+        self.generation += 1
+        for client in clients.values():
+            result = client.close()
+            if inspect.isawaitable(result):
+                await result
+
+    def stats(self):
+        """
+        Reports the number of open clients.
+
+        Returns:
+        - dict: The number of distinct clients and configured databases.
+        """
+        return {"clients": len(self._clients), "databases": len(DATABASES)}
+
+
+class LazyCollection:
+    """
+    A collection handle that resolves its client on first use.
+
+    Attribute access is forwarded to the real collection, so it is used exactly like one.
+
+    Attributes:
+    - uri (str): The connection string of the deployment holding the collection.
+    - database (str): The database name.
+    - name (str): The collection name.
+    - write_concern (WriteConcern, optional): Overrides the client's write concern.
+    """
+
+    def __init__(self, uri: str, database: str, name: str, write_concern: WriteConcern = None):
+        self.uri = uri
+        self.database_name = database
+        self.collection_name = name
+        self.write_concern = write_concern
+        self._collection = None
+        self._generation = None
+
+    def resolve(self):
+        """
+        Returns the real collection, creating its client if needed.
+        """
+        if self._collection is None or self._generation != mongo_clients.generation:
+            collection = mongo_clients.get(self.uri)[self.database_name][self.collection_name]
+            # The in-memory stand-in has no write concerns, and its `with_options` is not async.
+            if self.write_concern is not None and not config.DB_TEST_MODE:
+                collection = collection.with_options(write_concern=self.write_concern)
+            self._collection = collection
+            self._generation = mongo_clients.generation
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+
+# Connection string of each shard, in order; see `shard_index`. Messages are placed by ID, and
+# shared bodies with their chunks by content hash. Only the per-user message counts stay on
+# `DB_TEXT_USER`, whether or not it is also one of the shards.
+TEXT_USER_SHARDS = [uri.strip() for uri in config.DB_TEXT_USER_SHARDS.split(",") if uri.strip()] or [config.DB_TEXT_USER]
+
+# Number of hash-prefix buckets the paste IDs are spread over; see `shard_index`.
+SHARD_BUCKETS = 4096
+
+# Connection string of each database; databases sharing a URI share a client.
+DATABASES = {
+    "users_info": config.DB_USERS_INFO,
+    "free_urls": config.DB_FREE_URLS,
+    "text_user": config.DB_TEXT_USER,
+}
+if len(TEXT_USER_SHARDS) > 1:
+    DATABASES.update({f"text_user_shard{n}": uri for n, uri in enumerate(TEXT_USER_SHARDS)})
+
+def bucket_shard(bucket: int, shard_count: int):
+    """
+    Assigns a hash-prefix bucket to a shard by rendezvous hashing.
+
+    Parameters:
+    - bucket (int): The bucket number.
+    - shard_count (int): The number of shards.
+
+    Actions:
+    - Picks the shard with the highest hash of (shard position, bucket). Shards are known by
+      their position, so appending a shard only moves the buckets it wins, about 1/n of the
+      messages, and never moves messages between the existing shards.
+
+    Returns:
+    - int: The shard position.
+    """
+    return max(
+        range(shard_count),
+        key=lambda shard: hashlib.blake2b(f"{shard}:{bucket}".encode("ascii"), digest_size=8).digest(),
+    )
+
+# Shard of each bucket, computed once.
+_bucket_shards = [bucket_shard(bucket, len(TEXT_USER_SHARDS)) for bucket in range(SHARD_BUCKETS)]
+
+def shard_index(message_id: str):
+    """
+    Finds the shard a message belongs on.
+
+    Parameters:
+    - message_id (str): The paste ID.
+
+    Actions:
+    - Takes the first 12 bits of the SHA-256 of the ID as its bucket, so the placement is
+      stable across processes and does not depend on the ID strategy.
+
+    Returns:
+    - int: The position of the shard in `TEXT_USER_SHARDS`.
+    """
+    if len(TEXT_USER_SHARDS) == 1:
+        return 0
+    digest = hashlib.sha256(message_id.encode("utf-8")).digest()
+    return _bucket_shards[int.from_bytes(digest[:2], "big") >> 4]
+
+def paste_write_concern():
+    """
+    Builds the write concern of paste inserts from the settings.
+
+    Returns:
+    - WriteConcern: The concern set by `PASTE_WRITE_CONCERN` ("majority" or a number of
+      nodes, "0" for unacknowledged writes) and `PASTE_WRITE_JOURNAL`, or None to keep the
+      deployment's default.
+    """
+    w = config.PASTE_WRITE_CONCERN
+    if not w and config.PASTE_WRITE_JOURNAL is None:
+        return None
+    return WriteConcern(w=int(w) if w.isdigit() else (w or None), j=config.PASTE_WRITE_JOURNAL)
+
+mongo_clients = MongoClients()
+
+db_users_info = LazyCollection(config.DB_USERS_INFO, "users_info", "users_info")
+db_free_urls = LazyCollection(config.DB_FREE_URLS, "free_urls", "free_urls")
+db_counters = LazyCollection(config.DB_FREE_URLS, "free_urls", "counters")
+db_rate_limits = LazyCollection(config.DB_FREE_URLS, "free_urls", "rate_limits")
+db_message_counts = LazyCollection(config.DB_TEXT_USER, "text_user", "message_counts")
+# The messages collection of each shard, and the same with the write concern of paste inserts.
+db_text_user_shards = [LazyCollection(uri, "text_user", "text_user") for uri in TEXT_USER_SHARDS]
+db_text_user_shard_inserts = [
+    LazyCollection(uri, "text_user", "text_user", paste_write_concern()) for uri in TEXT_USER_SHARDS
+]
+# The shared bodies of each shard, placed by content hash, and the chunks of the bodies stored there.
+db_text_bodies_shards = [LazyCollection(uri, "text_user", "text_bodies") for uri in TEXT_USER_SHARDS]
+db_text_chunks_shards = [LazyCollection(uri, "text_user", "text_user_chunks") for uri in TEXT_USER_SHARDS]
+# The first shard, which is the only one unless `DB_TEXT_USER_SHARDS` is set.
+db_text_user = db_text_user_shards[0]
+db_text_bodies = db_text_bodies_shards[0]
+db_text_chunks = db_text_chunks_shards[0]
+
+def message_shards(message_id: str = None):
+    """
+    Lists the shards to look for a message on, in order.
+
+    Parameters:
+    - message_id (str, optional): The paste ID; without one every shard is searched.
+
+    Returns:
+    - list: The message's own shard, followed by every other shard if
+      `DB_TEXT_USER_SHARD_FALLBACK` is enabled, as it should be while messages are rebalanced.
+    """
+    if message_id is None:
+        return db_text_user_shards
+    home = db_text_user_shards[shard_index(message_id)]
+    if not config.DB_TEXT_USER_SHARD_FALLBACK:
+        return [home]
+    return [home] + [shard for shard in db_text_user_shards if shard is not home]
+
+def body_shards(body_id: str):
+    """
+    Lists the shards to look for a shared body on, in order.
+
+    Parameters:
+    - body_id (str): The content hash of the body.
+
+    Returns:
+    - list: The position of the body's own shard, followed by every other shard if
+      `DB_TEXT_USER_SHARD_FALLBACK` is enabled, as it should be while bodies are rebalanced.
+      The own shard is then listed again at the end: `move_body` copies a body there before
+      deleting it elsewhere, so a lookup that missed it at first finds it on the second try.
+    """
+    home = shard_index(body_id)
+    if not config.DB_TEXT_USER_SHARD_FALLBACK:
+        return [home]
+    return [home] + [shard for shard in range(len(TEXT_USER_SHARDS)) if shard != home] + [home]
+
+async def gather_shards(query):
+    """
+    Runs a query on every shard concurrently.
+
+    Parameters:
+    - query: A coroutine function called with each shard's messages collection.
+
+    Returns:
+    - list: The result of each shard, in shard order.
+    """
+    if len(db_text_user_shards) == 1:
+        return [await query(db_text_user_shards[0])]
+    return await asyncio.gather(*(query(shard) for shard in db_text_user_shards))
+
+async def merge_sorted(cursors: list, key, reverse: bool = False):
+    """
+    Merges cursors that are each sorted by the same key into one sorted stream.
+
+    Parameters:
+    - cursors (list): The asynchronous iterables, one per shard.
+    - key: A function returning a document's sort key.
+    - reverse (bool): Whether the cursors are sorted in descending order.
+
+    Returns:
+    - An asynchronous generator over the documents of all cursors, in order.
+    """
+    pick = max if reverse else min
+    iterators = [cursor.__aiter__() for cursor in cursors]
+    heads = {}
+    for n, iterator in enumerate(iterators):
+        try:
+            heads[n] = await iterator.__anext__()
+        except StopAsyncIteration:
+            pass
+    while heads:
+        n = pick(heads, key=lambda n: key(heads[n]))
+        yield heads[n]
+        try:
+            heads[n] = await iterators[n].__anext__()
+        except StopAsyncIteration:
+            del heads[n]
+
+def merge_pages(pages: list, key, limit: int):
+    """
+    Merges the newest-first pages read from each shard into one page.
+
+    Parameters:
+    - pages (list): The documents returned by each shard, each sorted by `key` descending.
+    - key: A function returning a document's sort key.
+    - limit (int): The maximum number of documents to keep.
+
+    Returns:
+    - list: The first `limit` documents across shards, sorted by `key` descending.
+    """
+    if len(pages) == 1:
+        return pages[0]
+    return sorted((doc for page in pages for doc in page), key=key, reverse=True)[:limit]
+
+async def ping_databases(timeout: float = None):
+    """
+    Checks that every configured database can be reached.
+
+    Parameters:
+    - timeout (float, optional): The number of seconds to wait for each deployment;
+      defaults to `HEALTH_CHECK_TIMEOUT`.
+
+    Actions:
+    - Sends one `ping` per distinct client, concurrently, so databases sharing a URI are
+      checked once and the check takes at most `timeout` seconds.
+
+    Returns:
+    - dict: The error message of each unreachable database, keyed by database name; empty
+      if all of them answered. URIs are never reported, since they may hold credentials.
+    """
+    timeout = timeout or config.HEALTH_CHECK_TIMEOUT
+
+    async def ping(uri: str):
+        try:
+            await asyncio.wait_for(mongo_clients.get(uri).admin.command("ping"), timeout)
+        except asyncio.TimeoutError:
+            return f"no answer within {timeout:g}s"
+        except Exception as e:
+            return type(e).__name__
+        return None
+
+    uris = list(set(DATABASES.values()))
+    errors_by_uri = dict(zip(uris, await asyncio.gather(*(ping(uri) for uri in uris))))
+    return {name: errors_by_uri[uri] for name, uri in DATABASES.items() if errors_by_uri[uri]}
+
+def live_filter(now: datetime = None):
+    """
+    Builds the filter that excludes expired messages.
+
+    Parameters:
+    - now (datetime, optional): The reference time; defaults to the current UTC time.
+
+    Returns:
+    - dict: A filter matching messages without an 'expires_at' field or expiring after `now`.
+      MongoDB's TTL monitor only runs periodically, so readers must not rely on it alone.
+    """
+    return {"expires_at": {"$not": {"$lte": now or datetime.now(timezone.utc)}}}
+
+async def write_many_to_free_urls(hashes: list):
+    """
+    Inserts a batch of hashes into the 'free_urls' collection.
+
+    Parameters:
+    - hashes (list): The hash strings to be inserted into the database.
+
+    Actions:
+    - Inserts all hashes with a single unordered `insert_many`, so one duplicate does not
+      abort the rest of the batch.
+
+    Returns:
+    - int: The number of hashes actually inserted.
     """
     try:
-        db_free_urls.insert_one({"free_hash": hash})
-    except Exception as e:
-        pass
+        result = await db_free_urls.insert_many([{"free_hash": h} for h in hashes], ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get("nInserted", 0)
+
+async def count_free_urls():
+    """
+    Estimates the number of hashes waiting in the 'free_urls' collection.
+
+    Parameters:
+    - None
+
+    Actions:
+    - Reads the collection metadata count, which does not scan the collection.
+
+    Returns:
+    - int: The estimated number of free hashes.
+    """
+    return await db_free_urls.estimated_document_count()
+
+async def claim_one_from_free_urls():
+    """
+    Atomically removes one hash from the 'free_urls' collection and returns it.
+
+    Parameters:
+    - None
+
+    Actions:
+    - Runs a single `find_one_and_delete`, so two concurrent callers can never
+      receive the same hash. Hashes reserved by `claim_many_from_free_urls` are skipped.
+
+    Returns:
+    - str: The claimed hash, or None if the collection is empty.
+    """
+    doc = await db_free_urls.find_one_and_delete({"claimed_by": {"$exists": False}})
+    return doc["free_hash"] if doc else None
+
+async def claim_many_from_free_urls(count: int):
+    """
+    Atomically removes up to `count` hashes from the 'free_urls' collection and returns them.
+
+    Parameters:
+    - count (int): The number of hashes wanted.
+
+    Actions:
+    - Picks candidate documents, then tags the ones nobody has claimed yet with a unique
+      claim ID in one `update_many`. Each document can only be tagged once, so concurrent
+      callers never receive the same hash.
+    - Reads back the tagged hashes and deletes them.
+
+    Returns:
+    - list: The claimed hashes; fewer than `count` if the collection runs low.
+    """
+    candidates = await db_free_urls.find({"claimed_by": {"$exists": False}}, {"_id": 1}).limit(count).to_list(length=count)
+    if not candidates:
+        return []
+    claim_id = ObjectId()
+    await db_free_urls.update_many(
+        {"_id": {"$in": [doc["_id"] for doc in candidates]}, "claimed_by": {"$exists": False}},
+        {"$set": {"claimed_by": claim_id}},
+    )
+    claimed = await db_free_urls.find({"claimed_by": claim_id}, {"free_hash": 1}).to_list(length=count)
+    await db_free_urls.delete_many({"claimed_by": claim_id})
+    return [doc["free_hash"] for doc in claimed]
+
+async def lease_id_block(name: str, size: int):
+    """
+    Reserves a block of consecutive counter values in the 'counters' collection.
+
+    Parameters:
+    - name (str): The name of the counter.
+    - size (int): The number of values to reserve.
+
+    Actions:
+    - Atomically increments the counter by `size` with an upsert, so concurrent
+      callers always receive disjoint blocks.
+
+    Returns:
+    - int: The first value of the reserved block; the block ends at this value plus `size`.
+    """
+    doc = await db_counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"value": size}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["value"] - size
 
-async def write_to_text_user(username: str, text: str, message_id: str):
+async def take_rate_limit_token(key: str, rate: float, burst: int, cost: int = 1):
+    """
+    Takes tokens from a shared token bucket in the 'rate_limits' collection.
+
+    Parameters:
+    - key (str): The bucket key.
+    - rate (float): The refill rate in tokens per second.
+    - burst (int): The bucket size.
+    - cost (int): The number of tokens the request needs.
+
+    Actions:
+    - Refills and debits the bucket in one atomic pipeline update, upserting new buckets as
+      full. Elapsed time is measured with the server clock, so workers on hosts with skewed
+      clocks still agree.
+    - Sets 'expires_at' to when the bucket would be full again; a TTL index then removes
+      idle buckets, which is equivalent to keeping them full.
+
+    Returns:
+    - tuple: Whether the tokens were taken, and the tokens left in the bucket.
+    """
+    elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated", "$$NOW"]}]}, 1000]}
+    refilled = {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]}
+    doc = await db_rate_limits.find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": refilled, "updated": "$$NOW"}},
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                "expires_at": {"$add": ["$$NOW", int(burst / rate * 1000) if rate else 0]},
+            }},
+        ],
+        projection={"tokens": 1, "allowed": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["allowed"], doc["tokens"]
+
+async def peek_rate_limit_tokens(key: str, rate: float, burst: int):
+    """
+    Reads the tokens left in a shared token bucket in the 'rate_limits' collection.
+
+    Parameters:
+    - key (str): The bucket key.
+    - rate (float): The refill rate in tokens per second.
+    - burst (int): The bucket size.
+
+    Actions:
+    - Refills the bucket for the time elapsed since it was last used in an aggregation,
+      with the server clock as in `take_rate_limit_token`, without changing it.
+
+    Returns:
+    - float: The tokens in the bucket; `burst` for a bucket that does not exist.
+    """
+    elapsed = {"$divide": [{"$subtract": ["$$NOW", "$updated"]}, 1000]}
+    cursor = await aggregate(db_rate_limits, [
+        {"$match": {"_id": key}},
+        {"$project": {"tokens": {"$min": [burst, {"$add": ["$tokens", {"$multiply": [elapsed, rate]}]}]}}},
+    ])
+    async for doc in cursor:
+        return doc["tokens"]
+    return burst
+
+async def write_to_text_user(
+    username: str, body: dict, message_id: str, preview: str = None,
+    expires_at: datetime = None, burn: bool = False, search_text: str = None,
+):
     """
     Inserts a new text message into the 'text_user' collection.
 
     Parameters:
     - username (str): The username associated with the message.
-    - text (str): The text content of the message.
+    - body (dict): Where the message text is stored, {"body_id": ...} for a shared body in
+      'text_bodies'.
     - message_id (str): A unique identifier for the message.
+    - preview (str, optional): A shortened copy of the text used by listings.
+    - expires_at (datetime, optional): The UTC time after which the message is no longer served.
+    - burn (bool): Whether the message is deleted by its first successful read.
+    - search_text (str, optional): The terms the message is found by in searches; the text
+      index picks them up as part of the insert.
+
+    Actions:
+    - Inserts the message into the 'text_user' collection of its shard, stamped with its
+      creation time, with the write concern of `paste_write_concern`.
+    - With `PASTE_WRITE_BATCHING`, the insert joins the inserts of concurrent requests and
+      is written with them by `paste_batcher`; errors still only concern this message.
+
+    Returns:
+    - None
+    """
+    doc = {"username": username, "id": message_id, "created_at": datetime.now(timezone.utc), **body}
+    if preview is not None:
+        doc["preview"] = preview
+    if expires_at is not None:
+        doc["expires_at"] = expires_at
+    if burn:
+        doc["burn"] = True
+    if search_text is not None:
+        doc["search_text"] = search_text
+    if config.PASTE_WRITE_BATCHING:
+        await paste_batcher.insert(doc)
+    else:
+        await db_text_user_shard_inserts[shard_index(message_id)].insert_one(doc)
+
+async def add_body_reference(body_id: str):
+    """
+    Counts one more message referencing an existing body in the 'text_bodies' collection.
+
+    Parameters:
+    - body_id (str): The content hash of the body.
+
+    Actions:
+    - Increments the body's reference count if the body exists on one of its `body_shards`.
+
+    Returns:
+    - bool: True if the body exists, False if it still has to be written.
+    """
+    for shard in body_shards(body_id):
+        result = await db_text_bodies_shards[shard].update_one({"_id": body_id}, {"$inc": {"refs": 1}})
+        if result.matched_count:
+            return True
+    return False
+
+async def write_body(body_id: str, body: dict):
+    """
+    Stores a body in the 'text_bodies' collection with one reference, or adds a reference if it exists.
+
+    Parameters:
+    - body_id (str): The content hash of the body.
+    - body (dict): The stored form of the text produced by `repository.paste_body.encode_body`.
+
+    Actions:
+    - Upserts the body on its shard, setting its fields only when it is inserted. If a
+      concurrent writer inserts the same body first, the upsert is retried and becomes a
+      plain increment.
+
+    Returns:
+    - bool: True if this call inserted the body, False if it only added a reference.
+    """
+    for attempt in range(2):
+        try:
+            result = await db_text_bodies_shards[shard_index(body_id)].update_one(
+                {"_id": body_id}, {"$inc": {"refs": 1}, "$setOnInsert": body}, upsert=True
+            )
+            return result.upserted_id is not None
+        except DuplicateKeyError:
+            if attempt:
+                raise
+
+async def find_existing_body_ids(body_ids: list):
+    """
+    Finds which of the given bodies are already stored in the 'text_bodies' collection.
+
+    Parameters:
+    - body_ids (list): The content hashes to look up.
+
+    Actions:
+    - Runs one `$in` query per shard that only returns the IDs, on the shards the bodies
+      belong on. Bodies still on another shard while bodies are rebalanced are not reported,
+      so they are written to their own shard again, where `move_body` merges the two copies.
+
+    Returns:
+    - set: The content hashes that exist.
+    """
+    wanted = {}
+    for body_id in body_ids:
+        wanted.setdefault(shard_index(body_id), []).append(body_id)
+    existing = set()
+    for shard, ids in wanted.items():
+        cursor = db_text_bodies_shards[shard].find({"_id": {"$in": ids}}, {"_id": 1})
+        existing.update([doc["_id"] async for doc in cursor])
+    return existing
+
+async def write_bodies(bodies: dict):
+    """
+    Stores several bodies in the 'text_bodies' collection, or adds references to existing ones.
+
+    Parameters:
+    - bodies (dict): For each content hash, a tuple of the stored form of the text (empty for
+      a body known to exist) and the number of references to add.
+
+    Actions:
+    - Upserts all new bodies and increments all existing ones with one unordered `bulk_write`
+      per shard, setting body fields only when they are inserted. Upserts that lose a race
+      with a concurrent insert of the same body are retried once as plain increments.
+
+    Returns:
+    - set: The content hashes of the bodies this call inserted.
+    """
+    operations = {}
+    for body_id, (body, refs) in bodies.items():
+        update = {"$inc": {"refs": refs}}
+        if body:
+            update["$setOnInsert"] = body
+        operations.setdefault(shard_index(body_id), []).append(UpdateOne({"_id": body_id}, update, upsert=bool(body)))
+    inserted = set()
+    for shard, shard_operations in operations.items():
+        collection = db_text_bodies_shards[shard]
+        try:
+            result = await collection.bulk_write(shard_operations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != 11000 for error in errors):
+                raise
+            await collection.bulk_write([shard_operations[error["index"]] for error in errors], ordered=False)
+            inserted.update(upserted["_id"] for upserted in e.details.get("upserted", []))
+        else:
+            inserted.update(result.upserted_ids.values())
+    return inserted
+
+async def release_body(body_id: str):
+    """
+    Removes one reference to a body and deletes the body once nothing references it.
+
+    Parameters:
+    - body_id (str): The content hash of the body.
+
+    Actions:
+    - Atomically decrements the reference count on the shard holding the body.
+    - If it reaches zero, deletes the body, unless a new reference was added in the meantime
+      or `move_body` is moving it, and then its chunks. Only the chunks stored under the
+      deleted body's 'chunk_owner' are removed, so chunks a concurrent writer stores for a new
+      copy of the body are kept.
+
+    Returns:
+    - bool: True if the body was deleted.
+    """
+    for shard in body_shards(body_id):
+        doc = await db_text_bodies_shards[shard].find_one_and_update(
+            {"_id": body_id},
+            {"$inc": {"refs": -1}},
+            projection={"refs": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is not None:
+            break
+    if doc is None or doc["refs"] > 0:
+        return False
+    deleted = await db_text_bodies_shards[shard].find_one_and_delete(
+        {"_id": body_id, "refs": {"$lte": 0}, "moving": {"$exists": False}}, {"chunk_owner": 1},
+    )
+    if deleted is None:
+        return False
+    if "chunk_owner" in deleted:
+        await delete_text_chunks(deleted["chunk_owner"], shard)
+    return True
+
+async def find_one_body(body_id: str):
+    """
+    Finds a shared body in the 'text_bodies' collection.
+
+    Parameters:
+    - body_id (str): The content hash of the body.
+
+    Actions:
+    - Looks the body up by `_id` on its `body_shards`.
+
+    Returns:
+    - tuple: The stored body fields and the position of the shard holding the body and its
+      chunks, or (None, None) if not found.
+    """
+    for shard in body_shards(body_id):
+        body = await db_text_bodies_shards[shard].find_one({"_id": body_id}, {"_id": 0, "refs": 0, "moving": 0})
+        if body is not None:
+            return body, shard
+    return None, None
+
+async def write_many_to_text_user(messages: list):
+    """
+    Inserts several text messages into the 'text_user' collection at once.
+
+    Parameters:
+    - messages (list): The message documents, shaped like those written by `write_to_text_user`.
+
+    Actions:
+    - Inserts the messages of each shard with a single unordered `insert_many`, so one failing
+      message does not stop the others, with the write concern of `paste_write_concern`.
+      Shards are written concurrently.
+
+    Returns:
+    - dict: The write error document ('code', 'errmsg') of each failed message, keyed by its
+      position in `messages`.
+    """
+    positions = {}
+    for position, message in enumerate(messages):
+        positions.setdefault(shard_index(message["id"]), []).append(position)
+
+    async def insert(shard: int, shard_positions: list):
+        try:
+            await db_text_user_shard_inserts[shard].insert_many([messages[p] for p in shard_positions], ordered=False)
+        except BulkWriteError as e:
+            return {shard_positions[error["index"]]: error for error in e.details.get("writeErrors", [])}
+        return {}
+
+    errors = {}
+    for shard_errors in await asyncio.gather(*(insert(shard, p) for shard, p in positions.items())):
+        errors.update(shard_errors)
+    return errors
+
+async def write_text_chunks(owner_id: str, chunks: list, shard: int):
+    """
+    Inserts the chunks of a large body into the 'text_user_chunks' collection.
+
+    Parameters:
+    - owner_id (str): The body's 'chunk_owner', stored in the chunks' 'paste_id' field.
+    - chunks (list): The compressed chunks, in order.
+    - shard (int): The position of the shard the body is stored on.
 
     Actions:
-    - Inserts the message into the 'text_user' collection.
+    - Inserts all chunks with a single unordered `insert_many`, numbered from 0. Chunks that a
+      concurrent writer of the same body already stored are skipped, as their content is identical.
+
+    Returns:
+    - None
+    """
+    try:
+        await db_text_chunks_shards[shard].insert_many(
+            [{"paste_id": owner_id, "n": n, "data": chunk} for n, chunk in enumerate(chunks)],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+async def delete_text_chunks(owner_id: str, shard: int):
+    """
+    Deletes all chunks of a body from the 'text_user_chunks' collection.
+
+    Parameters:
+    - owner_id (str): The ID the chunks are stored under.
+    - shard (int): The position of the shard the chunks are stored on.
 
     Returns:
     - None
     """
-    db_text_user.insert_one({"username": username, "text": text, "id": message_id})
+    await db_text_chunks_shards[shard].delete_many({"paste_id": owner_id})
+
+async def iter_text_chunks(owner_id: str, first: int = 0, shard: int = 0):
+    """
+    Retrieves the chunks of a large body in order.
+
+    Parameters:
+    - owner_id (str): The body's 'chunk_owner'.
+    - first (int): The number of the first chunk to return, to start reading mid-body.
+    - shard (int): The position of the shard the body was found on.
+
+    Actions:
+    - Fetches the chunks one at a time, so a reader never holds the whole body in memory.
+
+    Returns:
+    - AsyncCursor: A cursor over the chunk documents' 'data' fields.
+    """
+    f = {"paste_id": owner_id}
+    if first:
+        f["n"] = {"$gte": first}
+    return db_text_chunks_shards[shard].find(f, {"data": 1}).sort("n", 1).batch_size(1)
 
 async def find_one_message(f: dict):
     """
@@ -54,44 +880,78 @@ async def find_one_message(f: dict):
     - f (dict): A dictionary containing the filter criteria for finding a message.
 
     Actions:
-    - Searches the 'text_user' collection using the filter.
+    - Searches the 'text_user' collection of the shard given by the filter's 'id' (or every
+      shard if it has none, or with `DB_TEXT_USER_SHARD_FALLBACK`), skipping expired messages.
 
     Returns:
-    - dict: A dictionary containing the 'username' and 'text' of the found message.
+    - dict: The 'username', the stored body fields and the expiry settings of the found
+      message, or None if not found.
     """
-    req = db_text_user.find_one(f)
-    output = {"username": req["username"], "text": req["text"]}
-    return output
+    for shard in message_shards(f.get("id")):
+        doc = await shard.find_one({**f, **live_filter()}, {"_id": 0, "preview": 0})
+        if doc is not None:
+            return doc
+    return None
 
-async def first_hash_from_free_urls():
+async def delete_one_message(message_id: str):
     """
-    Retrieves the first hash from the 'free_urls' collection.
+    Atomically removes a message that has not expired from the 'text_user' collection.
 
     Parameters:
-    - None
+    - message_id (str): The unique identifier of the message.
 
     Actions:
-    - Fetches the first document from the 'free_urls' collection.
+    - Runs a single `find_one_and_delete` on the message's shard, so of several concurrent
+      callers only one receives the message.
 
     Returns:
-    - str: The 'free_hash' value from the first document.
+    - dict: The deleted message, or None if it did not exist, had expired or was already deleted.
     """
-    return db_free_urls.find_one()["free_hash"]
+    for shard in message_shards(message_id):
+        doc = await shard.find_one_and_delete({"id": message_id, **live_filter()}, {"_id": 0, "preview": 0})
+        if doc is not None:
+            return doc
+    return None
 
-async def delete_one_from_free_urls(free_hash: str):
+async def find_expired_messages(now: datetime, limit: int, shard: int = 0):
     """
-    Deletes a document from the 'free_urls' collection based on the hash.
+    Finds messages whose expiry time has passed.
 
     Parameters:
-    - free_hash (str): The hash string used to identify the document to delete.
+    - now (datetime): The reference UTC time.
+    - limit (int): The maximum number of messages to return.
+    - shard (int): The position of the shard to search.
 
     Actions:
-    - Deletes the document matching the given hash from the 'free_urls' collection.
+    - Walks the 'expires_at' index, projecting only the fields needed to delete the message
+      and release its body.
 
     Returns:
-    - None
+    - list: The documents with their '_id', 'id', 'username', 'body_id' and 'burn' fields.
+    """
+    cursor = db_text_user_shards[shard].find(
+        {"expires_at": {"$lte": now}}, {"id": 1, "username": 1, "body_id": 1, "burn": 1},
+    ).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def delete_expired_message(object_id, now: datetime, shard: int = 0):
+    """
+    Atomically removes a message if it has expired.
+
+    Parameters:
+    - object_id (ObjectId): The `_id` of the message.
+    - now (datetime): The reference UTC time.
+    - shard (int): The position of the shard the message was found on.
+
+    Actions:
+    - Runs a single `find_one_and_delete`, so a message is only ever deleted, and its body
+      released, by one caller even when several workers sweep at once.
+
+    Returns:
+    - bool: True if this call deleted the message.
     """
-    db_free_urls.delete_one({"free_hash": free_hash})
+    deleted = await db_text_user_shards[shard].find_one_and_delete({"_id": object_id, "expires_at": {"$lte": now}}, {"_id": 1})
+    return deleted is not None
 
 async def find_one_user(f: dict):
     """
@@ -106,7 +966,7 @@ async def find_one_user(f: dict):
     Returns:
     - dict: The document found in the 'users_info' collection, or None if not found.
     """
-    return db_users_info.find_one(f)
+    return await db_users_info.find_one(f)
 
 async def write_new_user(new_user: dict):
     """
@@ -121,7 +981,7 @@ async def write_new_user(new_user: dict):
     Returns:
     - None
     """
-    db_users_info.insert_one(new_user)
+    await db_users_info.insert_one(new_user)
 
 async def update_one_user_token(to: dict, in_to: dict):
     """
@@ -137,19 +997,529 @@ async def update_one_user_token(to: dict, in_to: dict):
     Returns:
     - None
     """
-    db_users_info.update_one(to, in_to)
+    await db_users_info.update_one(to, in_to)
+
+async def all_text_users(after=None, since=None, batch_size: int = None):
+    """
+    Retrieves documents from the 'text_user' collection in insertion order.
+
+    Parameters:
+    - after (ObjectId, optional): Only documents with a greater `_id` are returned.
+    - since (datetime, optional): Only documents created at or after this UTC time are returned.
+    - batch_size (int, optional): The number of documents fetched per round trip.
+
+    Actions:
+    - Fetches the documents from the 'text_user' collection of every shard, sorted by `_id`,
+      and merges the shards into one `_id` order. Because `_id` embeds the creation time,
+      both filters use the `_id` index.
+    - Skips expired and burn-after-read messages.
+
+    Returns:
+    - An asynchronous cursor or generator to iterate over the documents with `async for`.
+    """
+    bounds = {}
+    if after is not None:
+        bounds["$gt"] = after
+    if since is not None:
+        bounds["$gte"] = ObjectId.from_datetime(since)
+    f = {"burn": {"$exists": False}, **live_filter()}
+    if bounds:
+        f["_id"] = bounds
+    cursors = []
+    for shard in db_text_user_shards:
+        cursor = shard.find(f).sort("_id", 1)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        cursors.append(cursor)
+    if len(cursors) == 1:
+        return cursors[0]
+    return merge_sorted(cursors, key=lambda doc: doc["_id"])
+
+async def page_user_text_users(username: str, after: tuple = None, limit: int = 50):
+    """
+    Retrieves one page of a user's messages from the 'text_user' collection, newest first.
+
+    Parameters:
+    - username (str): The author of the messages.
+    - after (tuple, optional): The ('created_at', `_id`) of the last message on the previous page.
+    - limit (int): The maximum number of messages to return.
+
+    Actions:
+    - Walks the (username, created_at, _id) index of every shard backwards from `after`, so
+      only the user's messages are read and the cost does not depend on how deep the page is,
+      then keeps the newest `limit` messages across shards.
+    - Skips expired and burn-after-read messages and projects only the listing fields.
+
+    Returns:
+    - list: The documents with their '_id', 'username', 'id', 'preview' and 'created_at' fields.
+    """
+    f = {"username": username, "burn": {"$exists": False}, **live_filter()}
+    if after is not None:
+        created_at, last_id = after
+        f["$or"] = [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": last_id}}]
+
+    async def query(shard):
+        cursor = (
+            shard.find(f, {"username": 1, "id": 1, "preview": 1, "created_at": 1})
+            .sort([("created_at", -1), ("_id", -1)])
+            .limit(limit)
+        )
+        return await cursor.to_list(length=limit)
+
+    return merge_pages(await gather_shards(query), lambda doc: (doc["created_at"], doc["_id"]), limit)
 
-async def all_text_users():
+async def increment_message_counts(counts: dict):
     """
-    Retrieves all documents from the 'text_user' collection.
+    Adjusts the cached per-user message counts in the 'message_counts' collection.
 
     Parameters:
+    - counts (dict): The change of each user's count, keyed by username; negative to decrement.
+
+    Actions:
+    - Applies a single change, the common case of one new message, with one upserted `$inc`
+      `update_one`, and several changes with a single unordered `bulk_write`.
+
+    Returns:
     - None
+    """
+    changes = {username: delta for username, delta in counts.items() if delta}
+    if len(changes) == 1:
+        ((username, delta),) = changes.items()
+        await db_message_counts.update_one({"_id": username}, {"$inc": {"messages": delta}}, upsert=True)
+    elif changes:
+        await db_message_counts.bulk_write(
+            [UpdateOne({"_id": username}, {"$inc": {"messages": delta}}, upsert=True) for username, delta in changes.items()],
+            ordered=False,
+        )
+
+async def find_message_count(username: str):
+    """
+    Reads a user's cached message count.
+
+    Parameters:
+    - username (str): The author of the messages.
+
+    Actions:
+    - Looks the count up by `_id` instead of counting the user's messages.
+
+    Returns:
+    - int: The number of messages, 0 if the user has none.
+    """
+    doc = await db_message_counts.find_one({"_id": username})
+    return max(doc["messages"], 0) if doc else 0
+
+async def count_message_counts():
+    """
+    Counts the users with a cached message count.
+
+    Returns:
+    - int: The estimated number of documents in the 'message_counts' collection.
+    """
+    return await db_message_counts.estimated_document_count()
+
+async def rebuild_message_counts():
+    """
+    Recomputes every user's cached message count from the 'text_user' collection.
 
     Actions:
-    - Fetches all documents from the 'text_user' collection.
+    - Groups the messages, except burn-after-read ones, by author with one aggregation per
+      shard and adds up the shards' counts.
+    - Replaces the stored counts with a single `bulk_write` and removes counts of users
+      without messages. Messages written while this runs may be counted twice or not at all,
+      so it is meant for migrations.
 
     Returns:
-    - pymongo.cursor.Cursor: A cursor to iterate over the documents in the collection.
+    - int: The number of users counted.
     """
-    return db_text_user.find()
\ No newline at end of file
+    pipeline = [
+        {"$match": {"burn": {"$exists": False}}},
+        {"$group": {"_id": "$username", "messages": {"$sum": 1}}},
+    ]
+
+    async def query(shard):
+        cursor = await aggregate(shard, pipeline)
+        return [doc async for doc in cursor]
+
+    counts = {}
+    for docs in await gather_shards(query):
+        for doc in docs:
+            counts[doc["_id"]] = counts.get(doc["_id"], 0) + doc["messages"]
+    if counts:
+        await db_message_counts.bulk_write(
+            [ReplaceOne({"_id": username}, {"messages": n}, upsert=True) for username, n in counts.items()],
+            ordered=False,
+        )
+    await db_message_counts.delete_many({"_id": {"$nin": list(counts)}})
+    return len(counts)
+
+async def backfill_created_at(batch_size: int = 500):
+    """
+    Stamps messages stored before creation times existed with the time embedded in their `_id`.
+
+    Parameters:
+    - batch_size (int): The number of messages updated per round trip.
+
+    Actions:
+    - Finds the documents of each shard's 'text_user' collection without a 'created_at' field
+      and sets it with unordered `bulk_write` batches.
+
+    Returns:
+    - int: The number of messages updated.
+    """
+    updated = 0
+    for shard in db_text_user_shards:
+        operations = []
+        async for doc in shard.find({"created_at": {"$exists": False}}, {"_id": 1}).batch_size(batch_size):
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"created_at": doc["_id"].generation_time}}))
+            if len(operations) >= batch_size:
+                await shard.bulk_write(operations, ordered=False)
+                updated += len(operations)
+                operations = []
+        if operations:
+            await shard.bulk_write(operations, ordered=False)
+            updated += len(operations)
+    return updated
+
+async def page_text_users(after=None, limit: int = 50):
+    """
+    Retrieves one page of messages from the 'text_user' collection, newest first.
+
+    Parameters:
+    - after (ObjectId, optional): The `_id` of the last message on the previous page.
+    - limit (int): The maximum number of messages to return.
+
+    Actions:
+    - Walks the `_id` index of every shard backwards from `after`, so the cost does not depend
+      on how deep the page is, then keeps the newest `limit` messages across shards.
+    - Projects only the listing fields, so full message bodies are not transferred.
+    - Skips expired and burn-after-read messages, which must not be listed.
+
+    Returns:
+    - list: The documents with their '_id', 'username', 'id' and 'preview' fields.
+    """
+    f = {"burn": {"$exists": False}, **live_filter()}
+    if after is not None:
+        f["_id"] = {"$lt": after}
+
+    async def query(shard):
+        cursor = shard.find(f, {"username": 1, "id": 1, "preview": 1}).sort("_id", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    return merge_pages(await gather_shards(query), lambda doc: doc["_id"], limit)
+
+# A double-quoted phrase or a single term of a `$text` query, each optionally negated with "-".
+TEXT_QUERY_TOKEN = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+
+def regex_text_match(query: str):
+    """
+    Approximates a `$text` match with regular expressions, for `mongomock`, which has no text index.
+
+    Parameters:
+    - query (str): The search terms, in MongoDB `$text` syntax.
+
+    Actions:
+    - Matches messages containing any of the terms, and every word of each phrase, in their
+      search terms or author, and none of the negated terms; words match whole and ignoring case.
+
+    Returns:
+    - dict: A filter for `$match`; every match gets the same score, so results are ordered
+      newest first.
+    """
+    def contains(word):
+        pattern = {"$regex": r"\b" + re.escape(word) + r"\b", "$options": "i"}
+        return {"$or": [{"search_text": pattern}, {"username": pattern}]}
+
+    any_of, all_of, none_of = [], [], []
+    for negated_phrase, phrase, negated, term in TEXT_QUERY_TOKEN.findall(query):
+        words = re.findall(r"\w+", phrase if phrase else term)
+        if negated_phrase or negated:
+            none_of += map(contains, words)
+        elif phrase:
+            all_of += map(contains, words)
+        else:
+            any_of += map(contains, words)
+    if not any_of and not all_of:
+        # Like `$text`, a query with only negated terms matches nothing.
+        return {"_id": {"$exists": False}}
+    clauses = all_of or [{"$or": any_of}]
+    if none_of:
+        clauses.append({"$nor": none_of})
+    return {"$and": clauses}
+
+async def search_text_users(query: str, username: str = None, after: tuple = None, limit: int = 20):
+    """
+    Runs a ranked full-text search over the 'text_user' collection.
+
+    Parameters:
+    - query (str): The search terms, in MongoDB `$text` syntax ("quoted phrases", -negations).
+    - username (str, optional): Only messages by this author are returned.
+    - after (tuple, optional): The (score, `_id`) of the last result on the previous page.
+    - limit (int): The maximum number of results to return.
+
+    Actions:
+    - Matches the query against the text index over the messages' search terms and authors,
+      skipping expired and burn-after-read messages.
+    - Orders the matches by relevance, then by `_id` (newest first), and continues after
+      `after` on that order, so deep pages cost no more than the first. Each shard returns its
+      best `limit` matches and the best `limit` overall are kept; text scores only depend on
+      the matched document, so they compare across shards.
+    - Projects only the fields needed to show a result.
+    - In test mode (`DB_TEST_MODE`), matches with `regex_text_match` instead, since `mongomock`
+      does not support `$text`.
+
+    Returns:
+    - list: The documents with their '_id', 'username', 'id', 'preview', 'body_id' and 'score' fields.
+    """
+    if config.DB_TEST_MODE:
+        match = {**regex_text_match(query), "burn": {"$exists": False}, **live_filter()}
+        score = {"$literal": 1.0}
+    else:
+        match = {"$text": {"$search": query}, "burn": {"$exists": False}, **live_filter()}
+        score = {"$meta": "textScore"}
+    if username:
+        match["username"] = username
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {"score": score}},
+    ]
+    if after is not None:
+        score, last_id = after
+        pipeline.append({"$match": {"$or": [{"score": {"$lt": score}}, {"score": score, "_id": {"$lt": last_id}}]}})
+    pipeline += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": {"username": 1, "id": 1, "preview": 1, "body_id": 1, "score": 1}},
+    ]
+
+    async def query(shard):
+        cursor = await aggregate(shard, pipeline)
+        return await cursor.to_list(length=limit)
+
+    return merge_pages(await gather_shards(query), lambda doc: (doc["score"], doc["_id"]), limit)
+
+async def iter_text_users_for_search(rebuild: bool = False, batch_size: int = 500, shard: int = 0):
+    """
+    Retrieves the messages whose search terms have to be (re)computed.
+
+    Parameters:
+    - rebuild (bool): Whether to return every searchable message instead of only those
+      stored before search existed.
+    - batch_size (int): The number of documents fetched per round trip.
+    - shard (int): The position of the shard to read.
+
+    Actions:
+    - Finds the documents of the 'text_user' collection, except burn-after-read messages,
+      which are never searchable.
+
+    Returns:
+    - AsyncCursor: A cursor over the documents' '_id', 'id' and stored body fields.
+    """
+    f = {"burn": {"$exists": False}}
+    if not rebuild:
+        f["search_text"] = {"$exists": False}
+    return db_text_user_shards[shard].find(f, {"preview": 0, "search_text": 0}).batch_size(batch_size)
+
+async def set_text_user_search_text(terms: dict, shard: int = 0):
+    """
+    Stores the search terms of existing messages.
+
+    Parameters:
+    - terms (dict): The search terms keyed by document `_id`.
+    - shard (int): The position of the shard holding the messages.
+
+    Actions:
+    - Applies all updates with a single unordered `bulk_write`.
+
+    Returns:
+    - None
+    """
+    if terms:
+        await db_text_user_shards[shard].bulk_write(
+            [UpdateOne({"_id": _id}, {"$set": {"search_text": text}}) for _id, text in terms.items()],
+            ordered=False,
+        )
+
+async def iter_text_users_without_preview(batch_size: int = 500, shard: int = 0):
+    """
+    Retrieves the messages that were stored before listing previews existed.
+
+    Parameters:
+    - batch_size (int): The number of documents fetched per round trip.
+    - shard (int): The position of the shard to read.
+
+    Actions:
+    - Finds the documents of the 'text_user' collection without a 'preview' field, except
+      burn-after-read messages, which are never listed and so have none.
+
+    Returns:
+    - AsyncCursor: A cursor over the documents' '_id' and 'text' fields.
+    """
+    return db_text_user_shards[shard].find(
+        {"preview": {"$exists": False}, "burn": {"$exists": False}}, {"text": 1},
+    ).batch_size(batch_size)
+
+async def set_text_user_previews(previews: dict, shard: int = 0):
+    """
+    Stores listing previews for existing messages.
+
+    Parameters:
+    - previews (dict): The previews keyed by document `_id`.
+    - shard (int): The position of the shard holding the messages.
+
+    Actions:
+    - Applies all updates with a single unordered `bulk_write`.
+
+    Returns:
+    - None
+    """
+    if previews:
+        await db_text_user_shards[shard].bulk_write(
+            [UpdateOne({"_id": _id}, {"$set": {"preview": preview}}) for _id, preview in previews.items()],
+            ordered=False,
+        )
+
+async def iter_shard_messages(shard: int, batch_size: int = 500):
+    """
+    Retrieves every message stored on one shard, for rebalancing.
+
+    Parameters:
+    - shard (int): The position of the shard to read.
+    - batch_size (int): The number of documents fetched per round trip.
+
+    Returns:
+    - AsyncCursor: A cursor over the complete documents, in `_id` order.
+    """
+    return db_text_user_shards[shard].find({}).sort("_id", 1).batch_size(batch_size)
+
+async def move_messages(docs: list, source: int, target: int):
+    """
+    Moves messages from one shard to another, keeping their `_id`.
+
+    Parameters:
+    - docs (list): The complete documents read from the source shard.
+    - source (int): The position of the shard the messages are on.
+    - target (int): The position of the shard they belong on.
+
+    Actions:
+    - Copies the messages to the target with a single unordered `bulk_write` of upserts, so an
+      interrupted run can simply be repeated, then deletes them from the source.
+    - Deletes burn-after-read and expiring messages from the source one at a time with
+      `find_one_and_delete`; if a reader or the expiry sweeper removed one in the meantime,
+      its copy is deleted too, so it is neither served twice nor left without its body.
+
+    Returns:
+    - int: The number of messages moved.
+    """
+    if not docs:
+        return 0
+    await db_text_user_shards[target].bulk_write(
+        [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False,
+    )
+    guarded = [doc for doc in docs if "burn" in doc or doc.get("expires_at") is not None]
+    plain = [doc["_id"] for doc in docs if "burn" not in doc and doc.get("expires_at") is None]
+    moved = len(plain)
+    if plain:
+        await db_text_user_shards[source].delete_many({"_id": {"$in": plain}})
+    for doc in guarded:
+        if await db_text_user_shards[source].find_one_and_delete({"_id": doc["_id"]}, {"_id": 1}) is None:
+            await db_text_user_shards[target].delete_one({"_id": doc["_id"]})
+        else:
+            moved += 1
+    return moved
+
+async def iter_shard_bodies(shard: int, batch_size: int = 500):
+    """
+    Retrieves every shared body stored on one shard, for rebalancing.
+
+    Parameters:
+    - shard (int): The position of the shard to read.
+    - batch_size (int): The number of documents fetched per round trip.
+
+    Returns:
+    - AsyncCursor: A cursor over the complete body documents.
+    """
+    return db_text_bodies_shards[shard].find({}).batch_size(batch_size)
+
+async def move_body(doc: dict, source: int, target: int):
+    """
+    Moves a shared body and its chunks from one shard to another.
+
+    Parameters:
+    - doc (dict): The complete body document read from the source shard.
+    - source (int): The position of the shard the body is on.
+    - target (int): The position of the shard it belongs on.
+
+    Actions:
+    - Marks the body on the source as 'moving', which keeps `release_body` from deleting it
+      while references are still being counted on both shards.
+    - Copies the chunks to the target under a new 'chunk_owner', so they never mix with the
+      chunks of a copy of the body written to the target in the meantime, then upserts the
+      body on the target, also marked as 'moving', or marks the copy already there.
+    - Takes the body off the source with `find_one_and_delete`, which returns its reference
+      count including every reference added or released on the source during the move, and
+      adds that count to the target copy while clearing its mark. If no reference is left,
+      the body is deleted as `release_body` would.
+    - Readers find the body on one of the two shards throughout. If the move is interrupted
+      before the source is deleted, running it again completes it; if it is interrupted
+      after, the target copy keeps its mark and is never deleted.
+
+    Returns:
+    - bool: True if the body was moved or merged, False if it was released meanwhile.
+    """
+    body_id = doc["_id"]
+    marked = await db_text_bodies_shards[source].find_one_and_update(
+        {"_id": body_id}, {"$set": {"moving": True}}, projection={"chunk_owner": 1},
+    )
+    if marked is None:
+        return False
+    fields = {key: value for key, value in doc.items() if key not in ("_id", "refs", "moving")}
+    owner = None
+    if "chunks" in doc:
+        owner = f"{body_id}.{ObjectId()}"
+        cursor = db_text_chunks_shards[source].find({"paste_id": marked["chunk_owner"]}).sort("n", 1)
+        async for chunk in cursor:
+            await db_text_chunks_shards[target].insert_one({"paste_id": owner, "n": chunk["n"], "data": chunk["data"]})
+        fields["chunk_owner"] = owner
+
+    for attempt in range(2):
+        try:
+            result = await db_text_bodies_shards[target].update_one(
+                {"_id": body_id},
+                {"$set": {"moving": True}, "$setOnInsert": {**fields, "refs": 0}},
+                upsert=True,
+            )
+            break
+        except DuplicateKeyError:
+            if attempt:
+                raise
+    if owner is not None and result.upserted_id is None:
+        await delete_text_chunks(owner, target)
+
+    taken = await db_text_bodies_shards[source].find_one_and_delete({"_id": body_id})
+    refs = taken.get("refs", 0) if taken is not None else 0
+    merged = await db_text_bodies_shards[target].find_one_and_update(
+        {"_id": body_id},
+        {"$inc": {"refs": refs}, "$unset": {"moving": ""}},
+        projection={"refs": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if merged["refs"] <= 0:
+        deleted = await db_text_bodies_shards[target].find_one_and_delete(
+            {"_id": body_id, "refs": {"$lte": 0}, "moving": {"$exists": False}}, {"chunk_owner": 1},
+        )
+        if deleted is not None and "chunk_owner" in deleted:
+            await delete_text_chunks(deleted["chunk_owner"], target)
+    if taken is not None and "chunk_owner" in taken:
+        await delete_text_chunks(taken["chunk_owner"], source)
+    return taken is not None
+
+# Time every database operation; see `src.services.metrics`. The query helpers run inside
+# an operation, so timing them too would count each query twice.
+instrument_module(globals(), __name__, exclude=("aggregate", "gather_shards"))
+
+# Created after instrumenting, so the batched inserts are timed as `write_many_to_text_user`.
+paste_batcher = InsertBatcher(
+    write_many_to_text_user,
+    window=config.PASTE_WRITE_BATCH_WINDOW,
+    max_batch=config.PASTE_WRITE_BATCH_MAX,
+)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from src.conf.config import config
+from src.database.db import (
+    aggregate, db_free_urls, db_rate_limits, db_text_chunks_shards, db_text_user_shards, db_users_info,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress reports while an index is being built.
+PROGRESS_INTERVAL = 5.0
+
+# Error code MongoDB reports when duplicate data blocks a unique index.
+DUPLICATE_KEY_ERROR = 11000
+
+# Indexes of the messages collection, built on every shard.
+TEXT_USER_INDEXES = [
+    IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    # Backstop only: the expiry sweeper deletes expired pastes first so it can release their
+    # bodies; the TTL monitor removes whatever is left `PASTE_EXPIRY_GRACE` seconds later.
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=config.PASTE_EXPIRY_GRACE, name="expires_at_ttl"),
+    IndexModel(
+        [("username", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="username_created_at",
+    ),
+    IndexModel(
+        [("search_text", TEXT), ("username", TEXT)],
+        weights={"search_text": 1, "username": 5},
+        default_language="none",
+        name="search_text",
+    ),
+]
+
+INDEXES = [(shard, index) for shard in db_text_user_shards for index in TEXT_USER_INDEXES] + [
+    (shard, IndexModel([("paste_id", ASCENDING), ("n", ASCENDING)], unique=True, name="paste_id_n_unique"))
+    for shard in db_text_chunks_shards
+] + [
+    (db_users_info, IndexModel([("username", ASCENDING)], unique=True, name="username_unique")),
+    (db_users_info, IndexModel([("email", ASCENDING)], unique=True, name="email_unique")),
+    (db_users_info, IndexModel([("confirmation_token", ASCENDING)], sparse=True, name="confirmation_token_sparse")),
+    (db_free_urls, IndexModel([("free_hash", ASCENDING)], unique=True, name="free_hash_unique")),
+    (db_rate_limits, IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl")),
+]
+
+
+class IndexBuildError(Exception):
+    """
+    Raised when an index cannot be built, for example because duplicate data blocks a unique index.
+    """
+
+
+async def find_duplicates(collection, keys: list, limit: int = 5):
+    """
+    Finds key values that occur more than once in a collection.
+
+    Args:
+    - collection: The collection to inspect.
+    - keys (list): The indexed field names.
+    - limit (int): The maximum number of duplicate values to return.
+
+    Returns:
+    - list: Dictionaries with the duplicated key values and their occurrence counts.
+    """
+    pipeline = [
+        {"$group": {"_id": {key: f"${key}" for key in keys}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    cursor = await aggregate(collection, pipeline)
+    return [{"key": doc["_id"], "count": doc["count"]} async for doc in cursor]
+
+
+async def report_progress(collection, name: str):
+    """
+    Logs the progress of an in-flight index build until it is cancelled.
+
+    Args:
+    - collection: The collection the index is being built on.
+    - name (str): The index name.
+
+    Notes:
+    - Progress is read from `$currentOp`; deployments that do not allow it only get
+      the elapsed time.
+    """
+    started = time.monotonic()
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        elapsed = time.monotonic() - started
+        try:
+            ops = await collection.database.client.admin.command(
+                {"currentOp": True, "command.createIndexes": collection.name}
+            )
+            progress = next((op["progress"] for op in ops.get("inprog", []) if "progress" in op), None)
+        except Exception:
+            progress = None
+        if progress:
+            logger.info("Building %s.%s: %s/%s (%.0fs)", collection.name, name, progress.get("done"), progress.get("total"), elapsed)
+        else:
+            logger.info("Building %s.%s: still running (%.0fs)", collection.name, name, elapsed)
+
+
+async def create_index(collection, index: IndexModel):
+    """
+    Builds a single index unless it already exists.
+
+    Args:
+    - collection: The collection to index.
+    - index (IndexModel): The index definition.
+
+    Returns:
+    - bool: True if the index was built, False if it already existed.
+
+    Raises:
+    - IndexBuildError: If duplicate documents block a unique index.
+    """
+    spec = index.document
+    name = spec["name"]
+    existing = await collection.index_information()
+    if name in existing:
+        logger.info("Index %s.%s already exists", collection.name, name)
+        return False
+
+    logger.info("Building index %s.%s", collection.name, name)
+    started = time.monotonic()
+    reporter = asyncio.create_task(report_progress(collection, name))
+    try:
+        await collection.create_indexes([index])
+    except (DuplicateKeyError, OperationFailure) as e:
+        if e.code != DUPLICATE_KEY_ERROR:
+            raise IndexBuildError(f"Building {collection.name}.{name} failed: {e}") from e
+        duplicates = await find_duplicates(collection, list(spec["key"].keys()))
+        raise IndexBuildError(
+            f"Duplicate data blocks unique index {collection.name}.{name}: {duplicates}"
+        ) from e
+    finally:
+        reporter.cancel()
+    logger.info("Built index %s.%s in %.2fs", collection.name, name, time.monotonic() - started)
+    return True
+
+
+async def ensure_indexes():
+    """
+    Builds every index the application relies on.
+
+    Returns:
+    - int: The number of indexes that were built.
+
+    Raises:
+    - IndexBuildError: On the first index that cannot be built, so startup fails fast.
+    """
+    built = 0
+    for collection, index in INDEXES:
+        if await create_index(collection, index):
+            built += 1
+    return built
+
+
+async def missing_indexes():
+    """
+    Lists the indexes the application relies on that do not exist yet.
+
+    Returns:
+    - list: "<collection>.<index>" for every missing index; empty once all are built.
+    """
+    missing = []
+    for collection, index in INDEXES:
+        name = index.document["name"]
+        if name not in await collection.index_information():
+            missing.append(f"{collection.name}.{name}")
+    return missing
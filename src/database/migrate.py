@@ -0,0 +1,65 @@
+"""
+Builds the database indexes and backfills derived fields outside of the web process.
+
+Usage:
+    python -m src.database.migrate [--rebuild-search] [--rebuild-counts]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from src.database.db import backfill_created_at, count_message_counts, rebuild_message_counts
+from src.database.indexes import IndexBuildError, ensure_indexes
+from src.repository.pastbin import backfill_previews, backfill_search_text
+
+logger = logging.getLogger("src.database.migrate")
+
+
+async def main(rebuild_search: bool = False, rebuild_counts: bool = False):
+    """
+    Runs every migration step and reports the outcome.
+
+    Args:
+    - rebuild_search (bool): Whether to recompute the search terms of every message instead
+      of only those stored before search existed.
+    - rebuild_counts (bool): Whether to recompute the per-user message counts; they are always
+      computed when none exist yet.
+
+    Returns:
+    - int: The process exit code, 0 on success and 1 if an index could not be built.
+    """
+    try:
+        built = await ensure_indexes()
+    except IndexBuildError as e:
+        logger.error("%s", e)
+        return 1
+    created = await backfill_created_at()
+    previews = await backfill_previews()
+    search_terms = await backfill_search_text(rebuild_search)
+    counted = 0
+    if rebuild_counts or not await count_message_counts():
+        counted = await rebuild_message_counts()
+    logger.info(
+        "Migration finished, %d index(es) built, %d creation time(s), %d message preview(s) and "
+        "%d search term set(s) added, %d user message count(s) rebuilt",
+        built, created, previews, search_terms, counted,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build indexes and backfill derived fields.")
+    parser.add_argument(
+        "--rebuild-search",
+        action="store_true",
+        help="recompute the search terms of every message, not only of those that have none",
+    )
+    parser.add_argument(
+        "--rebuild-counts",
+        action="store_true",
+        help="recompute the per-user message counts",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(asyncio.run(main(args.rebuild_search, args.rebuild_counts)))
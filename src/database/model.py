@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 class UserCreate(BaseModel):
     """
@@ -33,4 +33,26 @@ class User(BaseModel):
     - email (str): The email address of the user.
     """
     username: str
-    email: str
\ No newline at end of file
+    email: str
+
+class PasteCreate(BaseModel):
+    """
+    PasteCreate represents a single paste in a bulk creation request.
+
+    Attributes:
+    - text (str): The text content of the paste.
+    - expires_in (int): The number of seconds until the paste expires, capped by the server; 0 uses the server default.
+    - burn_after_read (bool): Whether the paste is deleted by its first successful read.
+    """
+    text: str
+    expires_in: int = Field(default=0, ge=0)
+    burn_after_read: bool = False
+
+class BulkPasteCreate(BaseModel):
+    """
+    BulkPasteCreate represents the data required for creating several pastes at once.
+
+    Attributes:
+    - pastes (list[PasteCreate]): The pastes to create, in order.
+    """
+    pastes: list[PasteCreate]
@@ -0,0 +1,142 @@
+"""
+Moves messages and shared bodies to the shard their ID or content hash belongs on, after
+`DB_TEXT_USER_SHARDS` has changed.
+
+Run it with `DB_TEXT_USER_SHARD_FALLBACK=true` set on the web processes, so messages and
+bodies that have not been moved yet are still found on their old shard.
+
+Usage:
+    python -m src.database.rebalance [--dry-run] [--batch-size N]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from src.database.db import (
+    TEXT_USER_SHARDS, iter_shard_bodies, iter_shard_messages, mongo_clients, move_body, move_messages, shard_index,
+)
+from src.database.indexes import IndexBuildError, ensure_indexes
+
+logger = logging.getLogger("src.database.rebalance")
+
+
+async def rebalance_messages(source: int, dry_run: bool = False, batch_size: int = 500):
+    """
+    Moves the misplaced messages of one shard to the shards they belong on.
+
+    Args:
+    - source (int): The position of the shard to scan.
+    - dry_run (bool): Whether to only count the misplaced messages.
+    - batch_size (int): The number of messages read and moved per round trip.
+
+    Returns:
+    - dict: The number of misplaced messages keyed by the position of their target shard.
+
+    Steps:
+    1. Reads every message of the shard and computes the shard of its ID.
+    2. Groups the misplaced messages by target shard and moves each group once it holds
+       `batch_size` messages, then moves what is left.
+    """
+    pending = {}
+    misplaced = {}
+    cursor = await iter_shard_messages(source, batch_size)
+    async for doc in cursor:
+        target = shard_index(doc["id"])
+        if target == source:
+            continue
+        misplaced[target] = misplaced.get(target, 0) + 1
+        if dry_run:
+            continue
+        batch = pending.setdefault(target, [])
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await move_messages(batch, source, target)
+            pending[target] = []
+    for target, batch in pending.items():
+        await move_messages(batch, source, target)
+    return misplaced
+
+
+async def rebalance_bodies(source: int, dry_run: bool = False, batch_size: int = 500):
+    """
+    Moves the misplaced shared bodies of one shard, with their chunks, to the shards they belong on.
+
+    Args:
+    - source (int): The position of the shard to scan.
+    - dry_run (bool): Whether to only count the misplaced bodies.
+    - batch_size (int): The number of bodies read per round trip.
+
+    Returns:
+    - dict: The number of misplaced bodies keyed by the position of their target shard.
+
+    Steps:
+    1. Reads every body of the shard and computes the shard of its content hash.
+    2. Moves each misplaced body with `move_body`, one at a time, since a body and its chunks
+       have to change shards together.
+    """
+    misplaced = {}
+    cursor = await iter_shard_bodies(source, batch_size)
+    async for doc in cursor:
+        target = shard_index(doc["_id"])
+        if target == source:
+            continue
+        misplaced[target] = misplaced.get(target, 0) + 1
+        if not dry_run:
+            await move_body(doc, source, target)
+    return misplaced
+
+
+async def main(dry_run: bool = False, batch_size: int = 500):
+    """
+    Rebalances every shard and reports the outcome.
+
+    Args:
+    - dry_run (bool): Whether to only report how many messages and bodies would move.
+    - batch_size (int): The number of documents read per round trip.
+
+    Returns:
+    - int: The process exit code, 0 on success and 1 if an index could not be built.
+    """
+    mongo_clients.open()
+    try:
+        if not dry_run:
+            try:
+                await ensure_indexes()
+            except IndexBuildError as e:
+                logger.error("%s", e)
+                return 1
+        total = {"message": 0, "body": 0}
+        for source in range(len(TEXT_USER_SHARDS)):
+            for kind, rebalance in (("message", rebalance_messages), ("body", rebalance_bodies)):
+                misplaced = await rebalance(source, dry_run, batch_size)
+                for target, n in sorted(misplaced.items()):
+                    logger.info(
+                        "Shard %d: %d %s(s) %s shard %d",
+                        source, n, kind, "would move to" if dry_run else "moved to", target,
+                    )
+                total[kind] += sum(misplaced.values())
+        logger.info("Rebalance %s, %d message(s) and %d body(ies) misplaced across %d shard(s)",
+                    "dry run finished" if dry_run else "finished", total["message"], total["body"],
+                    len(TEXT_USER_SHARDS))
+        return 0
+    finally:
+        await mongo_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move messages and bodies to the shard they belong on.")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report how many messages and bodies would move",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="number of documents read per round trip",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(asyncio.run(main(args.dry_run, args.batch_size)))
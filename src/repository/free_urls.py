@@ -2,7 +2,15 @@ import hashlib
 import string as stri
 import random
 
-from src.database.db import write_to_free_urls
+from src.conf.config import config
+from src.database.db import write_many_to_free_urls
+
+BASE62_ALPHABET = stri.digits + stri.ascii_letters
+
+# Counter IDs are permuted within a 48-bit space and always rendered as 9 base62 characters.
+COUNTER_ID_BITS = 48
+COUNTER_ID_LENGTH = 9
+FEISTEL_ROUNDS = 4
 
 async def generate_string_hash():
     """
@@ -27,18 +35,78 @@ async def generate_string_hash():
     string_hash = sha256.hexdigest()
     return string_hash
 
-async def free_urls():
+async def free_urls(count: int = 1):
+    """
+    Generates a batch of unique hashes and stores them in the database.
+
+    Args:
+    - count (int): The number of hashes to generate.
+
+    Returns:
+    - int: The number of hashes that were written to the database.
+
+    Steps:
+    1. `count` unique hashes are generated using the `generate_string_hash` function.
+    2. The hashes are written to the database in one batch using `write_many_to_free_urls`.
+    3. The number of inserted hashes is returned.
+    """
+    hashes = [await generate_string_hash() for _ in range(count)]
+    return await write_many_to_free_urls(hashes)
+
+
+def permute_counter(value: int):
     """
-    Generates a unique hash and stores it in the database.
+    Maps a counter value to a scrambled value in the same 48-bit space.
+
+    Args:
+    - value (int): The counter value, below 2**48.
 
     Returns:
-    - dict: A dictionary with a message indicating the status of the operation.
+    - int: The permuted value.
 
     Steps:
-    1. A unique hash is generated using the `generate_string_hash` function.
-    2. This hash is then written to the database using the `write_to_free_urls` function.
-    3. A message indicating that URL processing has started is returned.
+    1. The value is split into two 24-bit halves.
+    2. A keyed Feistel network mixes the halves over several rounds, using BLAKE2b keyed
+       with `ID_PERMUTATION_KEY` as the round function.
+    3. Because a Feistel network is a bijection, distinct counters always give distinct
+       results, so unique counters yield unique IDs.
+    """
+    if not 0 <= value < 1 << COUNTER_ID_BITS:
+        raise ValueError("Counter value out of range")
+    half_bits = COUNTER_ID_BITS // 2
+    mask = (1 << half_bits) - 1
+    key = config.ID_PERMUTATION_KEY.encode("utf-8")[:64]
+    left, right = value >> half_bits, value & mask
+    for round_number in range(FEISTEL_ROUNDS):
+        digest = hashlib.blake2b(right.to_bytes(3, "big") + bytes([round_number]), key=key, digest_size=3).digest()
+        left, right = right, left ^ int.from_bytes(digest, "big")
+    return (left << half_bits) | right
+
+def base62_encode(value: int, length: int = COUNTER_ID_LENGTH):
+    """
+    Encodes a non-negative integer as a fixed-width base62 string.
+
+    Args:
+    - value (int): The integer to encode.
+    - length (int): The minimum number of characters; shorter results are left-padded.
+
+    Returns:
+    - str: The base62 representation.
+    """
+    chars = []
+    while value:
+        value, remainder = divmod(value, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars)).rjust(length, BASE62_ALPHABET[0])
+
+def counter_id(value: int):
+    """
+    Turns a counter value into a short, non-sequential-looking paste ID.
+
+    Args:
+    - value (int): The counter value.
+
+    Returns:
+    - str: A 9-character base62 ID.
     """
-    g_hash = await generate_string_hash()
-    await write_to_free_urls(g_hash)
-    return {"message": "URL processing started in the background"}
\ No newline at end of file
+    return base62_encode(permute_counter(value))
@@ -1,30 +1,423 @@
-from src.database.db import write_to_text_user, first_hash_from_free_urls, find_one_message, delete_one_from_free_urls, all_text_users
+import asyncio
+import base64
+import binascii
+import hashlib
+import re
+import struct
+from datetime import datetime, timedelta, timezone
 
-async def past(username: str, text: str):
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from src.database.db import (
+    write_to_text_user, write_many_to_text_user, write_text_chunks, iter_text_chunks, delete_text_chunks,
+    find_one_message, delete_one_message, find_expired_messages, delete_expired_message,
+    add_body_reference, write_body, write_bodies, find_existing_body_ids, find_one_body, release_body,
+    page_text_users, all_text_users, iter_text_users_without_preview, set_text_user_previews,
+    search_text_users, iter_text_users_for_search, set_text_user_search_text,
+    page_user_text_users, increment_message_counts, find_message_count, TEXT_USER_SHARDS, shard_index,
+)
+from src.repository.paste_body import decode_body, decode_chunk, encode_body, is_chunked
+from src.conf.config import config
+from src.services.cache import LRUCache, MISSING
+from src.services.id_pool import id_pool
+
+# Pastes never change once stored, so they can be cached until evicted or until they expire.
+# Entries hold the author and the key of the body, so pastes sharing a body share one
+# `body_cache` entry. Burn-after-read pastes are never cached.
+message_cache = LRUCache(
+    max_entries=config.MESSAGE_CACHE_MAX_ENTRIES,
+    max_bytes=config.MESSAGE_CACHE_MAX_BYTES,
+    negative_ttl=config.MESSAGE_CACHE_NEGATIVE_TTL,
+    sizeof=lambda message: len(message["body_id"]) + len(message["username"]),
+)
+
+# Decoded paste bodies keyed by content hash (or "paste:<id>" for bodies stored inline).
+body_cache = LRUCache(
+    max_entries=config.BODY_CACHE_MAX_ENTRIES,
+    max_bytes=config.BODY_CACHE_MAX_BYTES,
+    sizeof=len,
+)
+
+# Prefix of the body keys of messages stored before bodies were shared, with their text inline.
+INLINE_BODY_PREFIX = "paste:"
+
+# Words as the search index sees them; longer runs are not useful search terms.
+SEARCH_TERM = re.compile(r"\w{1,64}")
+
+def resolve_expiry(expires_in: int = None):
+    """
+    Works out when a new paste expires.
+
+    Args:
+    - expires_in (int, optional): The lifetime in seconds requested by the author; 0 or omitted
+      for the server default `PASTE_DEFAULT_TTL`.
+
+    Returns:
+    - datetime: The UTC expiry time, or None if the paste never expires. Lifetimes are capped
+      at `PASTE_MAX_TTL` when it is set, including for pastes that would never expire.
+    """
+    ttl = expires_in or config.PASTE_DEFAULT_TTL
+    if config.PASTE_MAX_TTL:
+        ttl = min(ttl, config.PASTE_MAX_TTL) if ttl else config.PASTE_MAX_TTL
+    if not ttl:
+        return None
+    return datetime.now(timezone.utc) + timedelta(seconds=ttl)
+
+def seconds_left(expires_at: datetime):
+    """
+    Computes how long a paste has left before it expires.
+
+    Args:
+    - expires_at (datetime): The expiry time; naive values, as returned by MongoDB, are UTC.
+
+    Returns:
+    - float: The number of seconds left, at least 0.
+    """
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return max((expires_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+async def past(username: str, text: str, expires_in: int = None, burn: bool = False):
     """
-    Stores a user's text message with an associated hash and removes the hash from the database.
+    Stores a user's text message under a hash claimed from the free hash pool.
 
     Args:
     - username (str): The username of the person submitting the text.
     - text (str): The text message to be stored.
+    - expires_in (int, optional): The requested lifetime in seconds, see `resolve_expiry`.
+    - burn (bool): Whether the message is deleted by its first successful read.
+
+    Returns:
+    - str: The hash associated with the text.
+
+    Steps:
+    1. Atomically claims a free hash from the pool using `id_pool.acquire`.
+    2. Stores the text once per distinct content using `store_body`.
+    3. Stores the text message, pointing at the shared body, with its expiry time and, unless
+       it is burned after reading, its listing preview and search terms in the database with
+       the claimed hash using `write_to_text_user`. If the insert fails, the body reference
+       taken in step 2 is given back with `release_message_body` before the error is raised.
+    4. Adds the message to the author's cached count, unless it is burned after reading.
+    5. Drops any negative cache entry for the hash and returns it.
+    """
+    free_hash = await id_pool.acquire()
+    body_id = await store_body(text)
+    preview = None if burn else make_preview(text)
+    search_text = None if burn else make_search_text(text)
+    try:
+        await write_to_text_user(
+            username, {"body_id": body_id}, free_hash, preview, resolve_expiry(expires_in), burn, search_text,
+        )
+    except Exception:
+        await release_message_body(free_hash, {"body_id": body_id})
+        raise
+    if not burn:
+        await increment_message_counts({username: 1})
+    message_cache.delete(free_hash)
+    return free_hash
+
+def new_chunk_owner(body_id: str):
+    """
+    Builds the key the chunks of one write of a body are stored under.
+
+    Args:
+    - body_id (str): The content hash of the body.
+
+    Returns:
+    - str: The hash followed by a fresh ObjectId, so chunks written for a body that is being
+      deleted concurrently never share a key with the chunks being deleted.
+    """
+    return f"{body_id}.{ObjectId()}"
+
+async def store_body(text: str):
+    """
+    Stores a paste body once per distinct content and counts its references.
+
+    Args:
+    - text (str): The paste text.
+
+    Returns:
+    - str: The body's content hash, used as its key.
+
+    Steps:
+    1. Hashes the text with SHA-256.
+    2. If a body with that hash exists, only its reference count is incremented with `add_body_reference`.
+    3. Otherwise encodes the text with `encode_body`, compressing and chunking large bodies,
+       stores any chunks under a new `new_chunk_owner` key with `write_text_chunks` and then
+       the body with `write_body`.
+    4. If a concurrent writer inserted the body first, deletes the chunks written in step 3,
+       since the stored body points at the other writer's chunks.
+    """
+    body_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if not await add_body_reference(body_id):
+        body, chunks = encode_body(text)
+        shard = shard_index(body_id)
+        if chunks:
+            body["chunk_owner"] = new_chunk_owner(body_id)
+            await write_text_chunks(body["chunk_owner"], chunks, shard)
+        if not await write_body(body_id, body) and chunks:
+            await delete_text_chunks(body["chunk_owner"], shard)
+    body_cache.set(body_id, text)
+    return body_id
+
+async def past_many(username: str, pastes: list):
+    """
+    Stores several of a user's text messages with one ID allocation and one insert.
+
+    Args:
+    - username (str): The username of the person submitting the texts.
+    - pastes (list): The messages to be stored, in order, as dictionaries with a 'text' and
+      optionally 'expires_in' and 'burn_after_read', as for `past`.
+
+    Returns:
+    - list: One result per paste, in order: {"index", "id"} for a stored message or
+      {"index", "error"} for one that was rejected or could not be written.
+
+    Steps:
+    1. Rejects empty texts without allocating IDs for them.
+    2. Claims IDs for all remaining texts in one step using `id_pool.acquire_many`.
+    3. Stores each distinct body once with `store_bodies`.
+    4. Writes all messages with a single `insert_many` using `write_many_to_text_user`,
+       which reports failures per message instead of aborting the batch, and gives back the
+       body reference taken for each message that was not written.
+    5. Adds the written messages, except burn-after-read ones, to the author's cached count
+       and drops any negative cache entries for the new IDs.
+    """
+    results = [{"index": index} for index in range(len(pastes))]
+    accepted = []
+    for index, paste in enumerate(pastes):
+        if paste["text"]:
+            accepted.append(index)
+        else:
+            results[index]["error"] = "Text must not be empty"
+    if not accepted:
+        return results
+
+    ids = await id_pool.acquire_many(len(accepted))
+    body_ids = await store_bodies([pastes[index]["text"] for index in accepted])
+    created_at = datetime.now(timezone.utc)
+    messages = []
+    for index, message_id, body_id in zip(accepted, ids, body_ids):
+        paste = pastes[index]
+        message = {"username": username, "id": message_id, "created_at": created_at, "body_id": body_id}
+        if paste.get("burn_after_read"):
+            message["burn"] = True
+        else:
+            message["preview"] = make_preview(paste["text"])
+            message["search_text"] = make_search_text(paste["text"])
+        expires_at = resolve_expiry(paste.get("expires_in"))
+        if expires_at is not None:
+            message["expires_at"] = expires_at
+        messages.append(message)
+    errors = await write_many_to_text_user(messages)
+    written = 0
+    for position, (index, message_id) in enumerate(zip(accepted, ids)):
+        if position in errors:
+            results[index]["error"] = errors[position].get("errmsg", "Write failed")
+            await release_message_body(message_id, messages[position])
+        else:
+            results[index]["id"] = message_id
+            message_cache.delete(message_id)
+            written += "burn" not in messages[position]
+    await increment_message_counts({username: written})
+    return results
+
+async def store_bodies(texts: list):
+    """
+    Stores several paste bodies, once per distinct content, with batched writes.
+
+    Args:
+    - texts (list): The paste texts.
+
+    Returns:
+    - list: The content hash of each text, in order.
+
+    Steps:
+    1. Hashes every text and counts how often each distinct body occurs in the batch.
+    2. Looks up which bodies already exist with one `find_existing_body_ids` query, so only
+       new bodies are encoded and have their chunks written.
+    3. Adds all references and inserts all new bodies with one `write_bodies` call, then
+       deletes the chunks of any body a concurrent writer inserted first, as in `store_body`.
+    """
+    body_ids = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    distinct = {}
+    for body_id, text in zip(body_ids, texts):
+        if body_id in distinct:
+            distinct[body_id][1] += 1
+        else:
+            distinct[body_id] = [text, 1]
+
+    existing = await find_existing_body_ids(list(distinct))
+    bodies = {}
+    for body_id, (text, refs) in distinct.items():
+        body = {}
+        if body_id not in existing:
+            body, chunks = encode_body(text)
+            if chunks:
+                body["chunk_owner"] = new_chunk_owner(body_id)
+                await write_text_chunks(body["chunk_owner"], chunks, shard_index(body_id))
+        bodies[body_id] = (body, refs)
+        body_cache.set(body_id, text)
+    inserted = await write_bodies(bodies)
+    for body_id, (body, _) in bodies.items():
+        if "chunk_owner" in body and body_id not in inserted:
+            await delete_text_chunks(body["chunk_owner"], shard_index(body_id))
+    return body_ids
+
+def body_key(message_id: str, doc: dict):
+    """
+    Returns the key of a message's body.
+
+    Args:
+    - message_id (str): The unique identifier of the message.
+    - doc (dict): The stored message document.
+
+    Returns:
+    - str: The content hash of the shared body, or "paste:<id>" for a body stored inline.
+    """
+    return doc.get("body_id") or INLINE_BODY_PREFIX + message_id
+
+async def find_body(key: str, doc: dict = None):
+    """
+    Finds the stored form of a body.
+
+    Args:
+    - key (str): The body key returned by `body_key`.
+    - doc (dict, optional): The message document, if already loaded, for a body stored inline.
+
+    Returns:
+    - tuple: The stored body fields, the ID its chunks are stored under if it has any, and the
+      position of the shard holding them; the body is None if it does not exist. Inline bodies
+      are plain text on the message document, without chunks.
+    """
+    if key.startswith(INLINE_BODY_PREFIX):
+        if doc is None:
+            doc = await find_one_message({"id": key[len(INLINE_BODY_PREFIX):]})
+        return doc, None, None
+    body, shard = await find_one_body(key)
+    if body is None:
+        return None, None, None
+    return body, body.get("chunk_owner"), shard
+
+async def load_body(key: str, doc: dict = None, cache: bool = True):
+    """
+    Restores the full text of a body.
+
+    Args:
+    - key (str): The body key returned by `body_key`.
+    - doc (dict, optional): The message document, if already loaded, for a body stored inline.
+    - cache (bool): Whether to read and fill `body_cache`; bulk readers turn it off so they
+      do not evict hot bodies.
+
+    Returns:
+    - str: The text, or None if the body does not exist.
+
+    Steps:
+    1. Returns the text from `body_cache` if it is cached.
+    2. Otherwise loads the body with one indexed lookup using `find_body`, decompresses it,
+       loading its chunks if it was split, and caches it.
+    """
+    if cache:
+        text = body_cache.get(key)
+        if text is not MISSING:
+            return text
+
+    body, owner_id, shard = await find_body(key, doc)
+    if body is None:
+        return None
+    chunks = None
+    if is_chunked(body):
+        chunks = [chunk["data"] async for chunk in await iter_text_chunks(owner_id, shard=shard)]
+    text = decode_body(body, chunks)
+    if cache:
+        body_cache.set(key, text)
+    return text
+
+async def find_message_meta(message_id: str):
+    """
+    Finds the author, body key and expiry settings of a message, using `message_cache`.
+
+    Args:
+    - message_id (str): The unique identifier of the message.
+
+    Returns:
+    - tuple: The entry ({"username", "body_id"}, plus "expires_at" and "burn" when set) and
+      the message document if it had to be loaded, or (None, None) if the message does not
+      exist or has expired.
+
+    Notes:
+    - Entries of expiring messages are cached only until the message expires, and those of
+      burn-after-read messages are not cached at all.
+    """
+    meta = message_cache.get(message_id)
+    if meta is None:
+        return None, None
+    if meta is not MISSING:
+        return meta, None
+
+    doc = await find_one_message({"id": message_id})
+    if doc is None:
+        message_cache.set_negative(message_id)
+        return None, None
+    meta = {"username": doc["username"], "body_id": body_key(message_id, doc)}
+    if doc.get("burn"):
+        meta["burn"] = True
+        return meta, doc
+    if doc.get("expires_at") is not None:
+        meta["expires_at"] = doc["expires_at"]
+        ttl = seconds_left(doc["expires_at"])
+        if ttl <= 0:
+            return None, None
+        message_cache.set(message_id, meta, ttl=ttl)
+    else:
+        message_cache.set(message_id, meta)
+    return meta, doc
+
+async def burn_message(message_id: str):
+    """
+    Reads a burn-after-read message and deletes it in the same step.
+
+    Args:
+    - message_id (str): The unique identifier of the message.
 
     Returns:
-    - str or None: The hash associated with the text if successful, otherwise None.
+    - dict: The message details (username, text, body_id, expires_at and burn), or None if
+      another reader got to it first.
 
     Steps:
-    1. Retrieves the most recent hash from the database using `first_hash_from_free_urls`.
-    2. If a hash is found:
-       - Stores the text message in the database with the retrieved hash using `write_to_text_user`.
-       - Deletes the hash from the database using `delete_one_from_free_urls`.
-       - Returns the hash.
-    3. If no hash is found, returns None.
+    1. Atomically deletes the message with `delete_one_message`; only one concurrent reader
+       receives it.
+    2. Loads its text without caching it and releases its body with `release_message_body`.
+    3. Caches the ID as missing.
+    """
+    doc = await delete_one_message(message_id)
+    if doc is None:
+        message_cache.set_negative(message_id)
+        return None
+    key = body_key(message_id, doc)
+    text = await load_body(key, doc, cache=False)
+    await release_message_body(message_id, doc)
+    message_cache.set_negative(message_id)
+    if text is None:
+        return None
+    return {"username": doc["username"], "text": text, "body_id": key, "expires_at": doc.get("expires_at"), "burn": True}
+
+async def release_message_body(message_id: str, doc: dict):
+    """
+    Releases the body of a deleted message.
+
+    Args:
+    - message_id (str): The unique identifier of the message.
+    - doc (dict): The deleted message document.
+
+    Notes:
+    - Shared bodies lose one reference with `release_body` and are deleted, with their
+      chunks, when nothing references them any more. Inline bodies went with the message.
     """
-    free_hash = await first_hash_from_free_urls()
-    if free_hash:
-        await write_to_text_user(username, text, free_hash)
-        await delete_one_from_free_urls(free_hash)
-        return free_hash
-    return None
+    key = body_key(message_id, doc)
+    if not key.startswith(INLINE_BODY_PREFIX) and await release_body(key):
+        body_cache.delete(key)
 
 async def read_message_with_id(message_id: str):
     """
@@ -34,26 +427,505 @@ async def read_message_with_id(message_id: str):
     - message_id (str): The unique identifier of the message.
 
     Returns:
-    - dict: A dictionary containing the message details (username and text) if found.
+    - dict: A dictionary containing the message details (username, text, expires_at and burn)
+      if found, otherwise None.
+
+    Steps:
+    1. Finds the author and body key with `find_message_meta`, from `message_cache` or with the
+       `find_one_message` function; unknown or expired IDs are cached as short-lived negative entries.
+    2. Burn-after-read messages are read and deleted at once with `burn_message`.
+    3. Otherwise loads the text with `load_body`, from `body_cache` or with one more indexed lookup.
+    4. Returns the message details.
+    """
+    meta, doc = await find_message_meta(message_id)
+    if meta is None:
+        return None
+    if meta.get("burn"):
+        return await burn_message(message_id)
+    text = await load_body(meta["body_id"], doc)
+    if text is None:
+        return None
+    return {"username": meta["username"], "text": text, "expires_at": meta.get("expires_at"), "burn": False}
+
+async def stream_message_with_id(message_id: str, offset: int = 0, found: tuple = None):
+    """
+    Opens a message for reading its body piece by piece.
+
+    Args:
+    - message_id (str): The unique identifier of the message.
+    - offset (int): The byte offset the caller wants to start reading at.
+    - found (tuple, optional): The result of `find_message_meta`, if the caller already looked
+      the message up, for example to answer a conditional request without burning it.
+
+    Returns:
+    - dict: The message's 'username', its 'body_id' key, 'expires_at', 'burn', its body 'size'
+      in bytes, 'body', an async iterator over the UTF-8 bytes of the text, and 'offset', the
+      byte offset the iterator starts at (at or before the requested one); or None if the
+      message does not exist.
 
     Steps:
-    1. Finds the message in the database using the `find_one_message` function with the given message ID.
-    2. Returns the message details.
+    1. Finds the author and body key with `find_message_meta`, unless `found` is given.
+    2. Burn-after-read messages are read whole and deleted at once with `burn_message`; they
+       cannot be reopened, so their iterator always starts at offset 0.
+    3. Serves the body from `body_cache` when it is cached.
+    4. Otherwise loads the stored body; chunked bodies are then read and decompressed one chunk
+       at a time, starting at the chunk containing `offset`, so the whole body is never held in memory.
+    """
+    meta, doc = found or await find_message_meta(message_id)
+    if meta is None:
+        return None
+    if meta.get("burn"):
+        output = await burn_message(message_id)
+        if output is None:
+            return None
+        data = output.pop("text").encode("utf-8")
+        return {**output, "size": len(data), "body": _single(data), "offset": 0}
+    key = meta["body_id"]
+    output = {"username": meta["username"], "body_id": key, "expires_at": meta.get("expires_at"), "burn": False}
+
+    text = body_cache.get(key)
+    if text is MISSING:
+        body, owner_id, shard = await find_body(key, doc)
+        if body is None:
+            return None
+        if is_chunked(body):
+            first = offset // body["chunk_size"]
+
+            async def chunks():
+                async for chunk in await iter_text_chunks(owner_id, first, shard):
+                    yield decode_chunk(body, chunk["data"])
+
+            return {**output, "size": body["size"], "body": chunks(), "offset": first * body["chunk_size"]}
+        text = decode_body(body)
+        body_cache.set(key, text)
+
+    data = text.encode("utf-8")
+    return {**output, "size": len(data), "body": _single(data[offset:]), "offset": min(offset, len(data))}
+
+async def _single(data: bytes):
+    yield data
+
+def make_preview(text: str):
     """
-    return await find_one_message({"id": message_id})
+    Shortens a message for listings.
+
+    Args:
+    - text (str): The full message text.
 
-async def all_text():
+    Returns:
+    - str: The first `MESSAGE_PREVIEW_LENGTH` characters, followed by an ellipsis if the text was cut.
     """
-    Retrieves all text messages from the database and removes the MongoDB `_id` field from each document.
+    if len(text) <= config.MESSAGE_PREVIEW_LENGTH:
+        return text
+    return text[:config.MESSAGE_PREVIEW_LENGTH] + "…"
+
+def encode_page_token(last_id: ObjectId):
+    """
+    Turns the `_id` of the last listed message into an opaque page token.
+
+    Args:
+    - last_id (ObjectId): The `_id` of the last message on the page.
+
+    Returns:
+    - str: A URL-safe token.
+    """
+    return base64.urlsafe_b64encode(last_id.binary).decode("ascii").rstrip("=")
+
+def decode_page_token(token: str):
+    """
+    Turns a page token back into the `_id` the next page starts after.
+
+    Args:
+    - token (str): A token produced by `encode_page_token`.
+
+    Returns:
+    - ObjectId: The `_id` of the last message on the previous page.
+
+    Raises:
+    - ValueError: If the token is malformed.
+    """
+    try:
+        return ObjectId(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, InvalidId, TypeError) as e:
+        raise ValueError("Invalid page token") from e
+
+async def all_text(page_token: str = None, page_size: int = None):
+    """
+    Retrieves one page of messages, newest first, using keyset pagination.
+
+    Args:
+    - page_token (str, optional): The token returned with the previous page; omitted for the first page.
+    - page_size (int, optional): The number of messages per page, kept between 1 and `MESSAGES_PAGE_SIZE_MAX`.
+
+    Returns:
+    - tuple: A list of message dictionaries (username, id and a truncated preview of the text) and
+      the token of the next page, or None if this is the last page.
+
+    Raises:
+    - ValueError: If the page token is malformed.
+
+    Steps:
+    1. Decodes the page token into the `_id` the page starts after.
+    2. Fetches one more message than requested using `page_text_users` to learn whether another page exists.
+    3. Removes the MongoDB `_id` field and builds the next page token from the last message.
+    """
+    after = decode_page_token(page_token) if page_token else None
+    page_size = max(1, min(page_size or config.MESSAGES_PAGE_SIZE, config.MESSAGES_PAGE_SIZE_MAX))
+    documents = await page_text_users(after, page_size + 1)
+
+    next_token = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_token = encode_page_token(documents[-1]["_id"])
+    messages = [
+        {"username": doc["username"], "id": doc["id"], "preview": doc.get("preview", "")}
+        for doc in documents
+    ]
+    return messages, next_token
+
+def encode_user_page_token(created_at: datetime, last_id: ObjectId):
+    """
+    Turns the creation time and `_id` of the last listed message into an opaque page token.
+
+    Args:
+    - created_at (datetime): The creation time of the last message on the page; naive values are UTC.
+    - last_id (ObjectId): Its `_id`.
+
+    Returns:
+    - str: A URL-safe token.
+    """
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    millis = int(created_at.timestamp() * 1000)
+    return base64.urlsafe_b64encode(struct.pack(">q", millis) + last_id.binary).decode("ascii").rstrip("=")
+
+def decode_user_page_token(token: str):
+    """
+    Turns a user page token back into the position the next page starts after.
+
+    Args:
+    - token (str): A token produced by `encode_user_page_token`.
+
+    Returns:
+    - tuple: The UTC creation time and `_id` of the last message on the previous page.
+
+    Raises:
+    - ValueError: If the token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        (millis,) = struct.unpack(">q", raw[:8])
+        return datetime.fromtimestamp(millis / 1000, timezone.utc), ObjectId(raw[8:])
+    except (binascii.Error, struct.error, InvalidId, TypeError, ValueError, OverflowError, OSError) as e:
+        raise ValueError("Invalid page token") from e
+
+async def user_text(username: str, page_token: str = None, page_size: int = None):
+    """
+    Retrieves one page of a user's messages, newest first, using keyset pagination.
+
+    Args:
+    - username (str): The author of the messages.
+    - page_token (str, optional): The token returned with the previous page; omitted for the first page.
+    - page_size (int, optional): The number of messages per page, kept between 1 and `MESSAGES_PAGE_SIZE_MAX`.
+
+    Returns:
+    - tuple: A list of message dictionaries (username, id, preview and created_at), the token
+      of the next page or None if this is the last page, and the user's message count.
+
+    Raises:
+    - ValueError: If the page token is malformed.
+
+    Steps:
+    1. Decodes the page token into the (created_at, `_id`) the page starts after.
+    2. Fetches one more message than requested using `page_user_text_users`, which walks the
+       (username, created_at) index, to learn whether another page exists.
+    3. Reads the cached count with `find_message_count` instead of counting the messages.
+    """
+    after = decode_user_page_token(page_token) if page_token else None
+    page_size = max(1, min(page_size or config.MESSAGES_PAGE_SIZE, config.MESSAGES_PAGE_SIZE_MAX))
+    documents = await page_user_text_users(username, after, page_size + 1)
+
+    next_token = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_token = encode_user_page_token(documents[-1]["created_at"], documents[-1]["_id"])
+    messages = [
+        {
+            "username": doc["username"],
+            "id": doc["id"],
+            "preview": doc.get("preview", ""),
+            "created_at": doc["created_at"],
+        }
+        for doc in documents
+    ]
+    return messages, next_token, await find_message_count(username)
+
+def make_search_text(text: str):
+    """
+    Extracts the terms a message is found by in searches.
+
+    Args:
+    - text (str): The full message text.
+
+    Returns:
+    - str: The distinct lowercase words of the text in order of first appearance, separated by
+      spaces and capped at `SEARCH_MAX_TERMS`, so the index entry stays small for large pastes.
+    """
+    terms = dict.fromkeys(term.lower() for term in SEARCH_TERM.findall(text))
+    return " ".join(list(terms)[:config.SEARCH_MAX_TERMS])
+
+def make_snippet(text: str, terms: list):
+    """
+    Cuts the part of a message around the first search term it contains.
+
+    Args:
+    - text (str): The message text.
+    - terms (list): The lowercase search terms.
+
+    Returns:
+    - list: Consecutive (segment, matched) pairs covering at most `SEARCH_SNIPPET_LENGTH`
+      characters, where `matched` marks occurrences of the terms; the start of the text is
+      used if no term occurs in it.
+    """
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, terms)) + r")\b", re.IGNORECASE) if terms else None
+    first = pattern.search(text) if pattern else None
+    start = max(first.start() - config.SEARCH_SNIPPET_LENGTH // 4, 0) if first else 0
+    window = text[start:start + config.SEARCH_SNIPPET_LENGTH]
+    segments = []
+    position = 0
+    for match in pattern.finditer(window) if pattern else ():
+        if match.start() > position:
+            segments.append((window[position:match.start()], False))
+        segments.append((match.group(), True))
+        position = match.end()
+    if position < len(window):
+        segments.append((window[position:], False))
+    if start:
+        segments.insert(0, ("…", False))
+    if start + config.SEARCH_SNIPPET_LENGTH < len(text):
+        segments.append(("…", False))
+    return segments
+
+async def load_snippet_text(key: str):
+    """
+    Loads enough of a body to cut a search snippet from it, without filling `body_cache`.
+
+    Args:
+    - key (str): The body key returned by `body_key`.
+
+    Returns:
+    - str: The text from `body_cache` if it is cached, the first chunk of a chunked body,
+      or the whole body otherwise; empty if the body does not exist.
+    """
+    text = body_cache.get(key)
+    if text is not MISSING:
+        return text
+    body, owner_id, shard = await find_body(key)
+    if body is None:
+        return ""
+    if is_chunked(body):
+        async for chunk in await iter_text_chunks(owner_id, shard=shard):
+            return decode_chunk(body, chunk["data"]).decode("utf-8", "ignore")
+        return ""
+    return decode_body(body)
+
+def encode_search_token(score: float, last_id: ObjectId):
+    """
+    Turns the rank of the last search result into an opaque page token.
+
+    Args:
+    - score (float): The relevance score of the last result on the page.
+    - last_id (ObjectId): Its `_id`.
+
+    Returns:
+    - str: A URL-safe token.
+    """
+    return base64.urlsafe_b64encode(struct.pack(">d", score) + last_id.binary).decode("ascii").rstrip("=")
+
+def decode_search_token(token: str):
+    """
+    Turns a search page token back into the rank the next page starts after.
+
+    Args:
+    - token (str): A token produced by `encode_search_token`.
+
+    Returns:
+    - tuple: The score and `_id` of the last result on the previous page.
+
+    Raises:
+    - ValueError: If the token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        (score,) = struct.unpack(">d", raw[:8])
+        return score, ObjectId(raw[8:])
+    except (binascii.Error, struct.error, InvalidId, TypeError) as e:
+        raise ValueError("Invalid page token") from e
+
+async def search_text(query: str, page_token: str = None, page_size: int = None, username: str = None):
+    """
+    Searches message texts and authors, best matches first, using keyset pagination.
+
+    Args:
+    - query (str): The search terms.
+    - page_token (str, optional): The token returned with the previous page; omitted for the first page.
+    - page_size (int, optional): The number of results per page, kept between 1 and `SEARCH_PAGE_SIZE_MAX`.
+    - username (str, optional): Only messages by this author are searched.
+
+    Returns:
+    - tuple: A list of results (username, id, preview and snippet) and the token of the next
+      page, or None if this is the last page.
+
+    Raises:
+    - ValueError: If the page token is malformed.
+
+    Steps:
+    1. Decodes the page token into the (score, `_id`) the page starts after.
+    2. Fetches one more match than requested using `search_text_users`, which ranks the
+       matches with the text index, to learn whether another page exists.
+    3. Loads the bodies of the results concurrently and cuts a snippet around the first
+       matching term with `make_snippet`.
+    """
+    after = decode_search_token(page_token) if page_token else None
+    page_size = max(1, min(page_size or config.SEARCH_PAGE_SIZE, config.SEARCH_PAGE_SIZE_MAX))
+    documents = await search_text_users(query, username, after, page_size + 1)
+
+    next_token = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_token = encode_search_token(documents[-1]["score"], documents[-1]["_id"])
+    terms = [term.lower() for term in SEARCH_TERM.findall(query)]
+    texts = await asyncio.gather(*(load_snippet_text(body_key(doc["id"], doc)) for doc in documents))
+    results = [
+        {
+            "username": doc["username"],
+            "id": doc["id"],
+            "preview": doc.get("preview", ""),
+            "snippet": make_snippet(text, terms),
+        }
+        for doc, text in zip(documents, texts)
+    ]
+    return results, next_token
+
+async def backfill_search_text(rebuild: bool = False, batch_size: int = 500):
+    """
+    Computes the search terms of existing messages.
+
+    Args:
+    - rebuild (bool): Whether to recompute the terms of every message, for example after
+      `SEARCH_MAX_TERMS` changed, instead of only those stored before search existed.
+    - batch_size (int): The number of messages updated per round trip.
+
+    Returns:
+    - int: The number of messages updated.
+    """
+    updated = 0
+    for shard in range(len(TEXT_USER_SHARDS)):
+        terms = {}
+        async for doc in await iter_text_users_for_search(rebuild, batch_size, shard):
+            text = await load_body(body_key(doc["id"], doc), doc, cache=False)
+            terms[doc["_id"]] = make_search_text(text or "")
+            if len(terms) >= batch_size:
+                await set_text_user_search_text(terms, shard)
+                updated += len(terms)
+                terms = {}
+        await set_text_user_search_text(terms, shard)
+        updated += len(terms)
+    return updated
+
+async def backfill_previews(batch_size: int = 500):
+    """
+    Adds listing previews to messages stored before previews existed.
+
+    Args:
+    - batch_size (int): The number of messages updated per round trip.
+
+    Returns:
+    - int: The number of messages updated.
+    """
+    updated = 0
+    for shard in range(len(TEXT_USER_SHARDS)):
+        previews = {}
+        async for doc in await iter_text_users_without_preview(batch_size, shard):
+            previews[doc["_id"]] = make_preview(doc.get("text", ""))
+            if len(previews) >= batch_size:
+                await set_text_user_previews(previews, shard)
+                updated += len(previews)
+                previews = {}
+        await set_text_user_previews(previews, shard)
+        updated += len(previews)
+    return updated
+
+async def export_text(after: str = None, since=None):
+    """
+    Streams every message in insertion order for bulk export.
+
+    Args:
+    - after (str, optional): The export cursor of the last message already received; the export resumes after it.
+    - since (datetime, optional): Only messages created at or after this time are exported.
+
+    Yields:
+    - dict: The message's id, username, text, creation time and its export cursor.
+
+    Raises:
+    - ValueError: If the export cursor is malformed.
+
+    Steps:
+    1. Opens a cursor over the collection using `all_text_users` with a bounded batch size,
+       so memory use does not grow with the collection.
+    2. Yields each message as it arrives, with the hex `_id` as the cursor to resume from.
+    """
+    try:
+        after_id = ObjectId(after) if after else None
+    except (InvalidId, TypeError) as e:
+        raise ValueError("Invalid export cursor") from e
+
+    documents = await all_text_users(after_id, since, config.EXPORT_BATCH_SIZE)
+    async for doc in documents:
+        yield {
+            "id": doc["id"],
+            "username": doc["username"],
+            "text": await load_body(body_key(doc["id"], doc), doc, cache=False),
+            "created_at": doc["_id"].generation_time.isoformat(),
+            "cursor": str(doc["_id"]),
+        }
+
+async def sweep_expired(batch_size: int = None):
+    """
+    Deletes expired messages and releases their bodies.
+
+    Args:
+    - batch_size (int, optional): The number of expired messages looked up per round trip;
+      defaults to `PASTE_SWEEP_BATCH`.
 
     Returns:
-    - list: A list of dictionaries, each containing message details (username and text) with the `_id` field removed.
+    - int: The number of messages deleted by this call.
 
     Steps:
-    1. Fetches all text documents from the database using the `all_text_users` function.
-    2. Removes the `_id` field from each document.
-    3. Returns the cleaned list of documents.
+    1. Finds a batch of messages on a shard that expired before the sweep started with
+       `find_expired_messages`.
+    2. Deletes each one with `delete_expired_message`; messages deleted concurrently by another
+       worker are skipped, so every body is released exactly once.
+    3. Releases the bodies of the deleted messages, drops their cache entries and removes
+       them from their authors' cached counts with one `increment_message_counts` per batch.
+    4. Repeats until no expired messages are left, then moves on to the next shard.
     """
-    documents = await all_text_users()
-    cleaned_documents = [{key: value for key, value in doc.items() if key != "_id"} for doc in documents]
-    return cleaned_documents
\ No newline at end of file
+    batch_size = batch_size or config.PASTE_SWEEP_BATCH
+    now = datetime.now(timezone.utc)
+    deleted = 0
+    for shard in range(len(TEXT_USER_SHARDS)):
+        while True:
+            docs = await find_expired_messages(now, batch_size, shard)
+            if not docs:
+                break
+            counts = {}
+            for doc in docs:
+                if not await delete_expired_message(doc["_id"], now, shard):
+                    continue
+                await release_message_body(doc["id"], doc)
+                message_cache.delete(doc["id"])
+                if not doc.get("burn"):
+                    counts[doc["username"]] = counts.get(doc["username"], 0) - 1
+                deleted += 1
+            await increment_message_counts(counts)
+    return deleted
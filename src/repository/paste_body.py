@@ -0,0 +1,107 @@
+import zlib
+
+from bson import Binary
+
+from src.conf.config import config
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is always available
+    zstandard = None
+
+
+def _zstd_compress(data: bytes):
+    if zstandard is None:
+        raise RuntimeError("PASTE_COMPRESSION=zstd requires the 'zstandard' package")
+    return zstandard.ZstdCompressor().compress(data)
+
+def _zstd_decompress(data: bytes):
+    if zstandard is None:
+        raise RuntimeError("Reading zstd-compressed pastes requires the 'zstandard' package")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "zstd": (_zstd_compress, _zstd_decompress),
+}
+
+
+def encode_body(text: str):
+    """
+    Converts a paste body into the form it is stored in.
+
+    Args:
+    - text (str): The paste text.
+
+    Returns:
+    - tuple: The body fields to store on the paste document and a list of compressed chunks
+      to store separately (empty unless the body is chunked).
+
+    Steps:
+    1. Bodies smaller than `PASTE_COMPRESS_THRESHOLD` bytes are stored inline as plain text.
+    2. Bodies up to `PASTE_CHUNK_THRESHOLD` bytes are compressed with `PASTE_COMPRESSION`
+       into a single binary field.
+    3. Larger bodies are split into `PASTE_CHUNK_SIZE`-byte pieces that are compressed
+       independently, so they can be read back one at a time.
+    """
+    raw = text.encode("utf-8")
+    if len(raw) < config.PASTE_COMPRESS_THRESHOLD:
+        return {"text": text}, []
+
+    encoding = config.PASTE_COMPRESSION
+    compress, _ = CODECS[encoding]
+    if len(raw) <= config.PASTE_CHUNK_THRESHOLD:
+        return {"encoding": encoding, "body": Binary(compress(raw)), "size": len(raw)}, []
+
+    step = config.PASTE_CHUNK_SIZE
+    chunks = [Binary(compress(raw[i:i + step])) for i in range(0, len(raw), step)]
+    return {"encoding": encoding, "chunks": len(chunks), "chunk_size": step, "size": len(raw)}, chunks
+
+
+def is_chunked(doc: dict):
+    """
+    Checks whether a stored body was split into chunks.
+
+    Args:
+    - doc (dict): The stored body fields.
+
+    Returns:
+    - bool: True if the body has to be read from the chunk collection.
+    """
+    return "chunks" in doc
+
+
+def decode_body(doc: dict, chunks: list = None):
+    """
+    Restores the text of a stored body.
+
+    Args:
+    - doc (dict): The stored body fields.
+    - chunks (list, optional): The compressed chunks, in order, for a chunked body.
+
+    Returns:
+    - str: The paste text.
+    """
+    if "text" in doc:
+        return doc["text"]
+    _, decompress = CODECS[doc["encoding"]]
+    if is_chunked(doc):
+        raw = b"".join(decompress(chunk) for chunk in chunks)
+    else:
+        raw = decompress(doc["body"])
+    return raw.decode("utf-8")
+
+
+def decode_chunk(doc: dict, chunk: bytes):
+    """
+    Decompresses a single chunk of a chunked body.
+
+    Args:
+    - doc (dict): The stored body fields.
+    - chunk (bytes): One compressed chunk.
+
+    Returns:
+    - bytes: The chunk's UTF-8 bytes; a multi-byte character may span two chunks.
+    """
+    _, decompress = CODECS[doc["encoding"]]
+    return decompress(chunk)
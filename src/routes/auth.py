@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Form, Request, Response
+from fastapi import APIRouter, HTTPException, Depends, Form, Request, Response
 from datetime import timedelta
 import uuid
-import bcrypt
 from fastapi.responses import RedirectResponse
+from pymongo.errors import DuplicateKeyError
 
 from src.database.model import User
-from src.database.db import find_one_user, write_new_user, update_one_user_token
-from src.services.auth import create_access_token, get_current_user
+from src.database.db import find_one_user, write_new_user
+from src.services.auth import create_access_token, get_current_user, update_user
 from src.conf.config import config
 from src.services.email import send_confirmation_email
+from src.services.passwords import PasswordHasherBusy, hash_password, needs_rehash, verify_password
+from src.services.rate_limit import rate_limit
 
 router = APIRouter()
 
@@ -25,22 +27,20 @@ async def register_page(request: Request):
     """
     return config.TEMPLATES.TemplateResponse("registration.html", {"request": request})
 
-@router.post("/register")
+@router.post("/register", dependencies=[Depends(rate_limit("register", config.RATE_LIMIT_REGISTER))])
 async def register(
     request: Request,
     response: Response,
-    background_tasks: BackgroundTasks,
     username: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
 ):
     """
-    Handles user registration, including validation, password hashing, and email confirmation.
+    Handles user registration, including validation, password hashing, and queueing the confirmation email.
 
     Args:
     - request (Request): The request object containing metadata about the request.
     - response (Response): The response object used to manage the HTTP response.
-    - background_tasks (BackgroundTasks): Background tasks for handling email sending.
     - username (str): The username of the user registering.
     - email (str): The email of the user registering.
     - password (str): The password of the user registering.
@@ -49,14 +49,17 @@ async def register(
     - RedirectResponse: Redirects to the home page upon successful registration.
 
     Raises:
-    - HTTPException: If the email is already registered, an HTTP 400 error is raised.
+    - HTTPException: If the email or username is already registered, an HTTP 400 error is raised.
+    - PasswordHasherBusy: If the password hashing pool is saturated; answered with HTTP 503.
+    - RateLimitExceeded: If the client IP exceeded `RATE_LIMIT_REGISTER`; answered with HTTP 429
+      before the database or bcrypt is touched.
     """
     existing_user = await find_one_user({"email": email})
 
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_password = await hash_password(password)
     confirmation_token = str(uuid.uuid4())
 
     new_user = {
@@ -66,8 +69,11 @@ async def register(
         "is_active": False,
         "confirmation_token": confirmation_token
     }
-    await write_new_user(new_user)
-    background_tasks.add_task(send_confirmation_email, email, confirmation_token, config.BASE_URL)
+    try:
+        await write_new_user(new_user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+    await send_confirmation_email(email, confirmation_token, config.BASE_URL)
 
     return RedirectResponse(url="/", status_code=302)
 
@@ -89,7 +95,7 @@ async def confirm_email(token: str):
     if not user:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    await update_one_user_token({"confirmation_token": token}, {"$set": {"is_active": True, "confirmation_token": None}})
+    await update_user(user["username"], {"$set": {"is_active": True, "confirmation_token": None}}, {"confirmation_token": token})
     return RedirectResponse(url="/", status_code=302)
 
 @router.get("/login")
@@ -105,7 +111,7 @@ async def login_page(request: Request):
     """
     return config.TEMPLATES.TemplateResponse("login.html", {"request": request})
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(rate_limit("login", config.RATE_LIMIT_LOGIN, user_field="username", user_limit=config.RATE_LIMIT_LOGIN_USER))])
 async def login(
     response: Response,
     request: Request,
@@ -125,6 +131,12 @@ async def login(
 
     Raises:
     - HTTPException: If the username or password is invalid, or if the email is not confirmed, an HTTP 401 or 400 error is raised.
+    - PasswordHasherBusy: If the password hashing pool is saturated; answered with HTTP 503.
+    - RateLimitExceeded: If the client IP exceeded `RATE_LIMIT_LOGIN` or the username exceeded
+      `RATE_LIMIT_LOGIN_USER`; answered with HTTP 429 before the database or bcrypt is touched.
+
+    Notes:
+    - If the stored hash uses a different cost than `BCRYPT_ROUNDS`, it is replaced after a successful check.
     """
     db_user = await find_one_user({"username": username})
     if not db_user:
@@ -133,12 +145,21 @@ async def login(
         {"request": request}
         )
 
-    if not bcrypt.checkpw(password.encode('utf-8'), db_user["hashed_password"].encode('utf-8')):
+    if not await verify_password(password, db_user["hashed_password"]):
         return config.TEMPLATES.TemplateResponse(
         "invalid_username_password.html",
         {"request": request}
         )
 
+    # Transparently upgrade hashes made with a different bcrypt cost.
+    if needs_rehash(db_user["hashed_password"]):
+        try:
+            new_hash = await hash_password(password)
+        except PasswordHasherBusy:
+            pass
+        else:
+            await update_user(db_user["username"], {"$set": {"hashed_password": new_hash}})
+
     if not db_user["is_active"]:
         raise HTTPException(status_code=400, detail="Email not confirmed")
 
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from src.database.db import ping_databases
+from src.database.indexes import missing_indexes
+
+router = APIRouter()
+
+# Indexes are never dropped by the application, so once all exist they are not checked again.
+_indexes_ready = False
+
+
+@router.get("/healthz")
+async def healthz():
+    """
+    Reports whether the process is up and every database can be reached.
+
+    Returns:
+    - JSONResponse: 200 with `{"status": "ok"}`, or 503 with the error of each unreachable
+      database under "databases".
+    """
+    errors = await ping_databases()
+    if errors:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "databases": errors})
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz(request: Request):
+    """
+    Reports whether the instance should receive traffic.
+
+    Args:
+    - request (Request): The request, used to read the application's startup state.
+
+    Returns:
+    - JSONResponse: 200 with `{"status": "ready"}`, or 503 listing what is not ready:
+      "starting" or "stopping" outside the lifespan, unreachable "databases", or
+      "missing_indexes".
+
+    Notes:
+    - Readiness drops as soon as shutdown begins, so load balancers stop routing to the
+      instance while it drains.
+    """
+    global _indexes_ready
+    if not getattr(request.app.state, "ready", False):
+        state = "stopping" if getattr(request.app.state, "started", False) else "starting"
+        return JSONResponse(status_code=503, content={"status": state})
+    errors = await ping_databases()
+    if errors:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "databases": errors})
+    if not _indexes_ready:
+        missing = await missing_indexes()
+        if missing:
+            return JSONResponse(status_code=503, content={"status": "unavailable", "missing_indexes": missing})
+        _indexes_ready = True
+    return {"status": "ready"}
@@ -0,0 +1,82 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.database.db import paste_batcher
+from src.repository.pastbin import body_cache, message_cache
+from src.services.auth import user_cache
+from src.services.email import email_dispatcher
+from src.services.expiry import expiry_sweeper
+from src.services.http_cache import page_cache
+from src.services.id_pool import id_pool
+from src.services.metrics import db_call_duration, db_call_errors, http_request_duration, http_requests, render_samples
+from src.services.rate_limit import limiter
+from src.services import passwords
+
+router = APIRouter()
+
+# Caches reported under one metric family, labelled by name.
+CACHES = {"message": message_cache, "body": body_cache, "page": page_cache, "auth": user_cache}
+
+
+def component_metrics(component: str, stats: dict):
+    """
+    Turns the numeric values of a component's `stats()` into metric families.
+
+    Args:
+    - component (str): The component name, used in the metric names.
+    - stats (dict): The component's statistics.
+
+    Returns:
+    - list: The exposition lines; values ending in "_total" are counters, the rest gauges.
+    """
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        kind = "counter" if key.endswith("_total") else "gauge"
+        lines += render_samples(f"pastbin_{component}_{key}", f"The {key} value of the {component} component.", kind, [({}, value)])
+    return lines
+
+
+def cache_metrics():
+    """
+    Reports every cache's statistics under shared metric families labelled by cache.
+
+    Returns:
+    - list: The exposition lines.
+    """
+    stats = {name: cache.stats() for name, cache in CACHES.items()}
+    lines = []
+    for key in next(iter(stats.values())):
+        kind = "counter" if key in ("hits", "negative_hits", "misses", "evictions", "expirations") else "gauge"
+        name = f"pastbin_cache_{key}_total" if kind == "counter" else f"pastbin_cache_{key}"
+        samples = [({"cache": cache}, values[key]) for cache, values in stats.items()]
+        lines += render_samples(name, f"The {key} value of each cache.", kind, samples)
+    return lines
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Exposes the application metrics in the Prometheus text format.
+
+    Returns:
+    - PlainTextResponse: Per-route request latency histograms and status counts, per-function
+      database call latencies, and the current state of the ID pool, caches, password pool,
+      email queue, expiry sweeper, rate limiter and paste insert batcher.
+
+    Notes:
+    - Request and database timings are recorded as they happen; everything else is read from
+      the components' `stats()` when the endpoint is scraped, so it costs nothing in between.
+    """
+    lines = []
+    for metric in (http_request_duration, http_requests, db_call_duration, db_call_errors):
+        lines += metric.render()
+    lines += component_metrics("id_pool", id_pool.stats())
+    lines += cache_metrics()
+    lines += component_metrics("password_pool", passwords.stats())
+    lines += component_metrics("email", email_dispatcher.stats())
+    lines += component_metrics("expiry", expiry_sweeper.stats())
+    lines += component_metrics("rate_limit", limiter.stats())
+    lines += component_metrics("paste_writes", paste_batcher.stats())
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,11 +1,39 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, Form
+import json
+import zlib
+from datetime import datetime
+from urllib.parse import quote
 
+from fastapi import APIRouter, HTTPException, Depends, Request, Form, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+
+from src.services.admin import require_admin
 from src.services.auth import get_current_user
-from src.repository.pastbin import past, read_message_with_id, all_text
+from src.services.rate_limit import rate_limit
+from src.database.model import BulkPasteCreate
+from src.repository.pastbin import past, past_many, read_message_with_id, search_text, seconds_left, user_text, stream_message_with_id, all_text, export_text, find_message_meta
 from src.conf.config import config
+from src.services.http_cache import RangeNotSatisfiable, etag_matches, make_etag, page_response, parse_range, render_page
 
 router = APIRouter()
 
+def paste_cache_control(output: dict):
+    """
+    Chooses the Cache-Control header for a paste.
+
+    Args:
+    - output (dict): The message details or its `find_message_meta` entry, with its
+      'expires_at' and 'burn' settings when they are set.
+
+    Returns:
+    - str: "no-store" for burn-after-read pastes, a max-age bounded by the remaining lifetime
+      for expiring ones, and a long-lived immutable policy otherwise.
+    """
+    if output.get("burn"):
+        return "no-store"
+    if output.get("expires_at") is not None:
+        return f"public, max-age={min(int(seconds_left(output['expires_at'])), config.PASTE_CACHE_MAX_AGE)}"
+    return f"public, max-age={config.PASTE_CACHE_MAX_AGE}, immutable"
+
 @router.get("/create_message")
 async def create_message_page(request: Request):
     """
@@ -19,10 +47,12 @@ async def create_message_page(request: Request):
     """
     return config.TEMPLATES.TemplateResponse("create_message.html", {"request": request})
 
-@router.post("/create_message")
+@router.post("/create_message", dependencies=[Depends(rate_limit("create_message", config.RATE_LIMIT_CREATE_MESSAGE))])
 async def create_message(
     request: Request,
     text: str = Form(...),
+    expires_in: int = Form(0, ge=0),
+    burn_after_read: bool = Form(False),
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -31,22 +61,64 @@ async def create_message(
     Args:
     - request (Request): The request object containing metadata about the request.
     - text (str): The text content of the message being created.
+    - expires_in (int): The number of seconds until the message expires, capped by `PASTE_MAX_TTL`;
+      0 uses the server default `PASTE_DEFAULT_TTL`.
+    - burn_after_read (bool): Whether the message is deleted by its first successful read.
     - current_user (dict): The currently authenticated user, obtained from the `get_current_user` dependency.
 
     Returns:
     - TemplateResponse: The rendered HTML page for message creation confirmation with the message URL.
 
+    Raises:
+    - RateLimitExceeded: If the client IP or user exceeded `RATE_LIMIT_CREATE_MESSAGE`; answered
+      with HTTP 429 before anything is written.
+
     Notes:
     - The `username` is extracted from the `current_user` object.
     - The `message_id` is obtained from the `past` function, which stores the message and returns the ID.
     """
     username = current_user.username
-    message_id = await past(username, text)
+    message_id = await past(username, text, expires_in, burn_after_read)
     return config.TEMPLATES.TemplateResponse(
         "message_created.html",
         {"request": request, "url": f"{config.BASE_URL}/pastbin/message/{message_id}"}
     )
 
+@router.post("/create_messages", dependencies=[Depends(rate_limit("create_messages", config.RATE_LIMIT_CREATE_MESSAGES))])
+async def create_messages(body: BulkPasteCreate, current_user: dict = Depends(get_current_user)):
+    """
+    Creates several messages from one JSON request, for automated uploads.
+
+    Args:
+    - body (BulkPasteCreate): The pastes to create, in order.
+    - current_user (dict): The currently authenticated user, obtained from the `get_current_user` dependency.
+
+    Returns:
+    - dict: A `results` list with one entry per paste, in request order: its `index`, plus
+      `id` and `url` if it was created or `error` if it was not.
+
+    Raises:
+    - HTTPException: If the caller is not logged in, an HTTP 401 error is raised; if no pastes
+      are given, an HTTP 400 error is raised; if more than `BULK_CREATE_MAX_ITEMS` are given,
+      an HTTP 413 error is raised.
+    - RateLimitExceeded: If the client IP or user exceeded `RATE_LIMIT_CREATE_MESSAGES`; answered
+      with HTTP 429 before anything is written.
+    """
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not body.pastes:
+        raise HTTPException(status_code=400, detail="No pastes given")
+    if len(body.pastes) > config.BULK_CREATE_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {config.BULK_CREATE_MAX_ITEMS} pastes can be created per request",
+        )
+    results = await past_many(current_user.username, [paste.model_dump() for paste in body.pastes])
+    for result in results:
+        if "id" in result:
+            result["url"] = f"{config.BASE_URL}/pastbin/message/{result['id']}"
+    return {"results": results}
+
 @router.get("/message/{message_id}")
 async def message(message_id: str, request: Request):
     """
@@ -57,35 +129,253 @@ async def message(message_id: str, request: Request):
     - request (Request): The request object containing metadata about the request.
 
     Returns:
-    - TemplateResponse: The rendered HTML page displaying the message details.
+    - Response: The rendered HTML page displaying the message details, or a 304 response if the
+      client's `If-None-Match` matches the page's ETag.
 
-    Raises:
-    - HTTPException: If the message is not found, an HTTP 404 error is raised.
+    Notes:
+    - Pastes never change, so the page is rendered once, compressed once per content coding
+      clients ask for, reused for later requests until the paste expires, and sent with a
+      `Cache-Control` header from `paste_cache_control`. Burn-after-read pages are neither
+      cached nor compressed.
     """
     output = await read_message_with_id(message_id)
     if output:
-        return config.TEMPLATES.TemplateResponse(
+        page = render_page(
+            f"message:{message_id}",
             "message.html",
-            {"request": request, "username": output["username"], "text": output["text"]}
+            {"username": output["username"], "text": output["text"]},
+            ttl=seconds_left(output["expires_at"]) if output["expires_at"] is not None else None,
+            cache=not output["burn"],
         )
+        return await page_response(request, page, paste_cache_control(output))
     return config.TEMPLATES.TemplateResponse(
             "message_not_found.html",
             {"request": request}
         )
 
+@router.get("/raw/{message_id}")
+async def raw_message(message_id: str, request: Request):
+    """
+    Streams the text of a message as `text/plain`, without rendering a template.
+
+    Args:
+    - message_id (str): The ID of the message to be retrieved.
+    - request (Request): The request object, whose `Range`, `If-Range` and `If-None-Match`
+      headers are honoured.
+
+    Returns:
+    - Response: The full text (200), the requested byte range (206), a 304 response if the
+      client's copy is current, a 416 response if the range lies beyond the end of the text,
+      or a 404 response if the message does not exist.
+
+    Notes:
+    - The lookup goes through the same message and body caches as the message page; large
+      bodies that are not cached are streamed chunk by chunk, starting at the chunk that
+      contains the first requested byte.
+    - Burn-after-read messages are deleted when they are opened, so a ranged request gets
+      its range and the rest of the text is gone. A request answered with 304 does not open
+      the message, so it never burns it.
+    """
+    meta, doc = await find_message_meta(message_id)
+    if meta is None:
+        return PlainTextResponse("Message not found", status_code=404)
+    etag = make_etag("raw", meta["body_id"])
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"Accept-Ranges": "bytes", "Cache-Control": paste_cache_control(meta), "ETag": etag})
+
+    output = await stream_message_with_id(message_id, found=(meta, doc))
+    if output is None:
+        return PlainTextResponse("Message not found", status_code=404)
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": paste_cache_control(output), "ETag": etag}
+    size = output["size"]
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == headers["ETag"]):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            await output["body"].aclose()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        if start and not output["burn"]:
+            # Reopen the body at the chunk that contains the first requested byte.
+            await output["body"].aclose()
+            output = await stream_message_with_id(message_id, start)
+            if output is None:
+                return PlainTextResponse("Message not found", status_code=404)
+    headers["Content-Length"] = str(end - start + 1)
+
+    async def body():
+        position = output["offset"]
+        try:
+            async for data in output["body"]:
+                data_end = position + len(data)
+                if data_end > start:
+                    yield data[max(start - position, 0):end + 1 - position]
+                position = data_end
+                if position > end:
+                    break
+        finally:
+            # Closes the chunk cursor when the range ends early or the client disconnects.
+            await output["body"].aclose()
+
+    return StreamingResponse(body(), status_code=status, media_type="text/plain; charset=utf-8", headers=headers)
+
 @router.get("/all_messages")
-async def all_messages(request: Request):
+async def all_messages(request: Request, page: str = None, limit: int = Query(None, ge=1)):
+    """
+    Retrieves and renders one page of messages, newest first.
+
+    Args:
+    - request (Request): The request object containing metadata about the request.
+    - page (str, optional): The opaque token of the page to show; omitted for the first page.
+    - limit (int, optional): The number of messages per page, capped by the server.
+
+    Returns:
+    - TemplateResponse: The rendered HTML page displaying the messages and a link to the next page.
+
+    Raises:
+    - HTTPException: If the page token is invalid, an HTTP 400 error is raised.
+    """
+    try:
+        messages, next_page = await all_text(page, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid page token")
+    return config.TEMPLATES.TemplateResponse(
+        "messages.html",
+        {"request": request, "messages": messages, "next_page": next_page, "limit": limit, "page_url": "/pastbin/all_messages"}
+    )
+
+@router.get("/users/{username}/messages")
+async def user_messages(request: Request, username: str, page: str = None, limit: int = Query(None, ge=1)):
     """
-    Retrieves and renders a list of all messages.
+    Retrieves and renders one page of a user's messages, newest first.
 
     Args:
     - request (Request): The request object containing metadata about the request.
+    - username (str): The author whose messages are listed.
+    - page (str, optional): The opaque token of the page to show; omitted for the first page.
+    - limit (int, optional): The number of messages per page, capped by the server.
 
     Returns:
-    - TemplateResponse: The rendered HTML page displaying all messages.
+    - TemplateResponse: The rendered HTML page displaying the user's message count, the messages
+      and a link to the next page.
+
+    Raises:
+    - HTTPException: If the page token is invalid, an HTTP 400 error is raised.
     """
-    messages = await all_text()
+    try:
+        messages, next_page, total = await user_text(username, page, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid page token")
     return config.TEMPLATES.TemplateResponse(
         "messages.html",
-        {"request": request, "messages": messages}
-    )
\ No newline at end of file
+        {
+            "request": request,
+            "messages": messages,
+            "next_page": next_page,
+            "limit": limit,
+            "page_url": f"/pastbin/users/{quote(username, safe='')}/messages",
+            "title": f"Messages by {username}",
+            "total": total,
+        }
+    )
+
+@router.get("/search")
+async def search(request: Request, q: str = None, page: str = None, limit: int = Query(None, ge=1), username: str = None):
+    """
+    Searches messages by text and author and renders the best matches first.
+
+    Args:
+    - request (Request): The request object containing metadata about the request.
+    - q (str, optional): The search terms; without them only the search form is shown.
+    - page (str, optional): The opaque token of the page to show; omitted for the first page.
+    - limit (int, optional): The number of results per page, capped by the server.
+    - username (str, optional): Only messages by this author are searched.
+
+    Returns:
+    - TemplateResponse: The rendered HTML page with the results, a snippet of each with the
+      matching terms highlighted, and a link to the next page.
+
+    Raises:
+    - HTTPException: If the page token is invalid, an HTTP 400 error is raised.
+    """
+    results, next_page = [], None
+    if q and q.strip():
+        try:
+            results, next_page = await search_text(q, page, limit, username)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid page token")
+    return config.TEMPLATES.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "q": q or "",
+            "username": username,
+            "results": results,
+            "next_page": next_page,
+            "limit": limit,
+        }
+    )
+
+@router.get("/export", dependencies=[Depends(require_admin), Depends(rate_limit("export", config.RATE_LIMIT_EXPORT))])
+async def export(after: str = None, since: datetime = None, compress: bool = False):
+    """
+    Streams all messages as newline-delimited JSON for backups and analytics.
+
+    Args:
+    - after (str, optional): The `cursor` of the last line already received, to resume an interrupted export.
+    - since (datetime, optional): Only messages created at or after this time are exported, for incremental dumps.
+    - compress (bool): If true, the stream is gzip-compressed and sent with `Content-Encoding: gzip`.
+
+    Returns:
+    - StreamingResponse: One JSON object per line, in insertion order. Memory use stays constant
+      because lines are produced from the database cursor as they are sent.
+
+    Raises:
+    - HTTPException: If the `X-Admin-Token` header does not match `ADMIN_TOKEN`, an HTTP 404
+      error is raised; if the export cursor is invalid, an HTTP 400 error is raised.
+    - RateLimitExceeded: If the client IP exceeded `RATE_LIMIT_EXPORT`; answered with HTTP 429.
+    """
+    messages = export_text(after, since)
+    try:
+        first = await anext(messages)
+    except StopAsyncIteration:
+        first = None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid export cursor")
+
+    async def lines():
+        if first is None:
+            return
+        batch = [json.dumps(first, ensure_ascii=False)]
+        async for doc in messages:
+            batch.append(json.dumps(doc, ensure_ascii=False))
+            if len(batch) >= config.EXPORT_BATCH_SIZE:
+                yield ("\n".join(batch) + "\n").encode("utf-8")
+                batch = []
+        if batch:
+            yield ("\n".join(batch) + "\n").encode("utf-8")
+
+    async def gzipped():
+        compressor = zlib.compressobj(wbits=31)
+        async for chunk in lines():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    headers = {"Content-Disposition": 'attachment; filename="messages.ndjson"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(gzipped(), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from src.services.profiling import PROFILE_HEADER, profiler, token_matches
+
+router = APIRouter()
+
+
+def require_token(request: Request):
+    """
+    Restricts the profiles to clients sending `PROFILE_TOKEN`.
+
+    Raises:
+    - HTTPException: 404 if the token is missing or wrong, or if no token is configured,
+      so the endpoints look absent to everyone else.
+    """
+    if not token_matches(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/profiles")
+async def list_profiles(request: Request):
+    """
+    Lists the most recent request profiles, newest first.
+
+    Args:
+    - request (Request): The request, which must carry the `X-Profile-Token` header.
+
+    Returns:
+    - list: The summary of each kept profile: the request, its duration and the time spent
+      in the database, authentication, bcrypt and template rendering.
+
+    Raises:
+    - HTTPException: 404 if the profiling token is missing or wrong.
+    """
+    require_token(request)
+    return [profile.summary() for profile in reversed(profiler.profiles)]
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, request: Request):
+    """
+    Returns the stack samples of one request profile.
+
+    Args:
+    - profile_id (str): The profile ID, also sent back in the profiled response's `X-Profile-Id` header.
+    - request (Request): The request, which must carry the `X-Profile-Token` header.
+
+    Returns:
+    - PlainTextResponse: The samples in the folded stack format, ready for flamegraph.pl or speedscope.
+
+    Raises:
+    - HTTPException: 404 if the profiling token is wrong or the profile is unknown.
+    """
+    require_token(request)
+    profile = profiler.find(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
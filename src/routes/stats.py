@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from src.database.db import paste_batcher
+from src.repository.pastbin import body_cache, message_cache
+from src.services.admin import require_admin
+from src.services.auth import user_cache
+from src.services.email import email_dispatcher
+from src.services.expiry import expiry_sweeper
+from src.services.http_cache import page_cache
+from src.services.id_pool import id_pool
+from src.services import passwords
+from src.services.profiling import profiler
+from src.services.rate_limit import limiter
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# The `stats()` of every component, by the name used in the URL.
+COMPONENTS = {
+    "id_pool": id_pool.stats,
+    "message_cache": message_cache.stats,
+    "body_cache": body_cache.stats,
+    "page_cache": page_cache.stats,
+    "auth_cache": user_cache.stats,
+    "password_pool": passwords.stats,
+    "email": email_dispatcher.stats,
+    "expiry": expiry_sweeper.stats,
+    "rate_limit": limiter.stats,
+    "profiling": profiler.stats,
+    "paste_writes": paste_batcher.stats,
+}
+
+@router.get("")
+async def all_stats():
+    """
+    Reports the state of every component.
+
+    Returns:
+    - dict: The `stats()` of each component, keyed by component name.
+    """
+    return {name: stats() for name, stats in COMPONENTS.items()}
+
+@router.get("/{component}")
+async def component_stats(component: str):
+    """
+    Reports the state of one component.
+
+    Args:
+    - component (str): The component name, one of the keys of `COMPONENTS`.
+
+    Returns:
+    - dict: The component's `stats()`.
+
+    Raises:
+    - HTTPException: 404 if there is no such component.
+    """
+    stats = COMPONENTS.get(component)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return stats()
@@ -0,0 +1,35 @@
+import hmac
+
+from fastapi import HTTPException, Request
+
+from src.conf.config import config
+
+# Header carrying `ADMIN_TOKEN` on requests to the operator endpoints.
+ADMIN_HEADER = "x-admin-token"
+
+
+def admin_token_matches(value: str):
+    """
+    Checks a client-supplied admin token in constant time.
+
+    Args:
+    - value (str): The token sent by the client, or None.
+
+    Returns:
+    - bool: True if an `ADMIN_TOKEN` is configured and the value matches it.
+    """
+    if not config.ADMIN_TOKEN or not value:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), config.ADMIN_TOKEN.encode("utf-8"))
+
+
+def require_admin(request: Request):
+    """
+    Restricts an endpoint to clients sending `ADMIN_TOKEN` in the `X-Admin-Token` header.
+
+    Raises:
+    - HTTPException: 404 if the token is missing or wrong, or if no token is configured,
+      so the endpoints look absent to everyone else.
+    """
+    if not admin_token_matches(request.headers.get(ADMIN_HEADER)):
+        raise HTTPException(status_code=404, detail="Not Found")
@@ -1,10 +1,25 @@
+import logging
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import Request
 
 from src.conf.config import config
-from src.database.db import find_one_user
+from src.database.db import find_one_user, update_one_user_token
 from src.database.model import User
+from src.services.cache import LRUCache, MISSING
+from src.services.profiling import phase
+
+logger = logging.getLogger(__name__)
+
+# Authenticated users keyed by access token; each entry expires with its token at the latest.
+user_cache = LRUCache(max_entries=config.AUTH_CACHE_MAX_ENTRIES)
+
+# When each user was last invalidated by `invalidate_user`, oldest first; cache entries older
+# than their user's invalidation are stale. Entries live at most `AUTH_CACHE_TTL` seconds, so
+# older invalidations are forgotten and the map only holds those of the last TTL.
+_invalidated_at = OrderedDict()
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """
@@ -31,6 +46,56 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)  # Encode the JWT
     return encoded_jwt
 
+def invalidate_user(username: str):
+    """
+    Drops every cached authentication of a user, for example after the user's document changes.
+
+    Args:
+    - username (str): The user whose cached entries become invalid.
+
+    Notes:
+    - Entries are not looked up by user; instead the time of the invalidation is recorded, and
+      entries created before it are treated as misses and replaced on the next request.
+    - Only this process's cache is affected; other workers pick up the change once their
+      entries reach `AUTH_CACHE_TTL`.
+    """
+    now = time.monotonic()
+    _invalidated_at.pop(username, None)
+    _invalidated_at[username] = now
+    while next(iter(_invalidated_at.values())) < now - config.AUTH_CACHE_TTL:
+        _invalidated_at.popitem(last=False)
+
+def is_current(username: str, cached_at: float):
+    """
+    Checks whether a cache entry was created after its user was last invalidated.
+
+    Args:
+    - username (str): The user of the entry.
+    - cached_at (float): The `time.monotonic()` value taken before the user was loaded.
+
+    Returns:
+    - bool: True if the entry is still valid.
+    """
+    invalidated_at = _invalidated_at.get(username)
+    return invalidated_at is None or cached_at > invalidated_at
+
+async def update_user(username: str, update: dict, f: dict = None):
+    """
+    Updates a user's document and drops the user's cached authentications.
+
+    Args:
+    - username (str): The user whose document changes.
+    - update (dict): The update operators to apply.
+    - f (dict, optional): The filter identifying the document; defaults to the username.
+
+    Notes:
+    - Every change to a user document goes through here, so cached authentications never
+      outlive the document they were built from in this process.
+    """
+    await update_one_user_token(f or {"username": username}, update)
+    invalidate_user(username)
+
+@phase("auth")
 async def get_current_user(request: Request) -> User:
     """
     Retrieves the currently authenticated user based on the access token in the request cookies.
@@ -45,6 +110,8 @@ async def get_current_user(request: Request) -> User:
     - The function attempts to extract the `access_token` from cookies, decode it, and validate the user's existence in the database.
     - If the token is prefixed with "Bearer ", it is stripped before decoding.
     - If the token is invalid or the user does not exist, `None` is returned.
+    - Successful lookups are cached by token for up to `AUTH_CACHE_TTL` seconds (never beyond the
+      token's expiry), so a cache hit skips both the JWT decode and the database query.
     """
     try:
         # Extract token from cookies
@@ -56,6 +123,13 @@ async def get_current_user(request: Request) -> User:
         if token.startswith("Bearer "):
             token = token[len("Bearer "):]
         
+        # Serve the user from the cache if this token was seen recently
+        cached = user_cache.get(token)
+        if cached is not MISSING:
+            current_user, cached_at = cached
+            if is_current(current_user.username, cached_at):
+                return current_user
+
         # Decode the token and extract the payload
         payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
         username: str = payload.get("sub")
@@ -63,12 +137,17 @@ async def get_current_user(request: Request) -> User:
             return None
         
         # Check if user exists in the database
+        # Taken before the query; a user invalidated during it is not cached.
+        cached_at = time.monotonic()
         user = await find_one_user({"username": username})
         if user is None:
             return None
         
-        return User(username=user["username"], email=user["email"])
+        current_user = User(username=user["username"], email=user["email"])
+        ttl = min(config.AUTH_CACHE_TTL, payload.get("exp", 0) - time.time())
+        if ttl > 0 and is_current(username, cached_at):
+            user_cache.set(token, (current_user, cached_at), ttl=ttl)
+        return current_user
     except JWTError as e:
-        # Log the error for debugging purposes
-        print(f"JWT error: {e}")
+        logger.info("Rejected access token: %s", e)
         return None
\ No newline at end of file
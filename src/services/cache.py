@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+
+# Returned by `LRUCache.get` when a key is not cached.
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A bounded in-process cache with least-recently-used eviction.
+
+    The cache is limited both by entry count and by the approximate size of the cached
+    values. Entries may carry a time-to-live, and unknown keys can be cached negatively
+    (as None) for a short time so repeated lookups of missing keys skip the database.
+
+    Attributes:
+    - max_entries (int): The maximum number of entries.
+    - max_bytes (int): The maximum total size of the cached values; 0 disables the limit.
+    - negative_ttl (float): The number of seconds a negative entry is kept.
+    - sizeof (callable): Returns the approximate size of a value in bytes.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, negative_ttl: float = 0.0, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self.size = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        """
+        Looks up a key and marks it as recently used.
+
+        Args:
+        - key: The cache key.
+        - default: The value returned when the key is not cached.
+
+        Returns:
+        - The cached value (None for a negative entry), or `default` if the key is not
+          cached or has expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        if value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Stores a value, evicting the least recently used entries if a limit is exceeded.
+
+        Args:
+        - key: The cache key.
+        - value: The value to cache.
+        - ttl (float, optional): The number of seconds the entry stays valid; None keeps it
+          until it is evicted.
+
+        Notes:
+        - Values larger than `max_bytes` on their own are not cached.
+        """
+        size = self.sizeof(value) if value is not None else 0
+        if self.max_bytes and size > self.max_bytes:
+            self.delete(key)
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, size, expires_at)
+        self.size += size
+        while len(self._entries) > self.max_entries or (self.max_bytes and self.size > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def set_negative(self, key):
+        """
+        Records that a key does not exist, for `negative_ttl` seconds.
+
+        Args:
+        - key: The cache key.
+        """
+        if self.negative_ttl > 0:
+            self.set(key, None, ttl=self.negative_ttl)
+
+    def delete(self, key):
+        """
+        Removes a key from the cache if it is present.
+
+        Args:
+        - key: The cache key.
+        """
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        self._entries.clear()
+        self.size = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Reports the cache counters.
+
+        Returns:
+        - dict: The number of entries, their total size, and the hit, miss and eviction counters.
+        """
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
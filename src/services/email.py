@@ -1,30 +1,204 @@
+import asyncio
+import logging
+import random
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
 
 from src.conf.config import config
 
-# Define the email configuration
-conf = ConnectionConfig(
-    MAIL_USERNAME="tryfastapi@meta.ua",
-    MAIL_PASSWORD="Metasveta2024",
-    MAIL_FROM="tryfastapi@meta.ua",
-    MAIL_PORT=465,
-    MAIL_SERVER="smtp.meta.ua",
-    MAIL_FROM_NAME="Pastbin",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+logger = logging.getLogger(__name__)
+
+templates = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / 'templates'),
+    autoescape=select_autoescape(["html"]),
+)
+
+
+class EmailDispatcher:
+    """
+    Sends queued emails over a small pool of long-lived SMTP connections.
+
+    Messages are put on an in-process queue and drained by a fixed number of workers.
+    Each worker keeps its own SMTP connection open between messages, reconnecting only
+    when the server drops it, and retries failed sends with exponential backoff.
+
+    Attributes:
+    - workers (int): The number of workers, and so of SMTP connections.
+    - queue_size (int): The maximum number of messages waiting to be sent.
+    - max_retries (int): The number of retries after the first failed attempt.
+    - retry_backoff (float): The delay before the first retry, in seconds; it doubles on each retry.
+    """
+
+    def __init__(self, workers: int, queue_size: int, max_retries: int, retry_backoff: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.sent_total = 0
+        self.failed_total = 0
+        self.retries_total = 0
+        self.dropped_total = 0
+        self.send_seconds_total = 0.0
+        self.send_seconds_max = 0.0
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        """
+        Creates the queue and starts the workers.
+        """
+        if not self._tasks:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Waits up to `timeout` seconds for the queue to drain, then stops the workers.
+
+        Args:
+        - timeout (float): The number of seconds to wait for queued messages.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with %d unsent email(s)", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, message: EmailMessage):
+        """
+        Queues a message for sending without waiting for it to be sent.
+
+        Args:
+        - message (EmailMessage): The message to send.
+
+        Returns:
+        - bool: True if the message was queued, False if the queue is full or the dispatcher is not running.
+        """
+        if self._queue is None:
+            logger.error("Email dispatcher is not running, dropping message to %s", message["To"])
+            self.dropped_total += 1
+            return False
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.error("Email queue is full, dropping message to %s", message["To"])
+            self.dropped_total += 1
+            return False
+        return True
+
+    def _connect(self):
+        """
+        Creates an SMTP client for the configured server.
+
+        Returns:
+        - aiosmtplib.SMTP: A client that is not connected yet.
+        """
+        return aiosmtplib.SMTP(
+            hostname=config.MAIL_SERVER,
+            port=config.MAIL_PORT,
+            use_tls=config.MAIL_SSL_TLS,
+            start_tls=config.MAIL_STARTTLS,
+            validate_certs=config.MAIL_VALIDATE_CERTS,
+            timeout=config.MAIL_TIMEOUT,
+        )
+
+    async def _send(self, smtp, message: EmailMessage):
+        """
+        Sends a message, (re)connecting and logging in first if the connection is down.
+
+        Returns:
+        - aiosmtplib.SMTP: The client to reuse for the next message.
+        """
+        if smtp is None or not smtp.is_connected:
+            smtp = self._connect()
+            await smtp.connect()
+            if config.MAIL_USE_CREDENTIALS:
+                await smtp.login(config.MAIL_USERNAME, config.MAIL_PASSWORD)
+        await smtp.send_message(message)
+        return smtp
+
+    async def _worker(self):
+        """
+        Sends messages from the queue for as long as the dispatcher runs.
+        """
+        smtp = None
+        try:
+            while True:
+                message = await self._queue.get()
+                try:
+                    for attempt in range(self.max_retries + 1):
+                        started = time.monotonic()
+                        try:
+                            smtp = await self._send(smtp, message)
+                        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                            if smtp is not None:
+                                smtp.close()
+                            smtp = None
+                            if attempt == self.max_retries:
+                                logger.error("Giving up on email to %s: %s", message["To"], e)
+                                self.failed_total += 1
+                                break
+                            self.retries_total += 1
+                            delay = self.retry_backoff * 2 ** attempt
+                            logger.warning("Sending email to %s failed (%s), retrying in %.1fs", message["To"], e, delay)
+                            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                        else:
+                            elapsed = time.monotonic() - started
+                            self.sent_total += 1
+                            self.send_seconds_total += elapsed
+                            self.send_seconds_max = max(self.send_seconds_max, elapsed)
+                            break
+                finally:
+                    self._queue.task_done()
+        finally:
+            if smtp is not None and smtp.is_connected:
+                smtp.close()
+
+    def stats(self):
+        """
+        Reports the dispatcher metrics.
+
+        Returns:
+        - dict: The queue depth, the send counters and the average and maximum send latency in seconds.
+        """
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "sent_total": self.sent_total,
+            "failed_total": self.failed_total,
+            "retries_total": self.retries_total,
+            "dropped_total": self.dropped_total,
+            "send_seconds_avg": self.send_seconds_total / self.sent_total if self.sent_total else 0.0,
+            "send_seconds_max": self.send_seconds_max,
+        }
+
+
+email_dispatcher = EmailDispatcher(
+    workers=config.MAIL_WORKERS,
+    queue_size=config.MAIL_QUEUE_SIZE,
+    max_retries=config.MAIL_MAX_RETRIES,
+    retry_backoff=config.MAIL_RETRY_BACKOFF,
 )
 
+
 async def send_confirmation_email(email: EmailStr, token: str, host: str):
     """
-    Sends a confirmation email for email verification.
+    Queues a confirmation email for email verification.
 
-    This function sends an email to the user with a verification link that includes a token.
+    This function renders an email with a verification link that includes a token and hands
+    it to the email dispatcher, which sends it in the background.
     The email template used for sending is specified as "verify_email.html".
 
     Args:
@@ -32,30 +206,18 @@ async def send_confirmation_email(email: EmailStr, token: str, host: str):
         token (str): The verification token to be included in the email. This token will be used to confirm the user's email.
         host (str): The base URL of the host where the verification link should point to.
 
-    Raises:
-        ConnectionErrors: If there is an issue connecting to the email server, such as authentication failure or network issues.
-        Exception: For any other unexpected errors that may occur during the process.
+    Returns:
+        bool: True if the email was queued, False if the queue is full.
 
     Notes:
-        - The email configuration is set up to use SMTP with SSL/TLS.
-        - Ensure that the email server credentials and configuration are correctly set.
+        - The SMTP server, credentials and TLS mode come from the `MAIL_*` settings.
+        - Delivery failures are retried with backoff and logged; they never reach the caller.
         - The template for the email is located in the 'templates' folder relative to this file.
     """
-    try:
-        # Create a message schema with the necessary details
-        message = MessageSchema(
-            subject="Confirm your email",
-            recipients=[email],  # List of recipient emails
-            template_body={"token": token, "host": host},  # Data to be passed to the email template
-            subtype=MessageType.html  # Email content type
-        )
-        # Initialize FastMail with the configured settings
-        fm = FastMail(conf)
-        # Send the email using the specified template
-        await fm.send_message(message, template_name="verify_email.html")
-    except ConnectionErrors as err:
-        # Handle connection errors such as issues with the email server
-        print(f"Connection error: {err}")
-    except Exception as e:
-        # Handle any other unexpected exceptions
-        print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+    message = EmailMessage()
+    message["Subject"] = "Confirm your email"
+    message["From"] = formataddr((config.MAIL_FROM_NAME, config.MAIL_FROM))
+    message["To"] = email
+    body = templates.get_template("verify_email.html").render(token=token, host=host)
+    message.set_content(body, subtype="html")
+    return email_dispatcher.enqueue(message)
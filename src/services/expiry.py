@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+from src.conf.config import config
+from src.repository.pastbin import sweep_expired
+
+logger = logging.getLogger(__name__)
+
+
+class ExpirySweeper:
+    """
+    Periodically deletes expired pastes and releases their bodies.
+
+    MongoDB's TTL index only removes paste documents, so it cannot drop the reference a
+    paste holds on its shared body. The sweeper deletes expired pastes itself, shortly
+    after they expire, and leaves the TTL index as a backstop for pastes it missed.
+
+    Attributes:
+    - interval (float): The number of seconds between sweeps.
+    - batch_size (int): The number of expired pastes looked up per round trip.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sweeps_total = 0
+        self.deleted_total = 0
+        self.last_sweep_seconds = 0.0
+        self._running = False
+        self._task = None
+
+    async def start(self):
+        """
+        Starts the background sweep task.
+        """
+        if self._task is None:
+            self._running = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Cancels the background sweep task and waits for it to finish.
+        """
+        if self._task is not None:
+            self._running = False
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """
+        Sweeps, then sleeps until the next interval.
+        """
+        while self._running:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sweeping expired pastes failed")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self):
+        """
+        Deletes every paste that has expired.
+
+        Returns:
+        - int: The number of pastes deleted.
+        """
+        started = time.monotonic()
+        deleted = await sweep_expired(self.batch_size)
+        self.last_sweep_seconds = time.monotonic() - started
+        self.sweeps_total += 1
+        self.deleted_total += deleted
+        if deleted:
+            logger.info("Deleted %d expired paste(s) in %.2fs", deleted, self.last_sweep_seconds)
+        return deleted
+
+    def stats(self):
+        """
+        Reports the sweeper metrics.
+
+        Returns:
+        - dict: The sweep and deletion totals and the duration of the last sweep in seconds.
+        """
+        return {
+            "interval": self.interval,
+            "sweeps_total": self.sweeps_total,
+            "deleted_total": self.deleted_total,
+            "last_sweep_seconds": self.last_sweep_seconds,
+        }
+
+
+expiry_sweeper = ExpirySweeper(interval=config.PASTE_SWEEP_INTERVAL, batch_size=config.PASTE_SWEEP_BATCH)
@@ -0,0 +1,260 @@
+import asyncio
+import gzip
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from src.conf.config import config
+from src.services.cache import LRUCache, MISSING
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Content codings pages can be sent in, besides "identity".
+CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Pages larger than this are compressed on a worker thread, so the event loop keeps serving.
+COMPRESS_OFFLOAD_BYTES = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Raised when a Range header does not overlap the representation.
+    """
+
+
+def compress(body: bytes, encoding: str):
+    """
+    Compresses a page body with a content coding.
+
+    Args:
+    - body (bytes): The uncompressed body.
+    - encoding (str): "gzip" or "br".
+
+    Returns:
+    - bytes: The compressed body. Mid-range levels are used: the highest ones cost many
+      times the CPU for a few percent less output.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class RenderedPage:
+    """
+    A rendered HTML page together with its compressed variants.
+
+    Attributes:
+    - body (bytes): The uncompressed UTF-8 body.
+    - etag (str): The quoted strong entity tag of the uncompressed body.
+    - codings (tuple): The content codings the page may be sent in; empty for pages that are
+      never reused, which are not worth compressing.
+    - encoded (dict): Compressed bodies keyed by content coding, each made when first requested.
+    """
+
+    def __init__(self, body: bytes, etag: str, compressible: bool = True):
+        self.body = body
+        self.etag = etag
+        self.codings = CODINGS if compressible else ()
+        self.encoded = {}
+
+    @property
+    def size(self):
+        # Variants are compressed after the page is cached, so room is reserved for them;
+        # a compressed variant of an HTML page is smaller than the page.
+        return len(self.body) * (1 + len(self.codings))
+
+    def entity_tag(self, encoding: str):
+        """
+        Returns the strong entity tag of the page in a content coding.
+
+        Args:
+        - encoding (str): "identity", "gzip" or "br".
+
+        Returns:
+        - str: The quoted tag; each coding gets its own, because strong validators must differ
+          between byte-wise different representations.
+        """
+        if encoding in self.codings:
+            return f'{self.etag[:-1]}-{encoding}"'
+        return self.etag
+
+    async def encode(self, encoding: str):
+        """
+        Returns the body of the page in a content coding, compressing it on first use.
+
+        Args:
+        - encoding (str): "identity", "gzip" or "br".
+
+        Returns:
+        - bytes: The body; bodies over `COMPRESS_OFFLOAD_BYTES` are compressed on a worker thread.
+        """
+        if encoding not in self.codings:
+            return self.body
+        data = self.encoded.get(encoding)
+        if data is None:
+            if len(self.body) > COMPRESS_OFFLOAD_BYTES:
+                data = await asyncio.to_thread(compress, self.body, encoding)
+            else:
+                data = compress(self.body, encoding)
+            self.encoded[encoding] = data
+        return data
+
+
+page_cache = LRUCache(
+    max_entries=config.PAGE_CACHE_MAX_ENTRIES,
+    max_bytes=config.PAGE_CACHE_MAX_BYTES,
+    sizeof=lambda page: page.size,
+)
+
+
+def make_etag(*parts: str):
+    """
+    Derives a strong entity tag from the given strings.
+
+    Args:
+    - *parts (str): The values identifying the content, such as an ID and the content itself.
+
+    Returns:
+    - str: The quoted entity tag.
+    """
+    digest = hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def render_page(key: str, template: str, context: dict, ttl: float = None, cache: bool = True):
+    """
+    Renders a template once and reuses the result for later requests.
+
+    Args:
+    - key (str): The cache key of the page; it must change whenever the content does.
+    - template (str): The template name.
+    - context (dict): The template variables; the template must not need the request.
+    - ttl (float, optional): The number of seconds the page may be reused, for content that expires.
+    - cache (bool): Whether to read and fill `page_cache`; off for pages that must never be reused.
+
+    Returns:
+    - RenderedPage: The rendered page with an ETag derived from the key and the context;
+      pages that are not cached are sent uncompressed.
+    """
+    page = page_cache.get(key) if cache else MISSING
+    if page is MISSING:
+        body = config.TEMPLATES.get_template(template).render(**context).encode("utf-8")
+        etag = make_etag(key, *(str(context[name]) for name in sorted(context)))
+        page = RenderedPage(body, etag, compressible=cache)
+        if cache:
+            page_cache.set(key, page, ttl=ttl)
+    return page
+
+
+def negotiate_encoding(accept_encoding: str, available):
+    """
+    Picks the content coding to send based on the Accept-Encoding header.
+
+    Args:
+    - accept_encoding (str): The raw Accept-Encoding header value.
+    - available: The codings the server can send, besides "identity".
+
+    Returns:
+    - str: "br", "gzip" or "identity".
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str):
+    """
+    Checks an If-None-Match header against an entity tag using weak comparison.
+
+    Args:
+    - if_none_match (str): The raw If-None-Match header value.
+    - etag (str): The current entity tag.
+
+    Returns:
+    - bool: True if the client already has the current representation.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def parse_range(range_header: str, size: int):
+    """
+    Parses a single-range `Range: bytes=...` header.
+
+    Args:
+    - range_header (str): The raw Range header value.
+    - size (int): The length of the representation in bytes.
+
+    Returns:
+    - tuple: The first and last byte positions (inclusive), or None if the header should be
+      ignored and the full representation sent (unknown unit, malformed, or multiple ranges).
+
+    Raises:
+    - RangeNotSatisfiable: If the range starts beyond the end of the representation.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes.
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else max(start, size - 1)
+    except ValueError:
+        return None
+    if start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+async def page_response(request: Request, page: RenderedPage, cache_control: str):
+    """
+    Builds the response for a cached page, honouring conditional and compression headers.
+
+    Args:
+    - request (Request): The incoming request.
+    - page (RenderedPage): The page to send.
+    - cache_control (str): The Cache-Control header value.
+
+    Returns:
+    - Response: A 304 response if the client's copy is current, otherwise the page body
+      in the best coding the client accepts.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), page.codings)
+    etag = page.entity_tag(encoding)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = await page.encode(encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from src.conf.config import config
+from src.database.db import claim_one_from_free_urls, claim_many_from_free_urls, count_free_urls, lease_id_block
+from src.repository.free_urls import counter_id, free_urls, generate_string_hash
+
+logger = logging.getLogger(__name__)
+
+# Window (in seconds) over which the refill rate is reported.
+REFILL_RATE_WINDOW = 60.0
+
+
+class FreeUrlPool:
+    """
+    Keeps the 'free_urls' collection stocked with ready-to-use paste hashes.
+
+    A background task tops the collection up with batched inserts whenever its depth
+    falls below the low watermark, and paste creation claims hashes with a single
+    atomic find-and-delete.
+
+    Attributes:
+    - low_watermark (int): The depth below which the pool is refilled.
+    - batch_size (int): The number of hashes written per `insert_many`.
+    - interval (float): The number of seconds between depth checks.
+    """
+
+    def __init__(self, low_watermark: int, batch_size: int, interval: float):
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.interval = interval
+        self.depth = 0
+        self.refilled_total = 0
+        self.claimed_total = 0
+        self.empty_claims = 0
+        self._refills = deque()
+        self._wakeup = asyncio.Event()
+        self._running = False
+        self._task = None
+
+    async def start(self):
+        """
+        Starts the background refill task.
+        """
+        if self._task is None:
+            # Created here rather than at import, so the event belongs to the running loop
+            # even when the application is started again in the same process.
+            self._wakeup = asyncio.Event()
+            self._running = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Cancels the background refill task and waits for it to finish.
+        """
+        if self._task is not None:
+            # The flag also ends the loop if the cancellation is swallowed by `wait_for`.
+            self._running = False
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """
+        Refills the pool, then sleeps until the next interval or until a claim wakes it up.
+        """
+        while self._running:
+            try:
+                await self.refill()
+            except Exception:
+                logger.exception("Refilling the free_urls pool failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def refill(self):
+        """
+        Inserts batches of new hashes until the pool depth reaches the low watermark.
+
+        Returns:
+        - int: The number of hashes inserted.
+        """
+        self.depth = await count_free_urls()
+        inserted = 0
+        while self.depth < self.low_watermark:
+            batch = await free_urls(self.batch_size)
+            if not batch:
+                break
+            self.depth += batch
+            inserted += batch
+        if inserted:
+            self.refilled_total += inserted
+            self._refills.append((time.monotonic(), inserted))
+        return inserted
+
+    async def acquire(self):
+        """
+        Claims a free hash for a new paste.
+
+        Returns:
+        - str: A hash that no other caller has received.
+
+        Notes:
+        - If the pool is empty, a fresh hash is generated on the spot instead of failing;
+          it never touches the collection, so it cannot be handed out twice.
+        """
+        free_hash = await claim_one_from_free_urls()
+        self.claimed_total += 1
+        self.depth = max(self.depth - 1, 0)
+        if self.depth < self.low_watermark:
+            self._wakeup.set()
+        if free_hash is None:
+            self.empty_claims += 1
+            free_hash = await generate_string_hash()
+        return free_hash
+
+    async def acquire_many(self, count: int):
+        """
+        Claims free hashes for several new pastes at once.
+
+        Args:
+        - count (int): The number of hashes wanted.
+
+        Returns:
+        - list: `count` hashes that no other caller has received.
+
+        Notes:
+        - Any shortfall left by an empty pool is made up with freshly generated hashes.
+        """
+        hashes = await claim_many_from_free_urls(count) if count else []
+        self.claimed_total += count
+        self.depth = max(self.depth - len(hashes), 0)
+        if self.depth < self.low_watermark:
+            self._wakeup.set()
+        if len(hashes) < count:
+            self.empty_claims += count - len(hashes)
+            hashes += [await generate_string_hash() for _ in range(count - len(hashes))]
+        return hashes
+
+    def stats(self):
+        """
+        Reports the pool metrics.
+
+        Returns:
+        - dict: The last observed depth, the refill rate (hashes per second over the last
+          minute) and the running totals.
+        """
+        cutoff = time.monotonic() - REFILL_RATE_WINDOW
+        while self._refills and self._refills[0][0] < cutoff:
+            self._refills.popleft()
+        return {
+            "depth": self.depth,
+            "low_watermark": self.low_watermark,
+            "refill_rate": sum(count for _, count in self._refills) / REFILL_RATE_WINDOW,
+            "refilled_total": self.refilled_total,
+            "claimed_total": self.claimed_total,
+            "empty_claims": self.empty_claims,
+        }
+
+
+class LeasedBlockAllocator:
+    """
+    Hands out short base62 paste IDs from counter blocks leased from MongoDB.
+
+    Each worker reserves a block of counter values with one atomic increment and then
+    issues IDs from memory, so creating a paste needs no database access for its ID.
+    Blocks never overlap, and values left unused when a worker stops are simply skipped,
+    which keeps IDs unique across workers and restarts.
+
+    Attributes:
+    - block_size (int): The number of counter values leased at a time.
+    """
+
+    COUNTER_NAME = "paste_id"
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.leases_total = 0
+        self.issued_total = 0
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """
+        Nothing runs in the background; the first block is leased on first use.
+        """
+        # A lock bound to a previous event loop cannot be reused after a restart.
+        self._lock = asyncio.Lock()
+
+    async def stop(self):
+        """
+        Nothing runs in the background; the rest of the current block is discarded.
+        """
+
+    async def acquire(self):
+        """
+        Issues the next paste ID.
+
+        Returns:
+        - str: A 9-character base62 ID that no other worker has issued.
+        """
+        if self._next >= self._end:
+            async with self._lock:
+                # Another caller may have leased a block while this one was waiting.
+                if self._next >= self._end:
+                    self._next = await lease_id_block(self.COUNTER_NAME, self.block_size)
+                    self._end = self._next + self.block_size
+                    self.leases_total += 1
+        value = self._next
+        self._next += 1
+        self.issued_total += 1
+        return counter_id(value)
+
+    async def acquire_many(self, count: int):
+        """
+        Issues several consecutive paste IDs.
+
+        Args:
+        - count (int): The number of IDs wanted.
+
+        Returns:
+        - list: `count` 9-character base62 IDs that no other worker has issued.
+
+        Notes:
+        - If the current block cannot cover the request, one block large enough for the
+          whole request is leased and the rest of the current block is discarded.
+        """
+        async with self._lock:
+            if self._end - self._next < count:
+                size = max(self.block_size, count)
+                self._next = await lease_id_block(self.COUNTER_NAME, size)
+                self._end = self._next + size
+                self.leases_total += 1
+            first = self._next
+            self._next += count
+        self.issued_total += count
+        return [counter_id(value) for value in range(first, first + count)]
+
+    def stats(self):
+        """
+        Reports the allocator metrics.
+
+        Returns:
+        - dict: The values left in the current block and the running totals.
+        """
+        return {
+            "block_size": self.block_size,
+            "remaining_in_block": self._end - self._next,
+            "leases_total": self.leases_total,
+            "issued_total": self.issued_total,
+        }
+
+
+def create_id_pool(strategy: str):
+    """
+    Builds the paste ID source selected by the `ID_STRATEGY` setting.
+
+    Args:
+    - strategy (str): "hash" for pre-generated SHA-256 hashes, "counter" for leased counter blocks.
+
+    Returns:
+    - FreeUrlPool or LeasedBlockAllocator: An object with `start`, `stop`, `acquire`, `acquire_many` and `stats`.
+    """
+    if strategy == "counter":
+        return LeasedBlockAllocator(block_size=config.ID_BLOCK_SIZE)
+    return FreeUrlPool(
+        low_watermark=config.FREE_URLS_LOW_WATERMARK,
+        batch_size=config.FREE_URLS_REFILL_BATCH,
+        interval=config.FREE_URLS_REFILL_INTERVAL,
+    )
+
+
+id_pool = create_id_pool(config.ID_STRATEGY)
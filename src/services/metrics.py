@@ -0,0 +1,237 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+
+from src.services.profiling import current_profile
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second bcrypt and exports.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = ""):
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    A monotonically increasing value per label set.
+
+    Attributes:
+    - name (str): The metric name.
+    - help (str): The description shown by Prometheus.
+    - labels (tuple): The label names.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        """
+        Adds to the value of a label set.
+
+        Args:
+        - *label_values: The label values, in the order of `labels`.
+        - amount (float): The amount to add.
+        """
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Counts observations into fixed buckets per label set.
+
+    Observing costs a dictionary lookup and a binary search, so it is cheap enough for every
+    request and every database call; cumulative bucket counts are only built when rendering.
+
+    Attributes:
+    - name (str): The metric name.
+    - help (str): The description shown by Prometheus.
+    - labels (tuple): The label names.
+    - buckets (tuple): The sorted upper bounds of the buckets, without +Inf.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        """
+        Records one observation.
+
+        Args:
+        - value (float): The observed value, e.g. a duration in seconds.
+        - *label_values: The label values, in the order of `labels`.
+        """
+        series = self._series.get(label_values)
+        if series is None:
+            # One count per bucket plus +Inf, then the sum.
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for label_values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render_samples(name: str, help: str, kind: str, samples: list):
+    """
+    Renders samples read from another component when the metrics are scraped.
+
+    Args:
+    - name (str): The metric name.
+    - help (str): The description shown by Prometheus.
+    - kind (str): The metric type, "gauge" or "counter".
+    - samples (list): (labels dict, value) pairs.
+
+    Returns:
+    - list: The exposition lines.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+http_request_duration = Histogram(
+    "pastbin_http_request_duration_seconds",
+    "Time spent handling HTTP requests, until the last body byte was sent.",
+    ("method", "route"),
+)
+http_requests = Counter(
+    "pastbin_http_requests_total",
+    "HTTP requests handled, by response status.",
+    ("method", "route", "status"),
+)
+db_call_duration = Histogram(
+    "pastbin_db_call_duration_seconds",
+    "Time spent in each function of src/database/db.py.",
+    ("function",),
+)
+db_call_errors = Counter(
+    "pastbin_db_call_errors_total",
+    "Calls of src/database/db.py functions that raised.",
+    ("function",),
+)
+
+
+def timed(func):
+    """
+    Records the duration of every call of a coroutine function in `db_call_duration`.
+
+    Args:
+    - func: The coroutine function.
+
+    Returns:
+    - The wrapped function; calls that raise are also counted in `db_call_errors`, and calls
+      made while a request is profiled are added to its "db" phase.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        outermost = profile is not None and profile.enter("db")
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except BaseException:
+            db_call_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            db_call_duration.observe(elapsed, name)
+            if outermost:
+                profile.leave("db", elapsed)
+
+    return wrapper
+
+
+def instrument_module(namespace: dict, module_name: str, exclude: tuple = ()):
+    """
+    Wraps every coroutine function defined in a module with `timed`.
+
+    Args:
+    - namespace (dict): The module's globals.
+    - module_name (str): The module's `__name__`, so imported functions are left alone.
+    - exclude (tuple): The names of helpers the module's operations are built from; they are
+      left unwrapped so their time is only recorded under the operation that called them.
+
+    Notes:
+    - Must run at the end of the module, before other modules import its functions; calls
+      between the module's own operations go through its globals and are timed as well.
+    """
+    for name, value in list(namespace.items()):
+        if name in exclude:
+            continue
+        if inspect.iscoroutinefunction(value) and value.__module__ == module_name:
+            namespace[name] = timed(value)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and status of every HTTP request.
+
+    Requests are labelled with the route's path template (e.g. "/pastbin/message/{message_id}")
+    rather than the raw path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], path)
+            http_requests.inc(scope["method"], path, status)
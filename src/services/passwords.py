@@ -0,0 +1,127 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from src.conf.config import config
+from src.services.profiling import phase
+
+# bcrypt releases the GIL while hashing, so a thread pool runs it in parallel with the event loop.
+# Created on first use and dropped by `shutdown`, so a restarted application gets a new one.
+_executor = None
+
+# Number of hash operations currently running or waiting for a worker.
+_in_flight = 0
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when every worker is busy and the wait queue is full.
+    """
+
+
+def get_executor():
+    """
+    Returns the worker pool, creating it if it does not exist yet.
+
+    Returns:
+    - ThreadPoolExecutor: The pool of `PASSWORD_HASH_WORKERS` bcrypt threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+@phase("bcrypt")
+async def _run(func, *args):
+    """
+    Runs a bcrypt call on the worker pool, refusing it if the pool is saturated.
+
+    Args:
+    - func: The blocking function to run.
+    - *args: Its arguments.
+
+    Returns:
+    - The function's result.
+
+    Raises:
+    - PasswordHasherBusy: If `PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE` calls are already pending.
+    """
+    global _in_flight
+    if _in_flight >= config.PASSWORD_HASH_WORKERS + config.PASSWORD_HASH_QUEUE_SIZE:
+        raise PasswordHasherBusy()
+    _in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    finally:
+        _in_flight -= 1
+
+
+async def hash_password(password: str):
+    """
+    Hashes a password with the configured bcrypt cost.
+
+    Args:
+    - password (str): The plain-text password.
+
+    Returns:
+    - str: The bcrypt hash.
+    """
+    hashed = await _run(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS))
+    return hashed.decode("utf-8")
+
+
+async def verify_password(password: str, hashed_password: str):
+    """
+    Checks a password against a stored bcrypt hash.
+
+    Args:
+    - password (str): The plain-text password.
+    - hashed_password (str): The stored hash.
+
+    Returns:
+    - bool: True if the password matches.
+    """
+    return await _run(bcrypt.checkpw, password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def needs_rehash(hashed_password: str):
+    """
+    Checks whether a stored hash was made with a different cost than the configured one.
+
+    Args:
+    - hashed_password (str): The stored hash, formatted as "$2b$<cost>$<salt and hash>".
+
+    Returns:
+    - bool: True if the hash should be replaced.
+    """
+    try:
+        return int(hashed_password.split("$")[2]) != config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def stats():
+    """
+    Reports the state of the worker pool.
+
+    Returns:
+    - dict: The number of pending operations and the pool limits.
+    """
+    return {
+        "in_flight": _in_flight,
+        "workers": config.PASSWORD_HASH_WORKERS,
+        "queue_size": config.PASSWORD_HASH_QUEUE_SIZE,
+    }
+
+
+def shutdown():
+    """
+    Stops the worker threads once the running operations finish; the next hash operation
+    starts a new pool.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,361 @@
+import asyncio
+import functools
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import jinja2
+
+from src.conf.config import config
+
+logger = logging.getLogger(__name__)
+
+# Header carrying `PROFILE_TOKEN`, both to force profiling of a request and to read the profiles.
+PROFILE_HEADER = "x-profile-token"
+
+# The profile of the request being handled, or None; the phase hooks only look at this.
+current_profile = ContextVar("current_profile", default=None)
+
+
+def profiling_enabled():
+    """
+    Tells whether requests can be profiled at all.
+
+    Returns:
+    - bool: True if `PROFILE_SAMPLE_RATE` is positive or a `PROFILE_TOKEN` is set.
+    """
+    return config.PROFILE_SAMPLE_RATE > 0 or bool(config.PROFILE_TOKEN)
+
+
+def token_matches(value: str):
+    """
+    Checks a client-supplied profiling token in constant time.
+
+    Args:
+    - value (str): The token sent by the client, or None.
+
+    Returns:
+    - bool: True if a `PROFILE_TOKEN` is configured and the value matches it.
+    """
+    if not config.PROFILE_TOKEN or not value:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), config.PROFILE_TOKEN.encode("utf-8"))
+
+
+class Profile:
+    """
+    The timings and stack samples of one profiled request.
+
+    Attributes:
+    - id (str): The profile ID.
+    - method (str): The HTTP method.
+    - path (str): The request path.
+    - route (str): The matched route template, known once the request was routed.
+    - status (int): The response status.
+    - duration (float): The time spent handling the request, in seconds.
+    - phases (dict): The seconds spent in each phase ("db", "auth", "bcrypt", "render").
+    - samples (Counter): The number of samples taken of each folded stack.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.id = f"{time.time_ns():x}{random.getrandbits(16):04x}"
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.phases = {}
+        self.samples = Counter()
+        self._open = set()
+
+    def enter(self, phase: str):
+        """
+        Marks a phase as started.
+
+        Returns:
+        - bool: False if the phase is already running, e.g. a database function calling
+          another one; only the outermost call is timed, so time is not counted twice.
+        """
+        if phase in self._open:
+            return False
+        self._open.add(phase)
+        return True
+
+    def leave(self, phase: str, seconds: float):
+        """
+        Marks a phase started with `enter` as finished and adds its duration.
+        """
+        self._open.discard(phase)
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def folded(self):
+        """
+        Renders the samples in the folded stack format read by flamegraph.pl and speedscope.
+
+        Returns:
+        - str: One "frame;frame;frame count" line per distinct stack, outermost frame first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self):
+        """
+        Summarizes the profile.
+
+        Returns:
+        - dict: The request, its duration and the milliseconds spent in each phase. The "auth"
+          phase includes the user lookup, which is also counted under "db"; "other" estimates
+          the time outside the phases, such as validation and routing.
+        """
+        phases = {name: seconds * 1000 for name, seconds in self.phases.items()}
+        phases["other"] = max(self.duration * 1000 - sum(phases.values()), 0.0)
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration * 1000,
+            "phases_ms": phases,
+            "samples": sum(self.samples.values()),
+        }
+
+
+def fold_stack(frame):
+    """
+    Turns a frame and its callers into one folded stack string.
+    """
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class Profiler:
+    """
+    Samples the event loop thread's stack while profiled requests are in flight.
+
+    The sampling thread only runs while at least one profile is active. Requests handled
+    concurrently share the event loop, so a sample is added to every active profile;
+    profile under light load, or with a low sample rate, for clean flamegraphs.
+
+    Attributes:
+    - interval (float): The number of seconds between samples.
+    - max_profiles (int): The number of finished profiles kept in memory.
+    - output_dir (str): A directory each finished profile is also written to as
+      "<id>.folded", or an empty string.
+    """
+
+    def __init__(self, interval: float, max_profiles: int, output_dir: str = ""):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.profiles = deque(maxlen=max_profiles)
+        self.profiled_total = 0
+        self._active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._target = None
+
+    def should_profile(self, scope: dict):
+        """
+        Decides whether to profile a request.
+
+        Args:
+        - scope (dict): The ASGI scope of the request.
+
+        Returns:
+        - bool: True if the request carries the profiling token or falls in the sampled fraction.
+        """
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER.encode("latin-1"):
+                return token_matches(value.decode("latin-1"))
+        return random.random() < config.PROFILE_SAMPLE_RATE
+
+    def begin(self, profile: Profile):
+        """
+        Starts sampling for a profile, starting the sampling thread if it is not running.
+        """
+        with self._lock:
+            self._active.add(profile)
+            self._target = threading.get_ident()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, profile: Profile):
+        """
+        Stops sampling for a profile and keeps it for the admin endpoint.
+        """
+        with self._lock:
+            self._active.discard(profile)
+        self.profiles.append(profile)
+        self.profiled_total += 1
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+                target = self._target
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stack = fold_stack(frame)
+                del frame
+                for profile in active:
+                    profile.samples[stack] += 1
+            time.sleep(self.interval)
+
+    def find(self, profile_id: str):
+        """
+        Looks up a finished profile.
+
+        Returns:
+        - Profile: The profile, or None if it is unknown or was already dropped.
+        """
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    async def save(self, profile: Profile):
+        """
+        Writes a profile's folded stacks to `output_dir`, if one is configured.
+        """
+        if not self.output_dir:
+            return
+        path = os.path.join(self.output_dir, f"{profile.id}.folded")
+        try:
+            await asyncio.to_thread(_write_file, path, profile.folded())
+        except OSError:
+            logger.warning("Could not write profile %s", path, exc_info=True)
+
+    def stats(self):
+        """
+        Reports the profiler metrics.
+
+        Returns:
+        - dict: The number of requests profiled, kept and in flight.
+        """
+        return {
+            "profiled_total": self.profiled_total,
+            "kept": len(self.profiles),
+            "active": len(self._active),
+        }
+
+
+def _write_file(path: str, content: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+profiler = Profiler(
+    interval=config.PROFILE_INTERVAL,
+    max_profiles=config.PROFILE_MAX_PROFILES,
+    output_dir=config.PROFILE_OUTPUT_DIR,
+)
+
+
+def phase(name: str):
+    """
+    Times every call of a coroutine function as a phase of the current request's profile.
+
+    Args:
+    - name (str): The phase name.
+
+    Returns:
+    - callable: A decorator; outside profiled requests the wrapper only reads `current_profile`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None or not profile.enter(name):
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profile.leave(name, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+class ProfiledTemplate(jinja2.Template):
+    """
+    A Jinja template that records its rendering time in the "render" phase.
+    """
+
+    def render(self, *args, **kwargs):
+        profile = current_profile.get()
+        if profile is None or not profile.enter("render"):
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            profile.leave("render", time.perf_counter() - started)
+
+
+def install_template_timing(env: jinja2.Environment):
+    """
+    Makes an environment compile its templates as `ProfiledTemplate`.
+
+    Args:
+    - env (Environment): The Jinja environment, e.g. `config.TEMPLATES.env`.
+
+    Notes:
+    - Must run before the first template is loaded, since compiled templates are cached.
+    """
+    env.template_class = ProfiledTemplate
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling a sample of requests.
+
+    Only installed when `profiling_enabled()`; requests that are not selected pass straight
+    through after one random draw and a header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = Profile(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_profile.set(profile)
+        profiler.begin(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - started
+            profile.route = getattr(scope.get("route"), "path", None)
+            current_profile.reset(token)
+            profiler.end(profile)
+        await profiler.save(profile)
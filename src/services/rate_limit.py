@@ -0,0 +1,320 @@
+import logging
+import math
+import time
+import zlib
+from collections import OrderedDict
+
+from fastapi import Depends, Request
+
+from src.conf.config import config
+from src.database.db import peek_rate_limit_tokens, take_rate_limit_token
+from src.database.model import User
+from src.services.auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+# Seconds per unit accepted in limit strings such as "10/minute".
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a request has used up its token bucket.
+
+    Attributes:
+    - retry_after (float): The number of seconds until the request would be allowed.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def parse_limit(limit: str):
+    """
+    Parses a limit string from the settings.
+
+    Args:
+    - limit (str): "<count>/<period>", e.g. "10/minute", optionally followed by ",burst=<n>";
+      the burst defaults to the count. An empty string disables the limit.
+
+    Returns:
+    - tuple: The refill rate in tokens per second and the bucket size, or None if disabled.
+
+    Raises:
+    - ValueError: If the string is malformed.
+    """
+    if not limit:
+        return None
+    spec, _, burst = limit.partition(",")
+    count, _, period = spec.partition("/")
+    if period.strip() not in PERIODS:
+        raise ValueError(f"Invalid rate limit {limit!r}")
+    count = int(count)
+    if burst:
+        name, _, value = burst.partition("=")
+        if name.strip() != "burst":
+            raise ValueError(f"Invalid rate limit {limit!r}")
+        burst = int(value)
+    return count / PERIODS[period.strip()], burst or count
+
+
+class MemoryBucketStore:
+    """
+    Keeps token buckets in process memory.
+
+    Buckets are spread over shards by a hash of their key, and each shard is an LRU map
+    with its own size bound, so the store's memory stays bounded under key floods and
+    evicting a bucket only touches one small shard. Each worker process has its own store.
+
+    Attributes:
+    - shards (int): The number of shards.
+    - max_keys (int): The maximum number of buckets across all shards.
+    """
+
+    def __init__(self, shards: int, max_keys: int):
+        self.shards = shards
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._per_shard = max(max_keys // shards, 1)
+        self._shards = [OrderedDict() for _ in range(shards)]
+
+    def _refilled(self, shard: OrderedDict, key: str, rate: float, burst: int, now: float):
+        tokens, updated = shard.get(key, (burst, now))
+        return min(burst, tokens + (now - updated) * rate)
+
+    async def peek(self, key: str, rate: float, burst: int, cost: int = 1):
+        """
+        Checks whether a bucket holds enough tokens, without taking any.
+
+        Args:
+        - key (str): The bucket key.
+        - rate (float): The refill rate in tokens per second.
+        - burst (int): The bucket size.
+        - cost (int): The number of tokens the request needs.
+
+        Returns:
+        - float: 0 if the tokens are available, otherwise the number of seconds until they are.
+        """
+        shard = self._shards[zlib.crc32(key.encode("utf-8")) % self.shards]
+        tokens = self._refilled(shard, key, rate, burst, time.monotonic())
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / rate if rate else math.inf
+
+    async def take(self, key: str, rate: float, burst: int, cost: int = 1):
+        """
+        Takes tokens from a bucket, refilling it for the time elapsed since it was last used.
+
+        Args:
+        - key (str): The bucket key.
+        - rate (float): The refill rate in tokens per second.
+        - burst (int): The bucket size.
+        - cost (int): The number of tokens the request needs.
+
+        Returns:
+        - float: 0 if the tokens were taken, otherwise the number of seconds until enough
+          tokens are available.
+        """
+        shard = self._shards[zlib.crc32(key.encode("utf-8")) % self.shards]
+        now = time.monotonic()
+        tokens = self._refilled(shard, key, rate, burst, now)
+        shard.pop(key, None)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / rate if rate else math.inf
+        shard[key] = (tokens, now)
+        if len(shard) > self._per_shard:
+            shard.popitem(last=False)
+            self.evictions += 1
+        return retry_after
+
+    def stats(self):
+        """
+        Reports the store metrics.
+
+        Returns:
+        - dict: The number of buckets held and the eviction counter.
+        """
+        return {
+            "backend": "memory",
+            "shards": self.shards,
+            "keys": sum(len(shard) for shard in self._shards),
+            "max_keys": self.max_keys,
+            "evictions": self.evictions,
+        }
+
+
+class MongoBucketStore:
+    """
+    Keeps token buckets in MongoDB, so every worker and host shares the same limits.
+
+    Each check is a single atomic update evaluated on the server, with the server's clock.
+    If MongoDB cannot be reached, requests are let through rather than failed.
+    """
+
+    def __init__(self):
+        self.errors = 0
+
+    async def peek(self, key: str, rate: float, burst: int, cost: int = 1):
+        """
+        Checks a shared bucket without taking tokens; see `MemoryBucketStore.peek`.
+        """
+        try:
+            tokens = await peek_rate_limit_tokens(key, rate, burst)
+        except Exception:
+            self.errors += 1
+            logger.warning("Rate limit store unavailable, allowing request", exc_info=True)
+            return 0.0
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / rate if rate else math.inf
+
+    async def take(self, key: str, rate: float, burst: int, cost: int = 1):
+        """
+        Takes tokens from a shared bucket; see `MemoryBucketStore.take`.
+        """
+        try:
+            allowed, tokens = await take_rate_limit_token(key, rate, burst, cost)
+        except Exception:
+            self.errors += 1
+            logger.warning("Rate limit store unavailable, allowing request", exc_info=True)
+            return 0.0
+        if allowed:
+            return 0.0
+        return (cost - tokens) / rate if rate else math.inf
+
+    def stats(self):
+        """
+        Reports the store metrics.
+
+        Returns:
+        - dict: The number of failed checks.
+        """
+        return {"backend": "mongo", "errors": self.errors}
+
+
+class RateLimiter:
+    """
+    Applies per-route token-bucket limits per client IP and per user.
+
+    Attributes:
+    - store: The bucket store, `MemoryBucketStore` or `MongoBucketStore`.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.allowed_total = 0
+        self.limited_total = 0
+
+    async def check(self, route: str, limit: tuple, ip: str, username: str = None, user_limit: tuple = None):
+        """
+        Takes a token from the route's IP bucket and, if known, its user bucket.
+
+        Args:
+        - route (str): The route name, used to keep the buckets of each route apart.
+        - limit (tuple): The refill rate and bucket size returned by `parse_limit`.
+        - ip (str): The client IP address.
+        - username (str, optional): The user the request is made for or by.
+        - user_limit (tuple, optional): The limit of the user bucket; defaults to `limit`.
+
+        Raises:
+        - RateLimitExceeded: If either bucket is empty. Both buckets are checked before a token
+          is taken from either, so a request rejected by one bucket does not use up the other.
+        """
+        buckets = [(f"{route}:ip:{ip}", limit)]
+        if username:
+            buckets.append((f"{route}:user:{username}", user_limit or limit))
+        if len(buckets) > 1:
+            for key, (rate, burst) in buckets:
+                retry_after = await self.store.peek(key, rate, burst)
+                if retry_after:
+                    self.limited_total += 1
+                    raise RateLimitExceeded(retry_after)
+        for key, (rate, burst) in buckets:
+            retry_after = await self.store.take(key, rate, burst)
+            if retry_after:
+                self.limited_total += 1
+                raise RateLimitExceeded(retry_after)
+        self.allowed_total += 1
+
+    def stats(self):
+        """
+        Reports the limiter metrics.
+
+        Returns:
+        - dict: The allowed and rejected request counters and the store metrics.
+        """
+        return {"allowed_total": self.allowed_total, "limited_total": self.limited_total, **self.store.stats()}
+
+
+def create_store(backend: str):
+    """
+    Builds the bucket store selected by the `RATE_LIMIT_BACKEND` setting.
+
+    Args:
+    - backend (str): "memory" for per-process buckets, "mongo" for buckets shared through MongoDB.
+
+    Returns:
+    - MemoryBucketStore or MongoBucketStore: An object with `take` and `stats`.
+    """
+    if backend == "mongo":
+        return MongoBucketStore()
+    return MemoryBucketStore(shards=config.RATE_LIMIT_SHARDS, max_keys=config.RATE_LIMIT_MAX_KEYS)
+
+
+limiter = RateLimiter(create_store(config.RATE_LIMIT_BACKEND))
+
+
+def client_ip(request: Request):
+    """
+    Determines the address of the client that sent a request.
+
+    Args:
+    - request (Request): The incoming request.
+
+    Returns:
+    - str: The first `X-Forwarded-For` address if `RATE_LIMIT_TRUST_FORWARDED` is set
+      (only safe behind a proxy that overwrites the header), otherwise the peer address.
+    """
+    if config.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(route: str, limit: str, user_field: str = None, user_limit: str = None):
+    """
+    Builds a dependency that enforces a route's rate limit before the endpoint runs.
+
+    Args:
+    - route (str): The route name.
+    - limit (str): The limit string from the settings, see `parse_limit`.
+    - user_field (str, optional): A form field naming the user the request targets, such as
+      the username on the login form; otherwise the signed-in user is limited.
+    - user_limit (str, optional): The limit of the user bucket, if it differs from `limit`;
+      an empty string disables it. Anyone can submit any username, so a `user_field` bucket
+      should be looser than the IP bucket: it then only stops guessing spread over many
+      addresses, and its owner is only locked out by such an attack.
+
+    Returns:
+    - callable: A FastAPI dependency raising `RateLimitExceeded`, which the application
+      answers with HTTP 429 and a `Retry-After` header.
+    """
+    parsed = parse_limit(limit)
+    parsed_user = parsed if user_limit is None else parse_limit(user_limit)
+
+    async def dependency(request: Request, current_user: User = Depends(get_current_user)):
+        if parsed is None or not config.RATE_LIMIT_ENABLED:
+            return
+        username = current_user.username if current_user else None
+        if user_field:
+            username = (await request.form()).get(user_field) or None
+        if parsed_user is None:
+            username = None
+        await limiter.check(route, parsed, client_ip(request), username, parsed_user)
+
+    return dependency
@@ -0,0 +1,90 @@
+"""
+Shared fixtures: the application runs in-process against the in-memory MongoDB stand-in.
+
+The settings and the MongoDB clients are created when `src` is imported, so the environment
+is set before anything from the application is imported.
+"""
+import os
+
+os.environ["DB_TEST_MODE"] = "true"
+os.environ["BCRYPT_ROUNDS"] = "4"
+# Tests that cover rate limiting enable it themselves.
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import bcrypt
+import httpx
+import pytest
+
+import main
+from src.conf.config import config
+from src.database import db
+from src.repository.pastbin import body_cache, message_cache
+from src.services.auth import user_cache
+from src.services.http_cache import page_cache
+
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def app():
+    """
+    Starts the application with empty collections and caches, and stops it afterwards.
+    """
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    async with main.app.router.lifespan_context(main.app):
+        for collection in (
+            db.db_users_info, db.db_free_urls, db.db_counters, *db.db_text_user_shards,
+            *db.db_text_chunks_shards, *db.db_text_bodies_shards, db.db_message_counts, db.db_rate_limits,
+        ):
+            await collection.delete_many({})
+        for cache in (message_cache, body_cache, page_cache, user_cache):
+            cache.clear()
+        yield main.app
+
+
+def make_client(app, ip: str = "127.0.0.1"):
+    """
+    Builds an HTTP client that talks to the application in-process.
+
+    Args:
+    - app: The application.
+    - ip (str): The client address the application sees.
+
+    Returns:
+    - AsyncClient: The client.
+    """
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 1)), base_url="http://test")
+
+
+async def create_user(username: str = "alice"):
+    """
+    Stores a confirmed user whose password is `PASSWORD`.
+
+    Args:
+    - username (str): The username.
+    """
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(config.BCRYPT_ROUNDS)).decode("utf-8")
+    await db.write_new_user({
+        "username": username,
+        "email": f"{username}@example.com",
+        "hashed_password": hashed,
+        "is_active": True,
+        "confirmation_token": None,
+    })
+
+
+@pytest.fixture
+async def client(app):
+    """
+    An HTTP client signed in as "alice".
+    """
+    await create_user("alice")
+    async with make_client(app) as client:
+        response = await client.post("/auth/login", data={"username": "alice", "password": PASSWORD})
+        client.cookies.set("access_token", response.cookies["access_token"])
+        yield client
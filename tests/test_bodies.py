@@ -0,0 +1,79 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.conf.config import config
+from src.database import db
+from src.repository.pastbin import burn_message, past, read_message_with_id, sweep_expired
+
+pytestmark = pytest.mark.anyio
+
+
+async def find_body(text: str):
+    body_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return await db.db_text_bodies_shards[db.shard_index(body_id)].find_one({"_id": body_id})
+
+
+async def count_chunks():
+    return sum([await chunks.count_documents({}) for chunks in db.db_text_chunks_shards])
+
+
+async def expire(message_id: str):
+    shard = db.db_text_user_shards[db.shard_index(message_id)]
+    await shard.update_one({"id": message_id}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+
+async def test_shared_body_is_counted_once_per_message(app):
+    await past("alice", "shared text")
+    await past("bob", "shared text")
+
+    body = await find_body("shared text")
+    assert body["refs"] == 2
+
+
+async def test_expired_messages_release_their_body(app):
+    first = await past("alice", "expiring text", expires_in=60)
+    second = await past("alice", "expiring text", expires_in=60)
+
+    await expire(first)
+    assert await sweep_expired() == 1
+    assert (await find_body("expiring text"))["refs"] == 1
+
+    await expire(second)
+    assert await sweep_expired() == 1
+    assert await find_body("expiring text") is None
+
+
+async def test_burned_message_releases_its_body(app):
+    kept = await past("alice", "burn text")
+    burned = await past("alice", "burn text", burn=True)
+
+    message = await burn_message(burned)
+    assert message["text"] == "burn text"
+    assert (await find_body("burn text"))["refs"] == 1
+    assert await burn_message(burned) is None
+    assert (await find_body("burn text"))["refs"] == 1
+
+    assert (await read_message_with_id(kept))["text"] == "burn text"
+
+
+async def test_last_release_deletes_the_chunks(app):
+    text = "x" * (config.PASTE_CHUNK_THRESHOLD + 1)
+    message_id = await past("alice", text, burn=True)
+    assert await count_chunks() > 0
+
+    await burn_message(message_id)
+    assert await find_body(text) is None
+    assert await count_chunks() == 0
+
+
+async def test_burn_page_deletes_the_message(client):
+    response = await client.post("/pastbin/create_messages", json={"pastes": [{"text": "read once", "burn_after_read": True}]})
+    message_id = response.json()["results"][0]["id"]
+
+    first = await client.get(f"/pastbin/raw/{message_id}")
+    second = await client.get(f"/pastbin/raw/{message_id}")
+    assert (first.status_code, first.text) == (200, "read once")
+    assert second.status_code == 404
+    assert await find_body("read once") is None
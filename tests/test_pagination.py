@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from src.repository.pastbin import (
+    all_text, decode_page_token, decode_search_token, decode_user_page_token, encode_page_token,
+    encode_search_token, encode_user_page_token, past, search_text, user_text,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def walk(fetch):
+    """
+    Follows the page tokens of a listing to its end.
+
+    Args:
+    - fetch: A coroutine function taking a page token and returning the page's results and
+      the next token.
+
+    Returns:
+    - list: The pages, each a list of message IDs.
+    """
+    pages = []
+    token = None
+    while True:
+        results, token = (await fetch(token))[:2]
+        pages.append([result["id"] for result in results])
+        if token is None:
+            return pages
+
+
+def test_tokens_round_trip():
+    last_id = ObjectId()
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+    assert decode_page_token(encode_page_token(last_id)) == last_id
+    assert decode_user_page_token(encode_user_page_token(created_at, last_id)) == (created_at, last_id)
+    assert decode_search_token(encode_search_token(1.5, last_id)) == (1.5, last_id)
+
+
+@pytest.mark.parametrize("decode", [decode_page_token, decode_user_page_token, decode_search_token])
+@pytest.mark.parametrize("token", ["", "not a token", "AAAA"])
+def test_malformed_tokens(decode, token):
+    with pytest.raises(ValueError):
+        decode(token)
+
+
+async def test_all_messages_pages(app):
+    ids = [await past("alice", f"message {n}") for n in range(7)]
+
+    pages = await walk(lambda token: all_text(token, 3))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == ids[::-1]
+
+
+async def test_user_messages_pages(app):
+    ids = [await past("alice", f"message {n}") for n in range(5)]
+    await past("bob", "someone else")
+
+    pages = await walk(lambda token: user_text("alice", token, 2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == ids[::-1]
+
+
+async def test_search_pages(app):
+    ids = [await past("alice", f"needle number {n}") for n in range(5)]
+    await past("alice", "haystack")
+
+    pages = await walk(lambda token: search_text("needle", token, 2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sorted(sum(pages, [])) == sorted(ids)
+
+
+async def test_invalid_page_token_is_rejected(client):
+    response = await client.get("/pastbin/all_messages", params={"page": "not a token"})
+    assert response.status_code == 400
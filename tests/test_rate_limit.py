@@ -0,0 +1,81 @@
+import pytest
+
+from src.conf.config import config
+from src.services import rate_limit
+from src.services.rate_limit import MemoryBucketStore, RateLimiter, RateLimitExceeded, parse_limit
+
+from conftest import PASSWORD, create_user, make_client
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """
+    Enables rate limiting with empty buckets.
+    """
+    limiter = RateLimiter(MemoryBucketStore(shards=4, max_keys=1000))
+    monkeypatch.setattr(rate_limit, "limiter", limiter)
+    monkeypatch.setattr(config, "RATE_LIMIT_ENABLED", True)
+    return limiter
+
+
+def test_parse_limit():
+    assert parse_limit("10/minute") == (10 / 60, 10)
+    assert parse_limit("100/hour,burst=20") == (100 / 3600, 20)
+    assert parse_limit("") is None
+    with pytest.raises(ValueError):
+        parse_limit("10/fortnight")
+
+
+async def test_user_bucket_is_shared_across_addresses():
+    limiter = RateLimiter(MemoryBucketStore(shards=4, max_keys=1000))
+    ip_limit, user_limit = parse_limit("10/minute"), parse_limit("1/hour,burst=3")
+
+    for n in range(3):
+        await limiter.check("login", ip_limit, f"10.0.0.{n}", "alice", user_limit)
+    with pytest.raises(RateLimitExceeded):
+        await limiter.check("login", ip_limit, "10.0.0.9", "alice", user_limit)
+    await limiter.check("login", ip_limit, "10.0.0.9", "bob", user_limit)
+
+
+async def test_rejected_request_does_not_drain_the_other_bucket():
+    limiter = RateLimiter(MemoryBucketStore(shards=4, max_keys=1000))
+    ip_limit, user_limit = parse_limit("1/hour"), parse_limit("1/hour,burst=2")
+
+    await limiter.check("login", ip_limit, "10.0.0.1", "alice", user_limit)
+    for _ in range(3):
+        with pytest.raises(RateLimitExceeded):
+            await limiter.check("login", ip_limit, "10.0.0.1", "alice", user_limit)
+    # Only the first request took a token from alice's bucket.
+    await limiter.check("login", ip_limit, "10.0.0.2", "alice", user_limit)
+
+
+async def test_login_is_limited_per_username(app, limiter):
+    await create_user("alice")
+    _, burst = parse_limit(config.RATE_LIMIT_LOGIN_USER)
+
+    limited = []
+    for n in range(burst + 1):
+        async with make_client(app, f"10.0.{n // 256}.{n % 256}") as client:
+            response = await client.post("/auth/login", data={"username": "alice", "password": "wrong"})
+            limited.append(response.status_code == 429)
+    assert limited == [False] * burst + [True]
+    assert "retry-after" in response.headers
+
+    async with make_client(app, "10.1.0.1") as client:
+        response = await client.post("/auth/login", data={"username": "bob", "password": "wrong"})
+        assert response.status_code != 429
+        response = await client.post("/auth/login", data={"username": "alice", "password": PASSWORD})
+        assert response.status_code == 429
+
+
+async def test_login_is_limited_per_address(app, limiter):
+    _, burst = parse_limit(config.RATE_LIMIT_LOGIN)
+
+    async with make_client(app, "10.2.0.1") as client:
+        limited = [
+            (await client.post("/auth/login", data={"username": f"user{n}", "password": "wrong"})).status_code == 429
+            for n in range(burst + 1)
+        ]
+    assert limited == [False] * burst + [True]
@@ -0,0 +1,95 @@
+import pytest
+
+from src.conf.config import config
+
+pytestmark = pytest.mark.anyio
+
+TEXT = "0123456789" * 10
+
+
+async def create(client, text: str = TEXT, burn: bool = False):
+    response = await client.post("/pastbin/create_messages", json={"pastes": [{"text": text, "burn_after_read": burn}]})
+    return response.json()["results"][0]["id"]
+
+
+async def test_full_text(client):
+    message_id = await create(client)
+
+    response = await client.get(f"/pastbin/raw/{message_id}")
+    assert response.status_code == 200
+    assert response.text == TEXT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+
+
+async def test_range(client):
+    message_id = await create(client)
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"Range": "bytes=5-14"})
+    assert response.status_code == 206
+    assert response.text == TEXT[5:15]
+    assert response.headers["content-range"] == f"bytes 5-14/{len(TEXT)}"
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"Range": "bytes=-3"})
+    assert response.status_code == 206
+    assert response.text == TEXT[-3:]
+
+
+async def test_range_beyond_the_end(client):
+    message_id = await create(client)
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"Range": f"bytes={len(TEXT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(TEXT)}"
+
+
+async def test_range_of_a_chunked_body(client):
+    text = "".join(chr(ord("a") + i % 26) for i in range(config.PASTE_CHUNK_THRESHOLD + config.PASTE_CHUNK_SIZE))
+    message_id = await create(client, text)
+    start = config.PASTE_CHUNK_SIZE * 2 - 5
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"Range": f"bytes={start}-{start + 9}"})
+    assert response.status_code == 206
+    assert response.text == text[start:start + 10]
+
+
+async def test_if_range(client):
+    message_id = await create(client)
+    etag = (await client.get(f"/pastbin/raw/{message_id}")).headers["etag"]
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"Range": "bytes=0-4", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.text == TEXT[:5]
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"Range": "bytes=0-4", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.text == TEXT
+
+
+async def test_not_modified(client):
+    message_id = await create(client)
+    etag = (await client.get(f"/pastbin/raw/{message_id}")).headers["etag"]
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+
+async def test_not_modified_does_not_burn(client):
+    etag = (await client.get(f"/pastbin/raw/{await create(client)}")).headers["etag"]
+    message_id = await create(client, burn=True)
+
+    response = await client.get(f"/pastbin/raw/{message_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = await client.get(f"/pastbin/raw/{message_id}")
+    assert (response.status_code, response.text) == (200, TEXT)
+    assert (await client.get(f"/pastbin/raw/{message_id}")).status_code == 404
+
+
+async def test_unknown_message(client):
+    response = await client.get("/pastbin/raw/unknown")
+    assert response.status_code == 404